@@ -1,8 +1,11 @@
+# Sets the OpenMP/BLAS thread limits; must run before NumPy is imported.
+from .services import thread_governor  # noqa: F401
 from flask import Flask
 from .config import DevConfig, ProdConfig
 from .routes.auth import auth_bp
 from .routes.views import views_bp
 from .routes.api import api_bp
+from .services.training_executor import start_training_pool
 
 def create_app(env: str | None = None) -> Flask:
     app = Flask(__name__, static_folder="static", template_folder="templates")
@@ -30,4 +33,7 @@ def create_app(env: str | None = None) -> Flask:
     if not app.config.get("SECRET_KEY"):
         app.config["SECRET_KEY"] = "change-me"
 
+    # model training runs in a per-worker process pool (see services/training_executor.py)
+    start_training_pool()
+
     return app
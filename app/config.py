@@ -1,5 +1,12 @@
 import os
 
+# On-disk location for derived artifacts (pipeline caches, trained models, ...).
+# Shared by every gunicorn worker on the host, so keep it on local disk.
+ARTIFACT_DIR = os.getenv(
+    "RTAVERSE_ARTIFACT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance"),
+)
+
 class BaseConfig:
     """Base configuration."""
     SECRET_KEY = os.getenv("FLASK_SECRET_KEY", "a_super_secret_key_that_is_long_and_random")
@@ -7,6 +14,7 @@ class BaseConfig:
     # The individual DB_* variables are no longer needed here.
     AIVEN_DATABASE_URL = os.getenv("AIVEN_DATABASE_URL")
     TEMPLATES_AUTO_RELOAD = False
+    ARTIFACT_DIR = ARTIFACT_DIR
 
 class DevConfig(BaseConfig):
     """Development configuration."""
@@ -1,11 +1,25 @@
 from flask import Blueprint, jsonify, request, session, Response
 from .auth import is_logged_in
-from ..services.database import list_tables
+from ..services.database import list_tables, get_table_version
 from ..services.preprocessing import process_merge_and_save_to_db, make_display_copy
-from ..services.forecasting import rf_monthly_payload, build_forecast_map_html
+from ..services.forecasting import rf_monthly_payload, build_forecast_map_html, hotspots_json_page, live_map_args, hour_window
+from ..services.model_registry import train_hotspot_model, loaded_hotspot_metadata, hotspot_explanations, explanation_drivers, MAP_TRAINING_BUDGET
+from ..services.table_events import table_appended, table_changed, table_dropped
+from ..services.model_evaluation import schedule_evaluation, latest_model_metrics
+from ..services.training_executor import run_training, training_queue_stats, TrainingQueueFull, TrainingTimeout
+from ..services.precompute import precompute_status
+from ..services.map_cache import cached_map, schedule_warm
+from ..services.hotspot_summary import load_hotspot_summary
+from ..services.risk_surface import load_risk_surfaces, risk_overlay, clusters_for_hours, RISK_BBOX, TIME_CLUSTERS, KDE_BANDWIDTH_M
+from ..services.point_index import load_point_index, filtered_positions, points_in_view, POINTS_MAX
+from ..services.thread_governor import thread_limits
 from ..extensions import get_db_connection, get_engine
-from ..services.dashboard_forecasting import run_categorical_forecast, run_numerical_forecast, run_overall_timeseries_forecast
+from ..services.dashboard_forecasting import model_display_name
+from ..services.hierarchical_forecast import hierarchical_chart, per_chart_forecast, HIERARCHICAL_FORECASTS
 import traceback
+import base64
+import hashlib
+import json
 import pandas as pd
 import numpy as np
 import io
@@ -24,6 +38,55 @@ except ImportError:
 
 api_bp = Blueprint("api", __name__)
 
+def training_busy_response(e):
+    """429 + Retry-After when the training queue is full, 504 when a job timed out."""
+    if isinstance(e, TrainingQueueFull):
+        return jsonify(success=False, message=str(e)), 429, {"Retry-After": str(e.retry_after)}
+    return jsonify(success=False, message=str(e)), 504
+
+def use_hierarchy():
+    """Serve forecast charts from the shared cell forecast (?hierarchy=0 asks for the per-chart model)."""
+    return HIERARCHICAL_FORECASTS and request.args.get("hierarchy", "1") != "0"
+
+def map_training_budget(value):
+    """Seconds the map may spend training a missing model (?budget=, else MAP_TRAINING_BUDGET; 0 = no limit)."""
+    try:
+        budget = float(value) if value not in (None, "") else MAP_TRAINING_BUDGET
+    except ValueError:
+        budget = MAP_TRAINING_BUDGET
+    return budget if budget > 0 else None
+
+def map_response(page, hit, table, mimetype='text/html'):
+    """A cached map page: 304 when the client's ETag matches, gzip body when the client accepts it."""
+    headers = {
+        "ETag": page.etag,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept-Encoding",
+        "X-Map-Cache": "hit" if hit else "miss",
+        **model_training_headers(table),
+    }
+    if page.etag in request.headers.get("If-None-Match", ""):
+        return Response(status=304, headers=headers)
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(page.gzipped, mimetype=mimetype, headers=headers)
+    return Response(page.text(), mimetype=mimetype, headers=headers)
+
+def model_training_headers(table):
+    """How the hotspot model behind a response was trained, as X-Model-* headers."""
+    meta = loaded_hotspot_metadata(table)
+    if not meta:
+        return {}
+    training = meta.get("training", {})
+    headers = {
+        "X-Model-Version": str(meta.get("version")),
+        "X-Model-Training-Mode": str(training.get("mode", "full")),
+        "X-Model-Iterations": str(training.get("iterations", meta.get("n_estimators_total"))),
+    }
+    if training.get("val_loss") is not None:
+        headers["X-Model-Val-Loss"] = f"{training['val_loss']:.6f}"
+    return headers
+
 # ==== START: NEW ROUTE FOR ADDING A SINGLE RECORD ====
 @api_bp.route("/add_record", methods=["POST"])
 def add_record():
@@ -122,6 +185,7 @@ def add_record():
         cur.execute(insert_sql, values)
         new_id = cur.lastrowid # Get the new auto-incremented ID
         conn.commit()
+        table_appended(table_name)
 
         # 5. Fetch the newly inserted row to return to the frontend
         # This ensures the frontend gets all processed data AND the new ID
@@ -514,8 +578,55 @@ def set_forecast_source():
     return jsonify(success=True, message=f'"{table}" set as forecast source.')
 
 
+_row_counts = {}  # table -> (data version, row count), for recordsTotal
+
+def _json_cell(value):
+    """Cells go out as JSON: strings, numbers and NULLs as they are, anything else (dates, decimals) as str()."""
+    return value if value is None or isinstance(value, (str, int, float)) else str(value)
+
+def _encode_cursor(column, direction, row):
+    """Opaque position of `row` in the (order column, id) ordering."""
+    payload = {"c": column, "d": direction, "id": int(row["id"]),
+               "v": None if column is None else _json_cell(row[column])}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
+
+def _decode_cursor(token, column, direction):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        payload["id"] = int(payload["id"])
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor.")
+    if payload.get("c") != column or payload.get("d") != direction:
+        raise ValueError("The cursor belongs to a different ordering; start again from the first page.")
+    return payload
+
+def _seek_clause(column, value, row_id, forward):
+    """
+    Rows strictly past (value, row_id) in the (column, id) ordering, towards
+    larger keys when `forward`. MySQL sorts NULL below every value.
+    """
+    if column is None:
+        return ("`id` > %s" if forward else "`id` < %s"), [row_id]
+    if forward:
+        if value is None:
+            return f"((`{column}` IS NULL AND `id` > %s) OR `{column}` IS NOT NULL)", [row_id]
+        return f"(`{column}` > %s OR (`{column}` = %s AND `id` > %s))", [value, value, row_id]
+    if value is None:
+        return f"(`{column}` IS NULL AND `id` < %s)", [row_id]
+    return f"(`{column}` < %s OR (`{column}` = %s AND `id` < %s) OR `{column}` IS NULL)", [value, value, row_id]
+
 @api_bp.route("/database_data")
 def database_data():
+    """
+    Rows of `table` for a server-side DataTables view.
+
+    Pages are read by keyset on (order column, id): pass the previous
+    response's next_cursor as `after` (or its prev_cursor as `before`) and the
+    query seeks straight to that row instead of skipping `start` rows, so deep
+    pages cost the same as the first when the order column is indexed.
+    Without a cursor `start` is used as an OFFSET. `columns=A,B,...` limits the
+    columns read and returned to the displayed ones; `id` always comes first.
+    """
     if not is_logged_in():
         return jsonify({"error": "Not authorized"}), 401
 
@@ -529,53 +640,90 @@ def database_data():
 
         draw = int(request.args.get('draw', 0))
         start = int(request.args.get('start', 0))
-        length = int(request.args.get('length', 10))
+        length = max(1, min(int(request.args.get('length', 10)), 1000))
         search_value = request.args.get('search[value]', '').strip()
 
         cursor.execute(f"SHOW COLUMNS FROM `{table_name}`")
         db_columns = [row['Field'] for row in cursor.fetchall()]
-        
-        column_map = ['select_col_placeholder'] + db_columns
+
+        requested = [c.strip() for c in (request.args.get('columns') or '').split(',') if c.strip()]
+        unknown = [c for c in requested if c not in db_columns]
+        if unknown:
+            return jsonify({"error": f"Unknown column(s): {', '.join(unknown)}"}), 400
+        columns = ['id'] + [c for c in (requested or db_columns) if c != 'id']
+
+        # DataTables' column indices follow the columns it was given: the
+        # returned `columns` when projected, else the checkbox column + table.
+        column_map = columns if requested else ['select_col_placeholder'] + db_columns
 
         order_column_index = int(request.args.get('order[0][column]', 0))
-        order_dir = request.args.get('order[0][dir]', 'asc').lower()
+        order_dir = 'desc' if request.args.get('order[0][dir]', 'asc').lower() == 'desc' else 'asc'
         order_column_name = column_map[order_column_index] if order_column_index < len(column_map) else db_columns[0]
+        order_column = order_column_name if order_column_name in db_columns and order_column_name != 'id' else None
 
-        params = []
-        where_clauses = []
-
+        where_clauses, params = [], []
         if search_value:
-            search_likes = []
-            for col in db_columns:
-                search_likes.append(f"`{col}` LIKE %s")
-            where_clauses.append(f"({' OR '.join(search_likes)})")
-            params.extend([f"%{search_value}%"] * len(db_columns))
+            where_clauses.append(f"({' OR '.join(f'`{col}` LIKE %s' for col in columns)})")
+            params.extend([f"%{search_value}%"] * len(columns))
+        search_params = list(params)
 
-        where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
-        order_sql = f"ORDER BY `{order_column_name}` {order_dir}" if order_column_name in db_columns else ""
-        limit_sql = "LIMIT %s OFFSET %s"
-        params.extend([length, start])
+        after, before = request.args.get('after'), request.args.get('before')
+        backwards = bool(before) and not after
+        try:
+            position = _decode_cursor(after or before, order_column, order_dir) if (after or before) else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Reading backwards (before=) walks the ordering in reverse and flips the page afterwards.
+        ascending = (order_dir == 'asc') != backwards
+        if position is not None:
+            seek_sql, seek_params = _seek_clause(order_column, position["v"], position["id"], ascending)
+            where_clauses.append(seek_sql)
+            params.extend(seek_params)
 
-        cursor.execute(f"SELECT COUNT(id) as count FROM `{table_name}`")
-        records_total = cursor.fetchone()['count']
+        where_sql = f"WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+        sql_dir = "ASC" if ascending else "DESC"
+        order_sql = f"ORDER BY `{order_column}` {sql_dir}, `id` {sql_dir}" if order_column else f"ORDER BY `id` {sql_dir}"
+        select_cols = columns + ([order_column] if order_column and order_column not in columns else [])
+        limit_sql = "LIMIT %s" if position is not None else "LIMIT %s OFFSET %s"
+        params.extend([length + 1] if position is not None else [length + 1, start])
+
+        version = get_table_version(table_name)
+        cached = _row_counts.get(table_name)
+        if cached is not None and cached[0] == version:
+            records_total = cached[1]
+        else:
+            cursor.execute(f"SELECT COUNT(*) as count FROM `{table_name}`")
+            records_total = cursor.fetchone()['count']
+            _row_counts[table_name] = (version, records_total)
 
-        count_query = f"SELECT COUNT(id) as count FROM `{table_name}` {where_sql}"
-        cursor.execute(count_query, params[:-2] if search_value else [])
-        records_filtered = cursor.fetchone()['count']
+        if search_value:
+            count_where = f"WHERE {where_clauses[0]}"
+            cursor.execute(f"SELECT COUNT(*) as count FROM `{table_name}` {count_where}", search_params)
+            records_filtered = cursor.fetchone()['count']
+        else:
+            records_filtered = records_total
 
-        data_query = f"SELECT * FROM `{table_name}` {where_sql} {order_sql} {limit_sql}"
+        data_query = f"SELECT {', '.join(f'`{c}`' for c in select_cols)} FROM `{table_name}` {where_sql} {order_sql} {limit_sql}"
         cursor.execute(data_query, tuple(params))
-        data = cursor.fetchall()
+        rows = cursor.fetchall()
+        has_more = len(rows) > length
+        rows = rows[:length]
+        if backwards:
+            rows.reverse()
 
-        data_as_lists = []
-        for row_dict in data:
-            data_as_lists.append([str(row_dict.get(col, '')) for col in db_columns])
+        # A backwards page always has the cursor row after it; a forward one has rows before it unless it is the first.
+        has_next = True if backwards else has_more
+        has_prev = has_more if backwards else position is not None or start > 0
 
         return jsonify({
             "draw": draw,
             "recordsTotal": records_total,
             "recordsFiltered": records_filtered,
-            "data": data_as_lists
+            "columns": columns,
+            "data": [[_json_cell(row[col]) for col in columns] for row in rows],
+            "next_cursor": _encode_cursor(order_column, order_dir, rows[-1]) if rows and has_next else None,
+            "prev_cursor": _encode_cursor(order_column, order_dir, rows[0]) if rows and has_prev else None,
         })
 
     except Exception as e:
@@ -677,7 +825,10 @@ def export_table():
 def rf_monthly_forecast():
     if not is_logged_in(): return jsonify(success=False, message="Not authorized."), 401
     table = (request.args.get("table") or "accidents").strip()
-    return jsonify(**rf_monthly_payload(table))
+    try:
+        return jsonify(**rf_monthly_payload(table))
+    except (TrainingQueueFull, TrainingTimeout) as e:
+        return training_busy_response(e)
 
 @api_bp.route("/forecast/overall_timeseries")
 def forecast_overall_timeseries():
@@ -698,15 +849,13 @@ def forecast_overall_timeseries():
 
         where_sql, params = build_filter_query(cols)
 
-        result = run_overall_timeseries_forecast(
-            table_name=table,
-            model_type=model,
-            forecast_horizon=horizon,
-            where_sql=where_sql,
-            params=params
-        )
-        return jsonify(result)
+        if use_hierarchy():
+            return jsonify(hierarchical_chart("overall_timeseries", table, model, horizon, where_sql, params))
+
+        return jsonify(per_chart_forecast("overall_timeseries", table, cols, model, horizon, where_sql, params))
         
+    except (TrainingQueueFull, TrainingTimeout) as e:
+        return training_busy_response(e)
     except Exception as e:
         import traceback
         return jsonify(success=False, message=f"<pre>{traceback.format_exc()}</pre>"), 500
@@ -747,6 +896,47 @@ def overall_timeseries():
         import traceback
         return jsonify(success=False, message=f"<pre>{traceback.format_exc()}</pre>"), 500
 
+def map_view_args(table, q):
+    """
+    Builder arguments for the map view in `q`, and for the next hour's view
+    when `q` is the "Live" default (None otherwise).
+    """
+    now = datetime.now()
+
+    # 1. Get parameters, providing defaults for the current month and hour if they are missing.
+    # This makes the map load with a relevant initial view.
+    live = live_map_args(now)
+    start_str = q.get("start") or live["start_str"]
+    end_str = q.get("end") or live["end_str"]
+    time_from_str = q.get("time_from") or live["time_from"]
+    time_to_str = q.get("time_to") or live["time_to"]
+
+    # 2. For the model training query, we use all filters *except* the date range.
+    # This ensures the model is trained on all relevant historical data.
+    training_filters = q.copy()
+    training_filters.pop("start", None)
+    training_filters.pop("end", None)
+    training_filters.pop("budget", None)
+
+    engine = get_engine()
+    with engine.connect() as conn:
+        result = conn.execute(text(f"SHOW COLUMNS FROM `{table}`"))
+        cols = {str(row[0]) for row in result.fetchall()}
+
+    # 3. Build the WHERE clause for training data using the non-date filters.
+    where_sql, params = build_filter_query(cols, req_obj=training_filters)
+
+    # 4. The builders get the training query, but also the original (or defaulted)
+    # date and time strings so the forecast period and display are correct.
+    map_args = dict(where_sql=where_sql, params=params, start_str=start_str, end_str=end_str,
+                    time_from=time_from_str, time_to=time_to_str)
+
+    # The "Live" default view moves on every hour; its next hour is rendered ahead of time.
+    next_args = None
+    if not any(q.get(k) for k in ("start", "end", "time_from", "time_to")):
+        next_args = dict(map_args, **live_map_args(now + timedelta(hours=1)))
+    return map_args, next_args
+
 @api_bp.route("/folium_map")
 def folium_map():
     if not is_logged_in():
@@ -758,47 +948,262 @@ def folium_map():
 
     try:
         q = request.args
-        now = datetime.now()
+        map_args, next_args = map_view_args(table, q)
+        extra = dict(legacy_time=q.get("legacy_time", "Live"), barangay_filter=q.get("barangay"))
+        budget = map_training_budget(q.get("budget"))
+
+        def render(args):
+            return lambda: build_forecast_map_html(table=table, training_budget=budget, **args, **extra)
+
+        # Rendered pages are cached per table version, model and view.
+        page, hit = cached_map(table, dict(map_args, **extra), render(map_args))
+        if next_args is not None:
+            schedule_warm(table, dict(next_args, **extra), render(next_args))
+        return map_response(page, hit, table)
+
+    except TrainingQueueFull as e:
+        return Response(f"<h4>{e}</h4>", status=429, mimetype='text/html', headers={"Retry-After": str(e.retry_after)})
+    except TrainingTimeout as e:
+        return Response(f"<h4>{e}</h4>", status=504, mimetype='text/html')
+    except Exception as e:
+        traceback.print_exc()
+        return Response(f"<h4>An unexpected error occurred.</h4><pre>{e}</pre>", mimetype='text/html')
 
-        # 1. Get parameters, providing defaults for the current month and hour if they are missing.
-        # This makes the map load with a relevant initial view.
-        start_str = q.get("start") or now.strftime('%Y-%m')
-        end_str = q.get("end") or now.strftime('%Y-%m')
-        time_from_str = q.get("time_from") or str(now.hour)
-        time_to_str = q.get("time_to") or str(now.hour)
+@api_bp.route("/hotspots.json")
+def hotspots_json():
+    """The hotspot layer as GeoJSON (see hotspots_geojson); takes the same filters as /api/folium_map."""
+    if not is_logged_in(): return jsonify(success=False, message="Not authorized."), 401
 
-        # 2. For the model training query, we use all filters *except* the date range.
-        # This ensures the model is trained on all relevant historical data.
-        training_filters = q.copy()
-        training_filters.pop("start", None)
-        training_filters.pop("end", None)
+    table = session.get('forecast_table', 'accidents')
+    if table not in list_tables(): return jsonify(success=False, message=f"Table '{table}' not found."), 400
 
-        engine = get_engine()
-        with engine.connect() as conn:
-            result = conn.execute(text(f"SHOW COLUMNS FROM `{table}`"))
-            cols = {str(row[0]) for row in result.fetchall()}
+    try:
+        map_args, next_args = map_view_args(table, request.args)
+        budget = map_training_budget(request.args.get("budget"))
 
-        # 3. Build the WHERE clause for training data using the non-date filters.
-        where_sql, params = build_filter_query(cols, req_obj=training_filters)
-        
-        # 4. Call the map builder. Pass the training query, but also pass the original (or defaulted)
-        # date and time strings so the forecast period and display are correct.
-        html = build_forecast_map_html(
-            table=table,
-            where_sql=where_sql, 
-            params=params,       
-            start_str=start_str,
-            end_str=end_str,
-            time_from=time_from_str,
-            time_to=time_to_str,
-            legacy_time=q.get("legacy_time", "Live"),
-            barangay_filter=q.get("barangay")
+        def render(args):
+            return lambda: hotspots_json_page(table, args, training_budget=budget)
+
+        page, hit = cached_map(table, dict(map_args, format="geojson"), render(map_args))
+        if next_args is not None:
+            schedule_warm(table, dict(next_args, format="geojson"), render(next_args))
+        return map_response(page, hit, table, mimetype='application/json')
+
+    except (TrainingQueueFull, TrainingTimeout) as e:
+        return training_busy_response(e)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify(success=False, message=str(e)), 500
+
+@api_bp.route("/retrain_model", methods=["POST"])
+def retrain_model():
+    if not is_logged_in(): return jsonify(success=False, message="Not authorized."), 401
+    data = request.get_json(silent=True) or {}
+    table = (data.get("table") or session.get("forecast_table", "accidents")).strip()
+    if table not in list_tables(): return jsonify(success=False, message=f'Unknown table "{table}".'), 400
+    budget = data.get("budget_seconds")
+    if budget in (None, ""):
+        budget = None
+    else:
+        try:
+            budget = float(budget) if not isinstance(budget, bool) else float("nan")
+        except (TypeError, ValueError):
+            budget = float("nan")
+        if not np.isfinite(budget):
+            return jsonify(success=False, message="budget_seconds must be a number of seconds."), 400
+        budget = budget if budget > 0 else None  # 0 or less = no budget
+    try:
+        _, meta = run_training(train_hotspot_model, table, None, budget)
+        schedule_evaluation(table, meta["version"])
+        return jsonify(
+            success=True,
+            message=f"Hotspot model retrained on '{table}' ({meta['n_samples']} hotspot-months, {meta['fit_seconds']:.1f}s).",
+            model=meta,
         )
-        return Response(html, mimetype='text/html')
+    except (TrainingQueueFull, TrainingTimeout) as e:
+        return training_busy_response(e)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify(success=False, message=f"Retraining failed: {e}"), 500
 
+@api_bp.route("/hotspot_explain/<int:hotspot_id>", methods=["GET"])
+def hotspot_explain(hotspot_id):
+    if not is_logged_in(): return jsonify(success=False, message="Not authorized."), 401
+    table = (request.args.get("table") or session.get("forecast_table", "accidents")).strip()
+    if table not in list_tables(): return jsonify(success=False, message=f'Unknown table "{table}".'), 400
+    try:
+        explanations = hotspot_explanations(table)
+        if explanations is None:
+            return jsonify(success=False, message="The hotspot model for this table has not been trained yet."), 404
+        entry = explanations.get(str(hotspot_id))
+        if entry is None:
+            return jsonify(success=False, message=f"No explanation for hotspot #{hotspot_id}."), 404
+        return jsonify(success=True, data={
+            "hotspot": hotspot_id,
+            "as_of": entry["as_of"],
+            "prediction": entry["prediction"],
+            "base": entry["base"],
+            "drivers": explanation_drivers(entry),
+        })
     except Exception as e:
         traceback.print_exc()
-        return Response(f"<h4>An unexpected error occurred.</h4><pre>{e}</pre>", mimetype='text/html')
+        return jsonify(success=False, message=str(e)), 500
+
+@api_bp.route("/hotspot_summary", methods=["GET"])
+def hotspot_summary():
+    if not is_logged_in(): return jsonify(success=False, message="Not authorized."), 401
+    table = (request.args.get("table") or session.get("forecast_table", "accidents")).strip()
+    if table not in list_tables(): return jsonify(success=False, message=f'Unknown table "{table}".'), 400
+    try:
+        summary = load_hotspot_summary(table)
+        data = [
+            {
+                "hotspot": int(h),
+                "center": [round(float(lat), 6), round(float(lon), 6)],
+                "radius_m": round(float(r), 1),
+                "accidents": int(n),
+                "last_seen": last.isoformat(),
+                "barangays": [summary["barangays"][j] for j in np.nonzero(members[:, -1])[0]],
+            }
+            for h, lat, lon, r, n, last, members in zip(
+                summary["hotspots"], summary["center_lat"], summary["center_lon"], summary["radius_m"],
+                summary["accidents"], summary["last_seen"], summary["member_prefix"],
+            )
+        ]
+        return jsonify(success=True, data=data)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify(success=False, message=str(e)), 500
+
+@api_bp.route("/points", methods=["GET"])
+def points():
+    """
+    Accidents in bbox=south,west,north,east at `zoom`, clustered on a grid
+    (see services/point_index.py). Takes the dashboard filters; at most
+    `limit` (default and ceiling RTAVERSE_POINTS_MAX) clusters are returned.
+    """
+    if not is_logged_in(): return jsonify(success=False, message="Not authorized."), 401
+    table = (request.args.get("table") or session.get("forecast_table", "accidents")).strip()
+    if table not in list_tables(): return jsonify(success=False, message=f'Unknown table "{table}".'), 400
+    try:
+        south, west, north, east = (float(v) for v in request.args.get("bbox", "").split(","))
+        zoom = int(request.args.get("zoom", 13))
+        limit = int(request.args.get("limit", POINTS_MAX))
+    except ValueError:
+        return jsonify(success=False, message="Expected bbox=south,west,north,east and an integer zoom."), 400
+    bbox = (max(min(south, north), -90.0), max(min(west, east), -180.0),
+            min(max(south, north), 90.0), min(max(west, east), 180.0))
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute(f"SHOW COLUMNS FROM `{table}`")
+        cols = {str(r[0]) for r in cur.fetchall()}
+        cur.close()
+        conn.close()
+        if not {"LATITUDE", "LONGITUDE"} <= cols:
+            return jsonify(success=False, message=f'Table "{table}" has no LATITUDE/LONGITUDE columns.'), 400
+
+        where_sql, params = build_filter_query(cols)
+        index = load_point_index(table)
+        positions = filtered_positions(index, table, where_sql, params) if where_sql else None
+        return jsonify(success=True, data=points_in_view(index, bbox, zoom, positions, limit))
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify(success=False, message=str(e)), 500
+
+@api_bp.route("/risk_surface.json")
+def risk_surface_meta():
+    """What the risk overlay covers: bounds, recorded months, TIME_CLUSTER buckets and kernel bandwidth."""
+    if not is_logged_in(): return jsonify(success=False, message="Not authorized."), 401
+    table = (request.args.get("table") or session.get("forecast_table", "accidents")).strip()
+    if table not in list_tables(): return jsonify(success=False, message=f'Unknown table "{table}".'), 400
+    try:
+        surfaces = load_risk_surfaces(table)
+        south, west, north, east = RISK_BBOX
+        return jsonify(success=True, data={
+            "version": surfaces["version"],
+            "bounds": [[south, west], [north, east]],
+            "months": [m.strftime('%Y-%m') for m in surfaces["months"]],
+            "time_clusters": TIME_CLUSTERS,
+            "bandwidth_m": KDE_BANDWIDTH_M,
+            "accidents": int(surfaces["accidents"].sum()),
+        })
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify(success=False, message=str(e)), 500
+
+@api_bp.route("/risk_surface.png")
+def risk_surface_png():
+    """
+    The kernel-density risk overlay for start..end (YYYY-MM) as a PNG over
+    RISK_BBOX. Buckets come from time_cluster=Morning,Evening or, like the
+    map, from time_from/time_to (widened to the TIME_CLUSTER buckets they touch).
+    """
+    if not is_logged_in(): return jsonify(success=False, message="Not authorized."), 401
+    table = (request.args.get("table") or session.get("forecast_table", "accidents")).strip()
+    if table not in list_tables(): return jsonify(success=False, message=f'Unknown table "{table}".'), 400
+
+    clusters = [c.strip().capitalize() for c in (request.args.get("time_cluster") or "").split(",") if c.strip()]
+    if any(c not in TIME_CLUSTERS for c in clusters):
+        return jsonify(success=False, message=f"time_cluster must be among {', '.join(TIME_CLUSTERS)}."), 400
+    if not clusters:
+        hours, _ = hour_window(request.args.get("time_from", ""), request.args.get("time_to", ""))
+        clusters = clusters_for_hours(hours)
+    try:
+        png, peak, basis, version = risk_overlay(table, request.args.get("start", ""), request.args.get("end", ""), clusters)
+        etag = f'"{version}-{hashlib.sha256(png).hexdigest()[:16]}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache", "X-Risk-Max": f"{peak:.3f}", "X-Risk-Basis": basis}
+        if etag in request.headers.get("If-None-Match", ""):
+            return Response(status=304, headers=headers)
+        return Response(png, mimetype="image/png", headers=headers)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify(success=False, message=str(e)), 500
+
+@api_bp.route("/training_queue", methods=["GET"])
+def training_queue():
+    if not is_logged_in(): return jsonify(success=False, message="Not authorized."), 401
+    # Counters are per gunicorn worker; "pid" tells the workers apart.
+    return jsonify(success=True, data=training_queue_stats())
+
+@api_bp.route("/thread_limits", methods=["GET"])
+def thread_limits_route():
+    if not is_logged_in(): return jsonify(success=False, message="Not authorized."), 401
+    data = {"web_worker": thread_limits(), "training_process": None}
+    try:
+        # Measured inside a pool process (the web worker itself when training runs inline).
+        data["training_process"] = run_training(thread_limits, timeout=10)
+    except (TrainingQueueFull, TrainingTimeout) as e:
+        data["training_process_error"] = str(e)
+    return jsonify(success=True, data=data)
+
+@api_bp.route("/model_metrics", methods=["GET"])
+def model_metrics():
+    if not is_logged_in(): return jsonify(success=False, message="Not authorized."), 401
+    table = (request.args.get("table") or session.get("forecast_table", "accidents")).strip()
+    if table not in list_tables(): return jsonify(success=False, message=f'Unknown table "{table}".'), 400
+    try:
+        metrics = latest_model_metrics(table)
+        if metrics is None:
+            return jsonify(success=True, data=None, message="No evaluation has been run for this table yet.")
+        return jsonify(success=True, data=metrics)
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify(success=False, message=str(e)), 500
+
+@api_bp.route("/precompute_status", methods=["GET"])
+def precompute_status_route():
+    if not is_logged_in(): return jsonify(success=False, message="Not authorized."), 401
+    table = (request.args.get("table") or session.get("forecast_table", "accidents")).strip()
+    status = precompute_status(table)
+    if status is None:
+        return jsonify(success=True, data=None, message="No forecasts have been precomputed for this table yet.")
+    try:
+        # A run for an older version is finished as far as the dashboard is concerned.
+        status["stale"] = status["version"] != get_table_version(table)
+    except Exception:
+        status["stale"] = None
+    return jsonify(success=True, data=status)
 
 @api_bp.route("/upload_files", methods=["POST"])
 def upload_files():
@@ -811,6 +1216,10 @@ def upload_files():
         if not file1 or not file2: return jsonify(success=False, message="Please select two files."), 400
         table_name = append_target if append_mode and append_target else custom_name
         processed, saved = process_merge_and_save_to_db(file1, file2, table_name=table_name, append=append_mode)
+        if append_mode:
+            table_appended(table_name)
+        else:
+            table_changed(table_name)
 
         session['forecast_table'] = table_name
 
@@ -868,6 +1277,7 @@ def update_rows():
             updates_made += cursor.rowcount
 
         conn.commit()
+        table_changed(table_name)
 
         return jsonify({"success": True, "message": f"{updates_made} change(s) saved successfully to {table_name}."})
 
@@ -901,6 +1311,7 @@ def delete_file():
         conn = get_db_connection(); cursor = conn.cursor()
         cursor.execute(f"DROP TABLE IF EXISTS `{table_name}`;"); conn.commit()
         cursor.close(); conn.close()
+        table_dropped(table_name)
         return jsonify({"success": True, "message": f"Table {table_name} deleted successfully."})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
@@ -951,6 +1362,9 @@ def append_table():
             cursor.execute(f"DROP TABLE `{source_table}`;")
 
         conn.commit()
+        table_appended(target_table)
+        if delete_source:
+            table_dropped(source_table)
         
         session['forecast_table'] = target_table
         
@@ -1167,25 +1581,14 @@ def forecast_hourly():
         conn.close()
 
         where_sql, params = build_filter_query(cols)
-        
-        hour_expr = "CAST(`HOUR_COMMITTED` AS SIGNED)" if "HOUR_COMMITTED" in cols else \
-                    "HOUR(`TIME_COMMITTED`)" if "TIME_COMMITTED" in cols else \
-                    "HOUR(`DATE_COMMITTED`)"
-        
-        if not hour_expr.startswith("CAST") and not hour_expr.startswith("HOUR"):
-             return jsonify(success=False, message="No suitable hour/time column found for forecasting.")
-
-        result = run_categorical_forecast(
-            table_name=table,
-            grouping_key=hour_expr,
-            model_type=model,
-            forecast_horizon=horizon,
-            where_sql=where_sql,
-            params=params
-        )
-        
-        return jsonify(**result)
 
+        if use_hierarchy():
+            return jsonify(**hierarchical_chart("hourly", table, model, horizon, where_sql, params))
+
+        return jsonify(**per_chart_forecast("hourly", table, cols, model, horizon, where_sql, params))
+
+    except (TrainingQueueFull, TrainingTimeout) as e:
+        return training_busy_response(e)
     except Exception as e:
         import traceback
         error_trace = traceback.format_exc()
@@ -1216,48 +1619,40 @@ def forecast_day_of_week():
             return jsonify(success=False, message="VICTIM_COUNT column not found in table.")
 
         where_sql, params = build_filter_query(cols)
-        weekday_expr = "WEEKDAY(`DATE_COMMITTED`)" if "DATE_COMMITTED" in cols else "CAST(`WEEKDAY` AS SIGNED)"
-        
-        count_result = run_categorical_forecast(
-            table_name=table, grouping_key=weekday_expr, model_type=model_req,
-            forecast_horizon=horizon, where_sql=where_sql, params=params
-        )
-        
-        victim_result = run_numerical_forecast(
-            table_name=table, grouping_key=weekday_expr, target_column=victim_col,
-            model_type=model_req, forecast_horizon=horizon, where_sql=where_sql, params=params
-        )
+        if use_hierarchy():
+            result = hierarchical_chart("day_of_week", table, model_req, horizon, where_sql, params)
+        else:
+            result = per_chart_forecast("day_of_week", table, cols, model_req, horizon, where_sql, params)
 
-        if not count_result.get("success") or not victim_result.get("success"):
+        if not result.get("success"):
             return jsonify(success=False, message="Failed to generate one or both forecasts.")
 
         day_map = {0: "1. Monday", 1: "2. Tuesday", 2: "3. Wednesday", 3: "4. Thursday", 4: "5. Friday", 5: "6. Saturday", 6: "7. Sunday"}
-        labels = [day_map.get(int(label)) for label in count_result["data"]["labels"]]
+        labels = [day_map.get(int(label)) for label in result["data"]["labels"]]
 
-        h_counts = np.array(count_result["data"]["historical"])
-        f_counts = np.array(count_result["data"]["forecast"])
-        h_victims = np.array(victim_result["historical"])
-        f_victims = np.array(victim_result["forecast"])
+        series = result["data"]["targets"]
+        h_counts = np.array(series["count"]["historical"])
+        f_counts = np.array(series["count"]["forecast"])
+        h_victims = np.array(series["victims"]["historical"])
+        f_victims = np.array(series["victims"]["forecast"])
 
         h_avg = np.divide(h_victims, h_counts, out=np.zeros_like(h_victims, dtype=float), where=h_counts!=0)
         f_avg = np.divide(f_victims, f_counts, out=np.zeros_like(f_victims, dtype=float), where=f_counts!=0)
 
-        model_display_name = 'Random Forest'
-        if model_req == 'adaboost':
-            model_display_name = 'Decision Tree'
-
         final_data = {
             "labels": labels,
             "historical_counts": h_counts.tolist(),
             "forecast_counts": f_counts.tolist(),
             "historical_avg_victims": np.round(h_avg, 2).tolist(),
             "forecast_avg_victims": np.round(f_avg, 2).tolist(),
-            "model_used": model_display_name,
+            "model_used": model_display_name(model_req),
             "horizon": horizon
         }
         
         return jsonify(success=True, data=final_data)
 
+    except (TrainingQueueFull, TrainingTimeout) as e:
+        return training_busy_response(e)
     except Exception as e:
         import traceback
         return jsonify(success=False, message=f"<pre>{traceback.format_exc()}</pre>"), 500
@@ -1282,43 +1677,16 @@ def forecast_top_barangays():
             cur.close(); conn.close()
             return jsonify(success=False, message="No BARANGAY column found."), 200
 
-        where_sql, params = build_filter_query(cols)
-        
-        top_10_query = f"""
-            SELECT `{brgy_col}` FROM `{table}` {where_sql}
-            GROUP BY `{brgy_col}` ORDER BY COUNT(*) DESC LIMIT 10
-        """
-        cur.execute(top_10_query, params)
-        top_10_barangays = [row[0] for row in cur.fetchall()]
         cur.close(); conn.close()
+        where_sql, params = build_filter_query(cols)
 
-        if not top_10_barangays:
-            return jsonify(success=False, message="Not enough data to determine top barangays for forecasting.")
+        if use_hierarchy():
+            return jsonify(**hierarchical_chart("top_barangays", table, model, horizon, where_sql, params))
 
-        brgy_placeholders = []
-        for i, brgy_name in enumerate(top_10_barangays):
-            key = f"brgy_{i}"
-            brgy_placeholders.append(f"%({key})s")
-            params[key] = brgy_name
-            
-        brgy_in_clause = ", ".join(brgy_placeholders)
-        
-        if where_sql:
-            where_sql += f" AND `{brgy_col}` IN ({brgy_in_clause})"
-        else:
-            where_sql = f"WHERE `{brgy_col}` IN ({brgy_in_clause})"
-
-        result = run_categorical_forecast(
-            table_name=table,
-            grouping_key=brgy_col,
-            model_type=model,
-            forecast_horizon=horizon,
-            where_sql=where_sql,
-            params=params
-        )
-        
-        return jsonify(**result)
+        return jsonify(**per_chart_forecast("top_barangays", table, cols, model, horizon, where_sql, params))
 
+    except (TrainingQueueFull, TrainingTimeout) as e:
+        return training_busy_response(e)
     except Exception as e:
         import traceback
         return jsonify(success=False, message=f"<pre>{traceback.format_exc()}</pre>"), 500
@@ -1339,40 +1707,27 @@ def forecast_alcohol_by_hour():
         cols = {str(r[0]) for r in cur.fetchall()}
         cur.close(); conn.close()
 
-        hour_expr = "CAST(`HOUR_COMMITTED` AS SIGNED)" if "HOUR_COMMITTED" in cols else \
-                    "HOUR(`TIME_COMMITTED`)" if "TIME_COMMITTED" in cols else \
-                    "HOUR(`DATE_COMMITTED`)"
-        
         alc_cat_col = next((c for c in ["ALCOHOL_USED_CLUSTER", "ALCOHOL_USED", "ALCOHOL_INVOLVEMENT"] if c in cols), None)
         
         if not alc_cat_col:
             return jsonify(success=False, message="A categorical alcohol column (e.g., 'ALCOHOL_USED_CLUSTER') is required for this forecast.")
 
-        base_where_sql, base_params = build_filter_query(cols)
-
-        results = {}
-        for status in ["Yes", "No", "Unknown"]:
-            params = base_params.copy()
-            if base_where_sql:
-                where_sql = base_where_sql + f" AND `{alc_cat_col}` = %(alc_status)s"
-            else:
-                where_sql = f"WHERE `{alc_cat_col}` = %(alc_status)s"
-            params['alc_status'] = status
-            results[status] = run_categorical_forecast(
-                table_name=table, grouping_key=hour_expr, model_type=model_req,
-                forecast_horizon=horizon, where_sql=where_sql, params=params
-            )
+        where_sql, params = build_filter_query(cols)
+        statuses = ["Yes", "No", "Unknown"]
+        if use_hierarchy():
+            result = hierarchical_chart("alcohol_by_hour", table, model_req, horizon, where_sql, params)
+        else:
+            result = per_chart_forecast("alcohol_by_hour", table, cols, model_req, horizon, where_sql, params)
 
         df_hist = pd.DataFrame(index=range(24))
         df_fcst = pd.DataFrame(index=range(24))
 
-        for status in ["Yes", "No", "Unknown"]:
-            if results[status].get("success") and results[status]["data"]["labels"]:
-                res_data = results[status]["data"]
-                s_hist = pd.Series(res_data["historical"], index=res_data["labels"], name=f"h_{status.lower()}")
-                s_fcst = pd.Series(res_data["forecast"], index=res_data["labels"], name=f"f_{status.lower()}")
-                df_hist = df_hist.join(s_hist)
-                df_fcst = df_fcst.join(s_fcst)
+        if result.get("success") and result["data"]["labels"]:
+            res_data = result["data"]
+            for status in statuses:
+                series = res_data["targets"][status]
+                df_hist = df_hist.join(pd.Series(series["historical"], index=res_data["labels"], name=f"h_{status.lower()}"))
+                df_fcst = df_fcst.join(pd.Series(series["forecast"], index=res_data["labels"], name=f"f_{status.lower()}"))
 
         df_hist = df_hist.fillna(0).astype(int)
         df_fcst = df_fcst.fillna(0).astype(int)
@@ -1395,10 +1750,6 @@ def forecast_alcohol_by_hour():
         h_unk_pct = np.divide(h_unk * 100, h_total, out=np.zeros_like(h_total, dtype=float), where=h_total!=0)
         f_unk_pct = np.divide(f_unk * 100, f_total, out=np.zeros_like(f_total, dtype=float), where=f_total!=0)
 
-        model_display_name = 'Random Forest'
-        if model_req == 'adaboost':
-            model_display_name = 'Decision Tree'
-
         final_data = {
             "hours": list(range(24)),
             "historical_yes_pct": np.round(h_yes_pct, 2).tolist(),
@@ -1407,12 +1758,14 @@ def forecast_alcohol_by_hour():
             "forecast_no_pct": np.round(f_no_pct, 2).tolist(),
             "historical_unknown_pct": np.round(h_unk_pct, 2).tolist(),
             "forecast_unknown_pct": np.round(f_unk_pct, 2).tolist(),
-            "model_used": model_req,
+            "model_used": model_display_name(model_req),
             "horizon": horizon
         }
         
         return jsonify(success=True, data=final_data)
 
+    except (TrainingQueueFull, TrainingTimeout) as e:
+        return training_busy_response(e)
     except Exception as e:
         import traceback
         return jsonify(success=False, message=f"<pre>{traceback.format_exc()}</pre>"), 500
@@ -1445,30 +1798,11 @@ def forecast_victims_by_age():
             )
             return jsonify(success=False, message=error_msg)
 
-        age_bin_expr = f"""
-            CASE 
-                WHEN `{age_num_col}` IS NULL OR `{age_num_col}` < 10 THEN '0-9'
-                WHEN CAST(`{age_num_col}` AS SIGNED) >= 80 THEN '80+' 
-                ELSE CONCAT(FLOOR(CAST(`{age_num_col}` AS SIGNED)/10)*10, '-', FLOOR(CAST(`{age_num_col}` AS SIGNED)/10)*10 + 9) 
-            END
-        """
-        age_bin_where_condition = f" `{age_num_col}` IS NOT NULL "
-
         where_sql, params = build_filter_query(cols)
-        if where_sql:
-            where_sql += f" AND {age_bin_where_condition}"
+        if use_hierarchy():
+            result = hierarchical_chart("victims_by_age", table, model_req, horizon, where_sql, params)
         else:
-            where_sql = f"WHERE {age_bin_where_condition}"
-        
-        result = run_numerical_forecast(
-            table_name=table,
-            grouping_key=age_bin_expr,
-            target_column=vic_count_col,
-            model_type=model_req,
-            forecast_horizon=horizon,
-            where_sql=where_sql,
-            params=params
-        )
+            result = per_chart_forecast("victims_by_age", table, cols, model_req, horizon, where_sql, params)
 
         if result.get("success"):
             def sort_key(label):
@@ -1488,17 +1822,13 @@ def forecast_victims_by_age():
                 result["historical"] = list(historical)
                 result["forecast"] = list(forecast)
                 
-        model_display_name = 'Random Forest'
-        if model_req == 'adaboost':
-            model_display_name = 'Decision Tree'
-        
         final_payload = {
             "success": result.get("success"),
             "data": {
                 "labels": result.get("labels", []),
                 "historical": result.get("historical", []),
                 "forecast": result.get("forecast", []),
-                "model_used": model_display_name,
+                "model_used": model_display_name(model_req),
                 "horizon": horizon
             } if result.get("success") else None,
             "message": result.get("message")
@@ -1506,6 +1836,8 @@ def forecast_victims_by_age():
 
         return jsonify(final_payload)
 
+    except (TrainingQueueFull, TrainingTimeout) as e:
+        return training_busy_response(e)
     except Exception as e:
         import traceback
         return jsonify(success=False, message=f"<pre>{traceback.format_exc()}</pre>"), 500
@@ -1531,18 +1863,14 @@ def forecast_offense_types():
             return jsonify(success=False, message="No offense type column found.")
 
         where_sql, params = build_filter_query(cols)
-        
-        result = run_categorical_forecast(
-            table_name=table,
-            grouping_key=offense_col,
-            model_type=model,
-            forecast_horizon=horizon,
-            where_sql=where_sql,
-            params=params
-        )
-        
-        return jsonify(**result)
 
+        if use_hierarchy():
+            return jsonify(**hierarchical_chart("offense_types", table, model, horizon, where_sql, params))
+
+        return jsonify(**per_chart_forecast("offense_types", table, cols, model, horizon, where_sql, params))
+
+    except (TrainingQueueFull, TrainingTimeout) as e:
+        return training_busy_response(e)
     except Exception as e:
         import traceback
         return jsonify(success=False, message=f"<pre>{traceback.format_exc()}</pre>"), 500
@@ -1570,17 +1898,13 @@ def forecast_by_season():
 
         where_sql, params = build_filter_query(cols)
 
-        result = run_categorical_forecast(
-            table_name=table,
-            grouping_key=season_col,
-            model_type=model,
-            forecast_horizon=horizon,
-            where_sql=where_sql,
-            params=params
-        )
+        if use_hierarchy():
+            return jsonify(**hierarchical_chart("by_season", table, model, horizon, where_sql, params))
 
-        return jsonify(**result)
+        return jsonify(**per_chart_forecast("by_season", table, cols, model, horizon, where_sql, params))
 
+    except (TrainingQueueFull, TrainingTimeout) as e:
+        return training_busy_response(e)
     except Exception as e:
         import traceback
         return jsonify(success=False, message=f"<pre>{traceback.format_exc()}</pre>"), 500
@@ -1613,6 +1937,7 @@ def delete_rows():
         cursor.execute(query, tuple(row_ids))
         rows_deleted = cursor.rowcount
         conn.commit()
+        table_changed(table_name)
         
         cursor.close()
         conn.close()
@@ -0,0 +1,115 @@
+# app/services/baseline_models.py
+
+"""
+Statistical baseline forecasters in plain NumPy.
+
+The dashboard's "fast" model types. Each one takes every monthly series of a
+chart at once as a (series × months) array, oldest month first, and returns a
+(series × horizon) array of forecasts, so an interactive filter change costs
+one SQL query and a few array operations instead of fitting a tree model.
+
+    seasonal_naive   each future month repeats the same month of the last year
+    moving_average   the mean of the last MOVING_AVERAGE_WINDOW months
+    holt_winters     additive Holt-Winters (level, trend, 12-month season)
+"""
+
+import numpy as np
+
+SEASON = 12
+MOVING_AVERAGE_WINDOW = 3
+
+# model_type -> display name, in the order they are offered in the UI.
+BASELINE_MODELS = {
+    "seasonal_naive": "Seasonal Naive",
+    "moving_average": "Moving Average",
+    "holt_winters": "Holt-Winters",
+}
+
+# Smoothing parameters tried per series (the one-step in-sample error picks one).
+HW_ALPHAS = np.array([0.1, 0.3, 0.5, 0.8])
+HW_BETA = 0.05
+HW_GAMMA = 0.2
+
+
+def is_baseline(model_type) -> bool:
+    return str(model_type or "").lower() in BASELINE_MODELS
+
+
+def seasonal_naive(Y: np.ndarray, horizon: int, season: int = SEASON) -> np.ndarray:
+    """Repeat the last observed season; series shorter than a season repeat their last value."""
+    n_months = Y.shape[1]
+    if n_months < season:
+        return np.repeat(Y[:, -1:], horizon, axis=1)
+    idx = n_months - season + np.arange(horizon) % season
+    return Y[:, idx]
+
+
+def moving_average(Y: np.ndarray, horizon: int, window: int = MOVING_AVERAGE_WINDOW) -> np.ndarray:
+    """Flat forecast at the mean of the last `window` months."""
+    level = Y[:, -window:].mean(axis=1, keepdims=True)
+    return np.repeat(level, horizon, axis=1)
+
+
+def holt_winters(Y: np.ndarray, horizon: int, season: int = SEASON) -> np.ndarray:
+    """
+    Additive Holt-Winters, vectorized over series and candidate alphas.
+
+    With fewer than two seasons of history the seasonal term is dropped
+    (Holt's linear trend). The smoothing recursion is a loop over months; each
+    step updates every (series, alpha) pair at once.
+    """
+    n_series, n_months = Y.shape
+    seasonal = n_months >= 2 * season
+    m = season if seasonal else 1
+    n_alpha = len(HW_ALPHAS)
+
+    if seasonal:
+        first, second = Y[:, :season].mean(axis=1), Y[:, season:2 * season].mean(axis=1)
+        trend0 = (second - first) / season
+        # The first season's mean sits mid-season; the level starts just before month 0.
+        offsets = np.arange(season) - (season - 1) / 2
+        season0 = Y[:, :season] - (first[:, None] + trend0[:, None] * offsets)
+        level0 = first - trend0 * (season + 1) / 2
+    else:
+        level0 = Y[:, 0]
+        trend0 = (Y[:, -1] - Y[:, 0]) / max(1, n_months - 1)
+        season0 = np.zeros((n_series, 1))
+
+    # State for every (alpha, series) pair.
+    alpha = HW_ALPHAS[:, None]
+    level = np.tile(level0, (n_alpha, 1))
+    trend = np.tile(trend0, (n_alpha, 1))
+    seas = np.tile(season0, (n_alpha, 1, 1))
+    sse = np.zeros((n_alpha, n_series))
+    gamma = HW_GAMMA if seasonal else 0.0
+
+    for t in range(n_months):
+        s = seas[:, :, t % m]
+        y = Y[:, t][None, :]
+        sse += (y - (level + trend + s)) ** 2
+        prev_level = level
+        level = alpha * (y - s) + (1 - alpha) * (level + trend)
+        trend = HW_BETA * (level - prev_level) + (1 - HW_BETA) * trend
+        seas[:, :, t % m] = gamma * (y - level) + (1 - gamma) * s
+
+    best = sse.argmin(axis=0)
+    pick = (best, np.arange(n_series))
+    steps = np.arange(1, horizon + 1)
+    season_idx = (n_months + steps - 1) % m
+    forecast = level[pick][:, None] + trend[pick][:, None] * steps + seas[pick][:, season_idx]
+    return np.maximum(forecast, 0.0)
+
+
+_FORECASTERS = {
+    "seasonal_naive": seasonal_naive,
+    "moving_average": moving_average,
+    "holt_winters": holt_winters,
+}
+
+
+def baseline_forecast(model_type: str, Y, horizon: int) -> np.ndarray:
+    """Forecast `horizon` months for every row of `Y` (series × months) with a baseline model."""
+    Y = np.asarray(Y, dtype=np.float64).reshape(-1, np.shape(Y)[-1])
+    if horizon <= 0 or Y.size == 0:
+        return np.zeros((Y.shape[0], max(horizon, 0)))
+    return _FORECASTERS[str(model_type).lower()](Y, horizon)
@@ -2,11 +2,126 @@
 
 import pandas as pd
 import numpy as np
+from dataclasses import dataclass
+from typing import Optional
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.tree import DecisionTreeRegressor
 from ..extensions import get_engine
+from .recursive_forecast import RecursiveSpec, recursive_forecast, feature_index
+from .forecast_store import cached
+from .training_executor import in_training_pool, job_threads
+from .baseline_models import BASELINE_MODELS, baseline_forecast, is_baseline
+from .feature_store import LAG_FEATURES, feature_frame, load_monthly_features, month_grid, monthly_aggregate_sql
+
+DECISION_TREE_MODELS = ('adaboost', 'decision_tree')  # 'adaboost' is the UI's historical value
+TREE_FEATURES = LAG_FEATURES + ['month', 'category_code']
+
+def model_display_name(model_type: str) -> str:
+    """Chart-title name for a `model` request parameter."""
+    model_type = str(model_type or '').lower()
+    if model_type in BASELINE_MODELS:
+        return BASELINE_MODELS[model_type]
+    return 'Decision Tree' if model_type in DECISION_TREE_MODELS else 'Random Forest'
+
+def _tree_model(model_type: str):
+    if str(model_type or '').lower() in DECISION_TREE_MODELS:
+        return DecisionTreeRegressor(max_depth=5, random_state=42)
+    return RandomForestRegressor(n_estimators=100, random_state=42, min_samples_leaf=2, n_jobs=job_threads())
+
+def _runs_inline(arguments: dict) -> bool:
+    # Baselines take milliseconds; sending them to the training pool would cost more.
+    return is_baseline(arguments.get('model_type'))
+
+def _lag_spec(feature_cols: list, future_dates: pd.DatetimeIndex) -> RecursiveSpec:
+    """
+    Recursive update shared by the dashboard forecasters: the prediction
+    becomes lag_1, older lags shift down, rolling_mean_3 is the mean of the
+    three lags and `month` takes the month that was just forecast.
+    """
+    col = feature_index(feature_cols)
+    return RecursiveSpec(
+        lags=(col['lag_1_month'], col['lag_2_month'], col['lag_3_month']),
+        rolling=col['rolling_mean_3'],
+        calendar={col['month']: future_dates.month},
+    )
+
+def tree_training_rows(all_categories: list, month_dates: pd.DatetimeIndex, Y: np.ndarray, value_name: str,
+                       features: dict = None):
+    """
+    (ts, last_known_data) of the categorical/numerical tree forecasters: the
+    feature_frame rows with a full set of lags, with `category` as an ordered
+    Categorical and its `category_code`, and each category's last row, which
+    seeds the recursive forecast. ts is empty with fewer than 4 months.
+    """
+    ts = feature_frame(all_categories, month_dates, Y, value_name, features)
+    ts = ts.dropna(subset=LAG_FEATURES).reset_index(drop=True)
+    if ts.empty:
+        return ts, ts
+    ts['category'] = pd.Categorical(ts['category'], categories=all_categories, ordered=True)
+    ts['category_code'] = ts['category'].cat.codes
+    last_known_data = ts.loc[ts.groupby('category_code')['DATE_COMMITTED'].idxmax()]
+    return ts, last_known_data
+
+def forecast_matrix(model_type: str, Y: np.ndarray, month_dates: pd.DatetimeIndex, forecast_horizon: int) -> np.ndarray:
+    """
+    Forecast every monthly series of `Y` (series × months, ending at
+    month_dates[-1]) with one dashboard model: a baseline, or a tree model
+    fitted on the stacked lag features of all series. Returns series × horizon.
+    """
+    if is_baseline(model_type):
+        return baseline_forecast(model_type, Y, forecast_horizon)
+
+    n_series, n_months = Y.shape
+    lag_1, lag_2, lag_3 = Y[:, 2:-1], Y[:, 1:-2], Y[:, :-3]
+    cell_shape = lag_1.shape
+    feature_cols = ['lag_1_month', 'lag_2_month', 'lag_3_month', 'rolling_mean_3', 'month', 'category_code']
+    X_train = np.stack([
+        lag_1, lag_2, lag_3, (lag_1 + lag_2 + lag_3) / 3,
+        np.broadcast_to(month_dates.month.to_numpy()[None, 3:], cell_shape),
+        np.broadcast_to(np.arange(n_series)[:, None], cell_shape),
+    ], axis=-1).reshape(-1, len(feature_cols))
+    model = _tree_model(model_type)
+    model.fit(X_train, Y[:, 3:].reshape(-1))
+
+    # Seed with the lags of the first future month; after each step `month`
+    # moves on to the month that is forecast next.
+    future_dates = pd.date_range(start=month_dates[-1] + pd.DateOffset(months=1), periods=forecast_horizon + 1, freq='ME')
+    X0 = np.column_stack([Y[:, -1], Y[:, -2], Y[:, -3], Y[:, -3:].mean(axis=1),
+                          np.full(n_series, future_dates[0].month), np.arange(n_series)])
+    return recursive_forecast(model, X0, forecast_horizon, _lag_spec(feature_cols, future_dates[1:]))
+
+def _monthly_series(table_name: str, grouping_key: str, target_column: Optional[str], where_sql: str, params: dict):
+    """
+    (categories, month_dates, Y, features) behind a categorical (row counts)
+    or numerical (sums of `target_column`) forecast; Y is categories × months.
+    Unfiltered requests read the grid and its lag features from the feature
+    store; filtered ones aggregate their rows here (features=None).
+    Returns None when no rows match.
+    """
+    if not where_sql:
+        try:
+            return load_monthly_features(table_name, grouping_key, target_column)
+        except Exception as e:
+            print(f"Feature store unavailable for '{table_name}', aggregating per request: {e}")
+
+    # One row per (category, month): COUNT/SUM run in MySQL and only the
+    # aggregates cross the network.
+    conditions = where_sql.replace("WHERE", "AND") if where_sql else ""
+    final_sql = monthly_aggregate_sql(table_name, grouping_key, target_column, conditions)
+    df = pd.read_sql_query(final_sql, get_engine(), params=params, parse_dates=["month_end"])
+    if df.empty:
+        return None
+
+    all_categories = [c.item() if hasattr(c, 'item') else c for c in sorted(df['category'].unique())]
+    cat_idx = pd.Categorical(df['category'], categories=all_categories).codes.astype(np.int64)
+    month_no = (df['month_end'].dt.year * 12 + df['month_end'].dt.month).to_numpy(dtype=np.int64)
+    weights = pd.to_numeric(df['value'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    month_dates, Y = month_grid(all_categories, cat_idx, month_no, weights=weights)
+    return all_categories, month_dates, Y, None
 
 # --- Replace the entire run_categorical_forecast function ---
+@cached("categorical")
+@in_training_pool(inline=_runs_inline)
 def run_categorical_forecast(
     table_name: str,
     grouping_key: str,
@@ -15,105 +130,46 @@ def run_categorical_forecast(
     where_sql: str = "",
     params: dict = None
 ):
-    engine = get_engine()
-    
     GROUPING_ALIAS = "category"
-    is_simple_column = ' ' not in grouping_key and '(' not in grouping_key
-    grouping_key_sql = f"`{grouping_key}`" if is_simple_column else grouping_key
-    
-    query_sql = f"SELECT {grouping_key_sql} AS {GROUPING_ALIAS}, `DATE_COMMITTED` FROM `{table_name}`"
-    base_conditions = f"WHERE {grouping_key_sql} IS NOT NULL AND `DATE_COMMITTED` IS NOT NULL"
-    final_where_sql = base_conditions + (where_sql.replace("WHERE", "AND") if where_sql else "")
-    final_sql = f"{query_sql} {final_where_sql}"
 
-    df = pd.read_sql_query(final_sql, engine, params=params, parse_dates=["DATE_COMMITTED"])
-
-    if df.empty:
+    monthly = _monthly_series(table_name, grouping_key, None, where_sql, params)
+    if monthly is None:
         return {"success": False, "message": "No data found for the selected filters."}
+    all_categories, month_dates, Y, features = monthly
 
-    if not pd.api.types.is_numeric_dtype(df[GROUPING_ALIAS]):
-        df = df[df[GROUPING_ALIAS].str.strip() != '']
-    
-    all_categories = sorted(df[GROUPING_ALIAS].unique())
-
-    ts = (df.groupby([pd.Grouper(key="DATE_COMMITTED", freq="ME"), GROUPING_ALIAS])
-            .size().to_frame("count").reset_index())
-            
-    if ts.empty or len(ts) < 2:
+    if np.count_nonzero(Y) < 2:
         return {"success": False, "message": "Not enough data to create a time-series."}
 
-    date_range = pd.date_range(ts['DATE_COMMITTED'].min(), ts['DATE_COMMITTED'].max(), freq='ME')
-    full_grid = pd.MultiIndex.from_product([date_range, all_categories], names=['DATE_COMMITTED', GROUPING_ALIAS])
-    
-    ts = (ts.set_index(['DATE_COMMITTED', GROUPING_ALIAS])
-            .reindex(full_grid, fill_value=0).reset_index()
-            .sort_values(['DATE_COMMITTED', GROUPING_ALIAS]))
-
-    ts_sorted = ts.sort_values([GROUPING_ALIAS, 'DATE_COMMITTED'])
-    grouped = ts_sorted.groupby(GROUPING_ALIAS)
-    
-    ts['lag_1_month'] = grouped['count'].shift(1)
-    ts['lag_2_month'] = grouped['count'].shift(2)
-    ts['lag_3_month'] = grouped['count'].shift(3)
-    ts['rolling_mean_3'] = grouped['count'].shift(1).rolling(window=3, min_periods=1).mean()
-    ts['month'] = ts['DATE_COMMITTED'].dt.month
-
-    features_with_potential_nans = ['lag_1_month', 'lag_2_month', 'lag_3_month', 'rolling_mean_3']
-    ts = ts.dropna(subset=features_with_potential_nans).reset_index(drop=True)
+    ts, last_known_data = tree_training_rows(all_categories, month_dates, Y, 'count', features)
 
     if ts.empty:
         return {"success": False, "message": "Not enough historical data for features (need at least 3 months)."}
 
-    ts[GROUPING_ALIAS] = pd.Categorical(ts[GROUPING_ALIAS], categories=all_categories, ordered=True)
     category_mapping = dict(enumerate(ts[GROUPING_ALIAS].cat.categories))
-    ts[GROUPING_ALIAS + '_code'] = ts[GROUPING_ALIAS].cat.codes
 
-    feature_cols = ['lag_1_month', 'lag_2_month', 'lag_3_month', 'rolling_mean_3', 'month', GROUPING_ALIAS + '_code']
+    feature_cols = TREE_FEATURES
     X_train = ts[feature_cols]
     y_train = ts['count']
 
-    # Determine proper display name for the model
-    model_display_name = 'Random Forest'
-    if model_type.lower() == 'adaboost':
-        model = DecisionTreeRegressor(max_depth=5, random_state=42)
-        model_display_name = 'Decision Tree'
-    else:
-        model = RandomForestRegressor(n_estimators=100, random_state=42, min_samples_leaf=2, n_jobs=-1)
-        model_display_name = 'Random Forest'
-    
-    model.fit(X_train, y_train)
-
     last_month = ts['DATE_COMMITTED'].max()
     future_dates = pd.date_range(start=last_month + pd.DateOffset(months=1), periods=forecast_horizon, freq='ME')
     
-    last_known_data = ts.loc[ts.groupby(GROUPING_ALIAS + '_code')['DATE_COMMITTED'].idxmax()]
-    last_features_df = last_known_data[feature_cols].copy()
-
-    all_predictions = []
-    for date in future_dates:
-        predictions = model.predict(last_features_df)
-        
-        preds_df = pd.DataFrame({
-            GROUPING_ALIAS + '_code': last_features_df[GROUPING_ALIAS + '_code'],
-            'DATE_COMMITTED': date,
-            'forecast_count': np.round(predictions).astype(int)
-        })
-        all_predictions.append(preds_df)
-
-        next_features_df = pd.DataFrame()
-        next_features_df[GROUPING_ALIAS + '_code'] = last_features_df[GROUPING_ALIAS + '_code']
-        next_features_df['lag_3_month'] = last_features_df['lag_2_month']
-        next_features_df['lag_2_month'] = last_features_df['lag_1_month']
-        next_features_df['lag_1_month'] = predictions
-        next_features_df['month'] = date.month
-        next_features_df['rolling_mean_3'] = next_features_df[['lag_1_month', 'lag_2_month', 'lag_3_month']].mean(axis=1)
-
-        last_features_df = next_features_df[feature_cols]
-        
-    if not all_predictions:
+    if is_baseline(model_type):
+        predictions = baseline_forecast(model_type, Y, forecast_horizon)
+    else:
+        model = _tree_model(model_type)
+        model.fit(X_train.to_numpy(dtype=float), y_train)
+        predictions = recursive_forecast(
+            model, last_known_data[feature_cols].to_numpy(dtype=float), forecast_horizon, _lag_spec(feature_cols, future_dates)
+        )
+    if predictions.size == 0:
         return {"success": False, "message": "Could not generate future predictions."}
-        
-    forecast_df = pd.concat(all_predictions, ignore_index=True)
+
+    forecast_df = pd.DataFrame({
+        GROUPING_ALIAS + '_code': np.repeat(last_known_data[GROUPING_ALIAS + '_code'].to_numpy(), forecast_horizon),
+        'DATE_COMMITTED': np.tile(future_dates.to_numpy(), len(last_known_data)),
+        'forecast_count': np.round(predictions).astype(int).ravel(),
+    })
     forecast_df[GROUPING_ALIAS] = forecast_df[GROUPING_ALIAS + '_code'].map(category_mapping)
 
     historical_summary = ts.groupby(GROUPING_ALIAS)['count'].sum().astype(int)
@@ -133,15 +189,13 @@ def run_categorical_forecast(
             "labels": results_df[GROUPING_ALIAS].tolist(),
             "historical": results_df['historical'].tolist(),
             "forecast": results_df['forecast'].tolist(),
-            "model_used": model_display_name, # --- FIX: Send display name
+            "model_used": model_display_name(model_type),
             "horizon": forecast_horizon
         }
     }
 
-# Keep run_numerical_forecast as it was in the previous step
-# ... (run_numerical_forecast code) ...
-
-# --- Replace the entire run_numerical_forecast function ---
+@cached("numerical")
+@in_training_pool(inline=_runs_inline)
 def run_numerical_forecast(
     table_name: str,
     grouping_key: str,
@@ -151,96 +205,41 @@ def run_numerical_forecast(
     where_sql: str = "",
     params: dict = None
 ):
-    engine = get_engine()
-    
     GROUPING_ALIAS = "category"
     TARGET_ALIAS = "target_sum"
 
-    is_simple_column = ' ' not in grouping_key and '(' not in grouping_key
-    grouping_key_sql = f"`{grouping_key}`" if is_simple_column else grouping_key
-    
-    query_sql = f"SELECT {grouping_key_sql} AS {GROUPING_ALIAS}, `DATE_COMMITTED`, `{target_column}` FROM `{table_name}`"
-    base_conditions = f"WHERE {grouping_key_sql} IS NOT NULL AND `DATE_COMMITTED` IS NOT NULL AND `{target_column}` IS NOT NULL"
-    final_where_sql = base_conditions + (where_sql.replace("WHERE", "AND") if where_sql else "")
-    final_sql = f"{query_sql} {final_where_sql}"
-
-    df = pd.read_sql_query(final_sql, engine, params=params, parse_dates=["DATE_COMMITTED"])
-
-    if df.empty:
+    monthly = _monthly_series(table_name, grouping_key, target_column, where_sql, params)
+    if monthly is None:
         return {"success": False, "message": f"No data for target '{target_column}'."}
+    all_categories, month_dates, Y, features = monthly
 
-    ts = (df.groupby([pd.Grouper(key="DATE_COMMITTED", freq="ME"), GROUPING_ALIAS])
-            .agg(**{TARGET_ALIAS: (target_column, 'sum')})
-            .reset_index())
-
-    all_categories = sorted(df[GROUPING_ALIAS].unique())
-    date_range = pd.date_range(ts['DATE_COMMITTED'].min(), ts['DATE_COMMITTED'].max(), freq='ME')
-    full_grid = pd.MultiIndex.from_product([date_range, all_categories], names=['DATE_COMMITTED', GROUPING_ALIAS])
-    
-    ts = (ts.set_index(['DATE_COMMITTED', GROUPING_ALIAS])
-            .reindex(full_grid, fill_value=0).reset_index()
-            .sort_values(['DATE_COMMITTED', GROUPING_ALIAS]))
-
-    ts_sorted = ts.sort_values([GROUPING_ALIAS, 'DATE_COMMITTED'])
-    grouped = ts_sorted.groupby(GROUPING_ALIAS)
-    
-    ts['lag_1_month'] = grouped[TARGET_ALIAS].shift(1)
-    ts['lag_2_month'] = grouped[TARGET_ALIAS].shift(2)
-    ts['lag_3_month'] = grouped[TARGET_ALIAS].shift(3)
-    ts['rolling_mean_3'] = grouped[TARGET_ALIAS].shift(1).rolling(window=3, min_periods=1).mean()
-    ts['month'] = ts['DATE_COMMITTED'].dt.month
-    
-    features_with_potential_nans = ['lag_1_month', 'lag_2_month', 'lag_3_month', 'rolling_mean_3']
-    ts = ts.dropna(subset=features_with_potential_nans).reset_index(drop=True)
+    ts, last_known_data = tree_training_rows(all_categories, month_dates, Y, TARGET_ALIAS, features)
 
     if ts.empty:
         return {"success": False, "message": "Not enough historical data for numerical forecast."}
 
-    ts[GROUPING_ALIAS] = pd.Categorical(ts[GROUPING_ALIAS], categories=all_categories, ordered=True)
     category_mapping = dict(enumerate(ts[GROUPING_ALIAS].cat.categories))
-    ts[GROUPING_ALIAS + '_code'] = ts[GROUPING_ALIAS].cat.codes
 
-    feature_cols = ['lag_1_month', 'lag_2_month', 'lag_3_month', 'rolling_mean_3', 'month', GROUPING_ALIAS + '_code']
+    feature_cols = TREE_FEATURES
     X_train = ts[feature_cols]
     y_train = ts[TARGET_ALIAS]
 
-    # --- START OF MODEL CHANGE ---
-    if model_type.lower() == 'adaboost':
-        # Now uses DecisionTreeRegressor instead of AdaBoost
-        model = DecisionTreeRegressor(max_depth=5, random_state=42)
-    else:
-        # Default remains RandomForest
-        model = RandomForestRegressor(n_estimators=100, random_state=42, min_samples_leaf=2, n_jobs=-1)
-    # --- END OF MODEL CHANGE ---
-    
-    model.fit(X_train, y_train)
-
     last_month = ts['DATE_COMMITTED'].max()
     future_dates = pd.date_range(start=last_month + pd.DateOffset(months=1), periods=forecast_horizon, freq='ME')
     
-    last_known_data = ts.loc[ts.groupby(GROUPING_ALIAS + '_code')['DATE_COMMITTED'].idxmax()]
-    last_features_df = last_known_data[feature_cols].copy()
-
-    all_predictions = []
-    for date in future_dates:
-        predictions = model.predict(last_features_df)
-        
-        preds_df = pd.DataFrame({
-            GROUPING_ALIAS + '_code': last_features_df[GROUPING_ALIAS + '_code'],
-            'forecast_sum': np.round(predictions).astype(int)
-        })
-        all_predictions.append(preds_df)
-
-        next_features_df = pd.DataFrame()
-        next_features_df[GROUPING_ALIAS + '_code'] = last_features_df[GROUPING_ALIAS + '_code']
-        next_features_df['lag_3_month'] = last_features_df['lag_2_month']
-        next_features_df['lag_2_month'] = last_features_df['lag_1_month']
-        next_features_df['lag_1_month'] = predictions
-        next_features_df['month'] = date.month
-        next_features_df['rolling_mean_3'] = next_features_df[['lag_1_month', 'lag_2_month', 'lag_3_month']].mean(axis=1)
-        last_features_df = next_features_df[feature_cols]
-
-    forecast_df = pd.concat(all_predictions, ignore_index=True)
+    if is_baseline(model_type):
+        predictions = baseline_forecast(model_type, Y, forecast_horizon)
+    else:
+        model = _tree_model(model_type)
+        model.fit(X_train.to_numpy(dtype=float), y_train)
+        predictions = recursive_forecast(
+            model, last_known_data[feature_cols].to_numpy(dtype=float), forecast_horizon, _lag_spec(feature_cols, future_dates)
+        )
+
+    forecast_df = pd.DataFrame({
+        GROUPING_ALIAS + '_code': np.repeat(last_known_data[GROUPING_ALIAS + '_code'].to_numpy(), forecast_horizon),
+        'forecast_sum': np.round(predictions).astype(int).ravel(),
+    })
     forecast_df[GROUPING_ALIAS] = forecast_df[GROUPING_ALIAS + '_code'].map(category_mapping)
 
     historical_summary = ts.groupby(GROUPING_ALIAS)[TARGET_ALIAS].sum().astype(int)
@@ -260,10 +259,120 @@ def run_numerical_forecast(
         "forecast": results_df['forecast'].tolist(),
     }
     
+@dataclass(frozen=True)
+class Target:
+    """
+    One series forecast by run_multi_target_forecast.
+
+    Target("count")                        -> number of rows
+    Target("victims", column="VICTIM_COUNT") -> sum of a numeric column
+    Target("Yes", column="ALCOHOL_USED", equals="Yes") -> rows where column == value
+    """
+    name: str
+    column: Optional[str] = None
+    equals: Optional[object] = None
+
+
+@cached("multi_target")
+@in_training_pool(inline=_runs_inline)
+def run_multi_target_forecast(
+    table_name: str,
+    grouping_key: str,
+    targets: list,
+    model_type: str = 'random_forest',
+    forecast_horizon: int = 12,
+    where_sql: str = "",
+    params: dict = None
+):
+    """
+    Forecast several monthly series per category from a single query and a
+    single model. The rows are aggregated in SQL, one aggregate per target,
+    into a months × categories × targets tensor; one model is fitted on the
+    stacked lag features of every (category, target) series with the target's
+    index as an extra feature.
+    """
+    # One row per (category, month) with one aggregate per target.
+    params = dict(params or {})
+    values = {}
+    for k, target in enumerate(targets):
+        if target.column is None:
+            values[f"target_{k}"] = "COUNT(*)"
+        elif target.equals is None:
+            values[f"target_{k}"] = f"SUM(`{target.column}`)"
+        else:
+            values[f"target_{k}"] = f"SUM(CAST(`{target.column}` AS BINARY) = %(target_equals_{k})s)"
+            params[f"target_equals_{k}"] = str(target.equals)
+    conditions = where_sql.replace("WHERE", "AND") if where_sql else ""
+    final_sql = monthly_aggregate_sql(table_name, grouping_key, None, conditions, values=values)
+    df = pd.read_sql_query(final_sql, get_engine(), params=params, parse_dates=["month_end"])
+
+    if df.empty:
+        return {"success": False, "message": "No data found for the selected filters."}
+
+    all_categories = [c.item() if hasattr(c, 'item') else c for c in sorted(df['category'].unique())]
+    cat_idx = pd.Categorical(df['category'], categories=all_categories).codes.astype(np.int64)
+    month_no = (df['month_end'].dt.year * 12 + df['month_end'].dt.month).to_numpy(dtype=np.int64)
+
+    # months × categories × targets
+    grids = [
+        month_grid(all_categories, cat_idx, month_no,
+                   weights=pd.to_numeric(df[alias], errors='coerce').fillna(0).to_numpy(dtype=float))
+        for alias in values
+    ]
+    month_dates = grids[0][0]
+    Y = np.stack([grid.T for _, grid in grids], axis=-1)
+    n_months, n_cats, n_targets = Y.shape
+
+    if n_months < 4:
+        return {"success": False, "message": "Not enough historical data for features (need at least 3 months)."}
+
+    # Lag features for every (month ≥ 3, category, target) cell.
+    lag_1, lag_2, lag_3 = Y[2:-1], Y[1:-2], Y[:-3]
+    cell_shape = lag_1.shape
+    feature_cols = ['lag_1_month', 'lag_2_month', 'lag_3_month', 'rolling_mean_3', 'month', 'category_code', 'target_code']
+    X_full = np.stack([
+        lag_1, lag_2, lag_3, (lag_1 + lag_2 + lag_3) / 3,
+        np.broadcast_to(month_dates.month.to_numpy()[3:, None, None], cell_shape),
+        np.broadcast_to(np.arange(n_cats)[None, :, None], cell_shape),
+        np.broadcast_to(np.arange(n_targets)[None, None, :], cell_shape),
+    ], axis=-1)
+    X_train = X_full.reshape(-1, len(feature_cols))
+    y_train = Y[3:].reshape(-1)
+
+    future_dates = pd.date_range(start=month_dates[-1] + pd.DateOffset(months=1), periods=forecast_horizon, freq='ME')
+    if is_baseline(model_type):
+        # (category, target) series × months, in the same order as the feature rows
+        predictions = baseline_forecast(model_type, Y.transpose(1, 2, 0).reshape(-1, n_months), forecast_horizon)
+    else:
+        model = _tree_model(model_type)
+        model.fit(X_train, y_train)
+        # Seed each (category, target) series with its last known features.
+        predictions = recursive_forecast(
+            model, X_full[-1].reshape(-1, len(feature_cols)), forecast_horizon, _lag_spec(feature_cols, future_dates)
+        )
+    forecast = np.round(predictions).astype(int).sum(axis=1).reshape(n_cats, n_targets)
+    historical = Y[3:].sum(axis=0).astype(int)
+
+    labels = [c.item() if hasattr(c, 'item') else c for c in all_categories]
+    return {
+        "success": True,
+        "data": {
+            "labels": labels,
+            "targets": {
+                t.name: {"historical": historical[:, k].tolist(), "forecast": forecast[:, k].tolist()}
+                for k, t in enumerate(targets)
+            },
+            "model_used": model_display_name(model_type),
+            "horizon": forecast_horizon
+        }
+    }
+
 # In app/services/dashboard_forecasting.py
 
 # In app/services/dashboard_forecasting.py
 
+@cached("overall_timeseries")
+@in_training_pool(inline=_runs_inline)
 def run_overall_timeseries_forecast(
     table_name: str,
     model_type: str = 'random_forest',
@@ -273,20 +382,22 @@ def run_overall_timeseries_forecast(
 ):
     engine = get_engine()
     
-    query_sql = f"SELECT `DATE_COMMITTED` FROM `{table_name}`"
+    query_sql = f"SELECT LAST_DAY(`DATE_COMMITTED`) AS month_end, COUNT(*) AS cnt FROM `{table_name}`"
     base_conditions = "WHERE `DATE_COMMITTED` IS NOT NULL"
     final_where_sql = base_conditions + (where_sql.replace("WHERE", "AND") if where_sql else "")
-    final_sql = f"{query_sql} {final_where_sql}"
+    final_sql = f"{query_sql} {final_where_sql} GROUP BY month_end"
 
-    df = pd.read_sql_query(final_sql, engine, params=params, parse_dates=["DATE_COMMITTED"])
+    df = pd.read_sql_query(final_sql, engine, params=params, parse_dates=["month_end"])
 
     if df.empty:
         return {"success": False, "message": "No data found for the selected filters."}
 
     # --- START OF FIX ---
 
-    # 1. Create the full time series. We will use this for the historical plot.
-    ts_full = df.set_index('DATE_COMMITTED').resample('ME').size().to_frame('count')
+    # 1. Create the full time series (months without accidents count 0). We will use this for the historical plot.
+    monthly = df.set_index('month_end')['cnt'].astype(int)
+    months = pd.date_range(monthly.index.min(), monthly.index.max(), freq='ME', name='DATE_COMMITTED')
+    ts_full = monthly.groupby(level=0).sum().reindex(months, fill_value=0).to_frame('count')
 
     if len(ts_full) < 4:
         return {"success": False, "message": "Not enough historical data (need at least 4 months)."}
@@ -309,35 +420,18 @@ def run_overall_timeseries_forecast(
     X_train = ts_train[feature_cols]
     y_train = ts_train['count']
 
-    model_display_name = 'Random Forest'
-    if model_type.lower() == 'decision_tree':
-        model = DecisionTreeRegressor(max_depth=5, random_state=42)
-        model_display_name = 'Decision Tree'
-    else:
-        model = RandomForestRegressor(n_estimators=100, random_state=42, min_samples_leaf=2, n_jobs=-1)
-    
-    model.fit(X_train, y_train)
-
     # 5. The forecasting loop starts from the last known features of the TRAINING data.
-    future_predictions = []
-    last_known_features = ts_train[feature_cols].iloc[-1].to_dict()
-    current_features_df = pd.DataFrame([last_known_features])
     last_known_date = ts_train['DATE_COMMITTED'].iloc[-1]
     future_dates = pd.date_range(start=last_known_date + pd.DateOffset(months=1), periods=forecast_horizon, freq='ME')
-
-    for date in future_dates:
-        prediction = model.predict(current_features_df[feature_cols])[0]
-        future_predictions.append(int(np.round(prediction)))
-        prev_lag_1 = current_features_df['lag_1_month'].iloc[0]
-        prev_lag_2 = current_features_df['lag_2_month'].iloc[0]
-        new_features = {
-            'lag_1_month': prediction,
-            'lag_2_month': prev_lag_1,
-            'lag_3_month': prev_lag_2,
-            'rolling_mean_3': np.mean([prediction, prev_lag_1, prev_lag_2]),
-            'month': date.month
-        }
-        current_features_df = pd.DataFrame([new_features])
+    if is_baseline(model_type):
+        predictions = baseline_forecast(model_type, ts_full['count'].to_numpy(dtype=float)[None, :], forecast_horizon)
+    else:
+        model = _tree_model(model_type)
+        model.fit(X_train.to_numpy(dtype=float), y_train)
+        predictions = recursive_forecast(
+            model, ts_train[feature_cols].iloc[[-1]].to_numpy(dtype=float), forecast_horizon, _lag_spec(feature_cols, future_dates)
+        )
+    future_predictions = [int(v) for v in np.round(predictions[0])]
 
     # 6. Prepare the response payload, using the ORIGINAL 'ts_full' for historical data.
     historical_dates = ts_full.index.strftime('%Y-%m-%d').tolist()
@@ -355,7 +449,7 @@ def run_overall_timeseries_forecast(
                 "dates": forecast_dates,
                 "counts": future_predictions
             },
-            "model_used": model_display_name,
+            "model_used": model_display_name(model_type),
             "horizon": forecast_horizon
         }
     }
@@ -6,6 +6,19 @@ from ..extensions import get_db_connection
 
 from ..extensions import get_engine
 from sqlalchemy import text  # <-- ADD THIS IMPORT
+import threading
+
+# Bookkeeping table holding a monotonically increasing data version per table.
+# Anything derived from a table's rows (trained models, cached forecasts, ...)
+# is keyed on this version and goes stale as soon as it is bumped.
+TABLE_VERSIONS = "app_table_versions"
+
+# Versions are read several times per request, so they go through one engine
+# (and its connection pool) per process, and the bookkeeping table is created
+# at most once per process rather than on every read.
+_versions_engine = None
+_versions_table_ready = False
+_versions_lock = threading.Lock()
 
 def ensure_indexes(table_name: str):
     """Ensure database indexes exist for optimal performance"""
@@ -30,6 +43,63 @@ def ensure_indexes(table_name: str):
                 pass  # Index already exists
 
 
+def _versions_conn():
+    """A transaction on the shared versions engine, with the versions table in place."""
+    global _versions_engine, _versions_table_ready
+    if _versions_engine is None or not _versions_table_ready:
+        with _versions_lock:
+            if _versions_engine is None:
+                _versions_engine = get_engine()
+            if not _versions_table_ready:
+                with _versions_engine.begin() as conn:
+                    _ensure_versions_table(conn)
+                _versions_table_ready = True
+    return _versions_engine.begin()
+
+
+def _ensure_versions_table(conn):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS `{TABLE_VERSIONS}` ("
+        " `table_name` VARCHAR(128) PRIMARY KEY,"
+        " `version` BIGINT NOT NULL DEFAULT 1,"
+        " `updated_at` TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    ))
+
+
+def get_table_version(table_name: str) -> int:
+    """Current data version of `table_name` (starts at 1 the first time it is seen)."""
+    with _versions_conn() as conn:
+        row = conn.execute(
+            text(f"SELECT `version` FROM `{TABLE_VERSIONS}` WHERE `table_name` = :t"),
+            {"t": table_name},
+        ).fetchone()
+        if row is not None:
+            return int(row[0])
+        conn.execute(
+            text(f"INSERT IGNORE INTO `{TABLE_VERSIONS}` (`table_name`, `version`) VALUES (:t, 1)"),
+            {"t": table_name},
+        )
+        return 1
+
+
+def bump_table_version(table_name: str) -> int:
+    """Mark `table_name` as changed and return its new data version."""
+    with _versions_conn() as conn:
+        conn.execute(
+            text(
+                f"INSERT INTO `{TABLE_VERSIONS}` (`table_name`, `version`) VALUES (:t, 1) "
+                "ON DUPLICATE KEY UPDATE `version` = `version` + 1"
+            ),
+            {"t": table_name},
+        )
+        row = conn.execute(
+            text(f"SELECT `version` FROM `{TABLE_VERSIONS}` WHERE `table_name` = :t"),
+            {"t": table_name},
+        ).fetchone()
+        return int(row[0])
+
+
 def list_tables() -> set[str]:
     """
     List all tables in the database, excluding system tables.
@@ -46,4 +116,3 @@ def list_tables() -> set[str]:
     tables.discard('users')
     
     return tables
-
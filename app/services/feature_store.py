@@ -0,0 +1,370 @@
+# app/services/feature_store.py
+
+"""
+Persisted monthly aggregates with their lag features.
+
+The dashboard forecasters train on one row per (month, category): the month's
+accident count (or the sum of a numeric column), the three previous months and
+their mean, and the calendar month. For the unfiltered dashboard that grid is
+the same on every request, so it is kept in `app_monthly_features`, one row per
+(table, feature set, month, category) with the lags already filled in, and the
+forecasters read their training matrix straight from it.
+
+A feature set is identified by its grouping expression and target column and
+described by a row in `app_feature_sets`: the table version it reflects, the
+sorted categories and a fingerprint (row count and checksum) per month. When
+the table's version moves on, the per-month fingerprints are recomputed in SQL
+and only the months from the first changed one onwards are re-aggregated and
+rewritten; earlier rows, and their lags, are kept. After a table change the
+known feature sets of the table are refreshed in the background, unless the
+charts are served by hierarchical_forecast (then a read refreshes them).
+
+Filtered requests (any WHERE clause) still build their grid per request, from
+the same GROUP BY query (`monthly_aggregate_sql`) and `feature_frame` helper.
+"""
+
+import hashlib
+import json
+import threading
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from ..extensions import get_engine
+from .database import get_table_version
+
+MONTHLY_FEATURES = "app_monthly_features"
+FEATURE_SETS = "app_feature_sets"
+LAG_FEATURES = ['lag_1_month', 'lag_2_month', 'lag_3_month', 'rolling_mean_3']
+MAX_LAG = 3
+
+_refreshing = set()  # tables with a background refresh in flight
+_refreshing_lock = threading.Lock()
+
+
+def lag_features(Y: np.ndarray) -> dict:
+    """
+    {feature: categories × months} lag arrays for a categories × months grid.
+    The first MAX_LAG months have no full set of lags and are NaN.
+    """
+    n_cats, n_months = Y.shape
+    features = {name: np.full((n_cats, n_months), np.nan) for name in LAG_FEATURES}
+    for lag in range(1, MAX_LAG + 1):
+        features[f'lag_{lag}_month'][:, MAX_LAG:] = Y[:, MAX_LAG - lag:n_months - lag]
+    features['rolling_mean_3'] = (features['lag_1_month'] + features['lag_2_month'] + features['lag_3_month']) / 3
+    return features
+
+
+def feature_frame(categories: list, month_dates: pd.DatetimeIndex, Y: np.ndarray, value_name: str,
+                  features: dict = None) -> pd.DataFrame:
+    """
+    The forecasters' long training frame, one row per (month, category) sorted
+    by month then category: DATE_COMMITTED, category, `value_name`, the lag
+    features (from `features`, else computed from Y) and month.
+    """
+    features = lag_features(Y) if features is None else features
+    n_cats, n_months = Y.shape
+    frame = pd.DataFrame({
+        'DATE_COMMITTED': np.repeat(month_dates.to_numpy(), n_cats),
+        'category': pd.Series(list(categories) * n_months, dtype=object),
+        value_name: Y.T.ravel(),
+    })
+    for name in LAG_FEATURES:
+        frame[name] = features[name].T.ravel()
+    frame['month'] = frame['DATE_COMMITTED'].dt.month
+    return frame
+
+
+def month_grid(categories, cat_idx, month_no, weights=None):
+    """
+    (month_dates, categories × months array) from per-row (or per-group)
+    category codes and month numbers (year * 12 + month).
+    """
+    first_month = int(month_no.min())
+    month_idx = month_no - first_month
+    n_months, n_cats = int(month_idx.max()) + 1, len(categories)
+    Y = np.bincount(cat_idx * n_months + month_idx, weights=weights, minlength=n_cats * n_months)
+    month_dates = pd.date_range(
+        pd.Timestamp(year=(first_month - 1) // 12, month=(first_month - 1) % 12 + 1, day=1), periods=n_months, freq='ME'
+    )
+    return month_dates, Y.reshape(n_cats, n_months).astype(float)
+
+
+def _feature_key(grouping_key: str, target_column) -> str:
+    return hashlib.sha1(f"{grouping_key}\x00{target_column or ''}".encode()).hexdigest()
+
+
+def _category_key(category) -> str:
+    # Labels that differ only in case or accents, or are longer than an index
+    # prefix, must stay distinct rows; the key is their exact text's hash.
+    return hashlib.sha1(str(category).encode()).hexdigest()
+
+
+def _ensure_tables(conn):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS `{FEATURE_SETS}` ("
+        " `table_name` VARCHAR(128) NOT NULL,"
+        " `feature_key` CHAR(40) NOT NULL,"
+        " `grouping_key` TEXT NOT NULL,"
+        " `target_column` VARCHAR(128) NULL,"  # NULL: row counts
+        " `version` BIGINT NOT NULL,"
+        " `categories` MEDIUMTEXT NOT NULL,"  # JSON list, sorted
+        " `fingerprints` MEDIUMTEXT NOT NULL,"  # JSON {"YYYY-MM": [rows, checksum]}
+        " `updated_at` DATETIME NOT NULL,"
+        " PRIMARY KEY (`table_name`, `feature_key`)"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    ))
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS `{MONTHLY_FEATURES}` ("
+        " `table_name` VARCHAR(128) NOT NULL,"
+        " `feature_key` CHAR(40) NOT NULL,"
+        " `month_end` DATE NOT NULL,"
+        " `category_key` CHAR(40) NOT NULL,"  # _category_key(category)
+        " `category` TEXT NOT NULL,"
+        " `value` DOUBLE NOT NULL,"
+        " `lag_1_month` DOUBLE NULL,"
+        " `lag_2_month` DOUBLE NULL,"
+        " `lag_3_month` DOUBLE NULL,"
+        " `rolling_mean_3` DOUBLE NULL,"
+        " PRIMARY KEY (`table_name`, `feature_key`, `month_end`, `category_key`)"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    ))
+
+
+def _grouping_sql(grouping_key: str) -> str:
+    is_simple_column = ' ' not in grouping_key and '(' not in grouping_key
+    return f"`{grouping_key}`" if is_simple_column else grouping_key
+
+
+def _base_where(grouping_key: str, target_column) -> str:
+    g = _grouping_sql(grouping_key)
+    where = f"WHERE {g} IS NOT NULL AND `DATE_COMMITTED` IS NOT NULL"
+    if target_column:
+        where += f" AND `{target_column}` IS NOT NULL"
+    else:
+        # run_categorical_forecast drops blank categories
+        where += f" AND TRIM({g}) <> ''"
+    return where
+
+
+def _month_fingerprints(conn, table: str, grouping_key: str, target_column) -> dict:
+    """{"YYYY-MM": [rows, checksum]}: changes when any row of the month is added, removed or edited."""
+    g = _grouping_sql(grouping_key)
+    row_key = f"CONCAT_WS('|', {g}, `DATE_COMMITTED`" + (f", `{target_column}`)" if target_column else ")")
+    rows = conn.execute(text(
+        f"SELECT YEAR(`DATE_COMMITTED`) * 100 + MONTH(`DATE_COMMITTED`) AS ym, COUNT(*), SUM(CRC32({row_key}))"
+        f" FROM `{table}` {_base_where(grouping_key, target_column)} GROUP BY ym"
+    )).fetchall()
+    return {f"{int(ym) // 100:04d}-{int(ym) % 100:02d}": [int(n), int(crc or 0)] for ym, n, crc in rows if ym is not None}
+
+
+def monthly_aggregate_sql(table: str, grouping_key: str, target_column=None, conditions: str = "",
+                          values: dict = None) -> str:
+    """
+    One row per (category, month) with rows: category, month_end (LAST_DAY)
+    and value (COUNT(*), or SUM of `target_column`). `values` ({alias:
+    aggregate SQL}) selects several aggregates instead of `value`.
+    `conditions` are extra "AND ..." clauses. Categories are grouped on their
+    exact bytes, so labels that differ only in case or accents stay apart, as
+    in pandas.
+    """
+    g = _grouping_sql(grouping_key)
+    if values is None:
+        values = {"value": f"SUM(`{target_column}`)" if target_column else "COUNT(*)"}
+    aggregates = ", ".join(f"{sql} AS {alias}" for alias, sql in values.items())
+    return (
+        f"SELECT ANY_VALUE({g}) AS category, LAST_DAY(`DATE_COMMITTED`) AS month_end, {aggregates}"
+        f" FROM `{table}` {_base_where(grouping_key, target_column)}{conditions}"
+        f" GROUP BY CAST({g} AS BINARY), month_end"
+    )
+
+
+def _aggregate(conn, table: str, grouping_key: str, target_column, since: date = None) -> pd.DataFrame:
+    """category, month_end, value for every (category, month) with rows, from `since` on."""
+    conditions, params = "", {}
+    if since is not None:
+        conditions = " AND `DATE_COMMITTED` >= :since"
+        params["since"] = since
+    rows = conn.execute(text(monthly_aggregate_sql(table, grouping_key, target_column, conditions)), params).fetchall()
+    return pd.DataFrame(rows, columns=['category', 'month_end', 'value'])
+
+
+def _load_rows(conn, table: str, key: str) -> pd.DataFrame:
+    rows = conn.execute(text(
+        f"SELECT `month_end`, `category`, `value`, `lag_1_month`, `lag_2_month`, `lag_3_month`, `rolling_mean_3`"
+        f" FROM `{MONTHLY_FEATURES}` WHERE `table_name` = :t AND `feature_key` = :k"
+    ), {"t": table, "k": key}).fetchall()
+    return pd.DataFrame(rows, columns=['month_end', 'category'] + ['value'] + LAG_FEATURES)
+
+
+def _to_grid(rows: pd.DataFrame, categories: list, columns: list):
+    """(month_dates, {column: categories × months}) from stored rows (categories as stored text)."""
+    month_dates = pd.DatetimeIndex(pd.to_datetime(rows['month_end']).sort_values().unique())
+    cat_idx = pd.Categorical(rows['category'], categories=[str(c) for c in categories]).codes
+    month_idx = month_dates.get_indexer(pd.to_datetime(rows['month_end']))
+    grids = {}
+    for col in columns:
+        grid = np.full((len(categories), len(month_dates)), np.nan)
+        grid[cat_idx, month_idx] = pd.to_numeric(rows[col], errors='coerce').to_numpy(dtype=float)
+        grids[col] = grid
+    return month_dates, grids
+
+
+def _month_key(d) -> str:
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+def _rebuild(conn, table: str, key: str, grouping_key: str, target_column, header, fingerprints: dict, version: int):
+    """Re-aggregate the changed months and rewrite their rows. Returns (categories, month_dates, Y, features)."""
+    old_prints = json.loads(header["fingerprints"]) if header else {}
+    changed = sorted(m for m in set(old_prints) | set(fingerprints) if old_prints.get(m) != fingerprints.get(m))
+    all_months = sorted(fingerprints)
+    incremental = header is not None and changed and changed[0] > all_months[0] and all_months[0] == min(old_prints, default=None)
+    since = pd.Timestamp(changed[0] + "-01") if incremental else None
+
+    fresh = _aggregate(conn, table, grouping_key, target_column, since=since.date() if since is not None else None)
+    fresh['month_end'] = pd.to_datetime(fresh['month_end'])
+    old_categories = json.loads(header["categories"]) if header else []
+    kept = pd.DataFrame(columns=['category', 'month_end', 'value'])
+    if incremental:
+        # Months before the first change are read back from the store; a
+        # category that disappears entirely is only noticed on a full rebuild.
+        stored = _load_rows(conn, table, key)
+        stored['month_end'] = pd.to_datetime(stored['month_end'])
+        by_text = {str(c): c for c in old_categories}
+        kept = stored.loc[stored['month_end'] < since, ['category', 'month_end', 'value']]
+        kept = kept.assign(category=kept['category'].map(by_text))
+        kept = kept[kept['value'] > 0]
+
+    combined = pd.concat([kept, fresh], ignore_index=True)
+    categories = sorted(set(combined['category'].dropna().tolist()) | (set(old_categories) if incremental else set()))
+    categories = [c.item() if hasattr(c, 'item') else c for c in categories]
+    month_end = pd.to_datetime(combined['month_end'])
+    month_no = (month_end.dt.year * 12 + month_end.dt.month).to_numpy(dtype=np.int64)
+    cat_idx = pd.Categorical(combined['category'], categories=categories).codes.astype(np.int64)
+    month_dates, Y = month_grid(categories, cat_idx, month_no, weights=combined['value'].to_numpy(dtype=float))
+    features = lag_features(Y)
+
+    # Rows to (re)write: every category from the first changed month, and
+    # every month of a category the store has not seen before.
+    write = np.zeros(Y.shape, dtype=bool)
+    if incremental:
+        write[:, month_dates >= since] = True
+        write[[i for i, c in enumerate(categories) if c not in old_categories], :] = True
+    else:
+        write[:] = True
+    cat_rows, month_rows = np.nonzero(write)
+    payload = [
+        {
+            "t": table, "k": key, "m": month_dates[j].date(), "ck": _category_key(categories[i]),
+            "c": str(categories[i]), "v": float(Y[i, j]),
+            **{f"f{n}": (None if np.isnan(features[name][i, j]) else float(features[name][i, j]))
+               for n, name in enumerate(LAG_FEATURES)},
+        }
+        for i, j in zip(cat_rows, month_rows)
+    ]
+
+    if incremental:
+        conn.execute(text(
+            f"DELETE FROM `{MONTHLY_FEATURES}` WHERE `table_name` = :t AND `feature_key` = :k AND `month_end` >= :since"
+        ), {"t": table, "k": key, "since": since.date()})
+    else:
+        conn.execute(text(f"DELETE FROM `{MONTHLY_FEATURES}` WHERE `table_name` = :t AND `feature_key` = :k"),
+                     {"t": table, "k": key})
+    if payload:
+        conn.execute(text(
+            f"REPLACE INTO `{MONTHLY_FEATURES}` (`table_name`, `feature_key`, `month_end`, `category_key`, `category`,"
+            " `value`, `lag_1_month`, `lag_2_month`, `lag_3_month`, `rolling_mean_3`)"
+            " VALUES (:t, :k, :m, :ck, :c, :v, :f0, :f1, :f2, :f3)"
+        ), payload)
+    conn.execute(text(
+        f"REPLACE INTO `{FEATURE_SETS}` (`table_name`, `feature_key`, `grouping_key`, `target_column`, `version`,"
+        " `categories`, `fingerprints`, `updated_at`) VALUES (:t, :k, :g, :target, :v, :cats, :prints, :now)"
+    ), {"t": table, "k": key, "g": grouping_key, "target": target_column, "v": int(version),
+        "cats": json.dumps(categories, default=str), "prints": json.dumps(fingerprints), "now": datetime.now()})
+    print(f"Feature store: '{table}' [{grouping_key}|{target_column or 'count'}] v{version} "
+          f"{'from ' + _month_key(since) if incremental else 'rebuilt'}, {len(payload)} rows written.")
+    return categories, month_dates, Y, features
+
+
+def load_monthly_features(table: str, grouping_key: str, target_column: str = None):
+    """
+    (categories, month_dates, Y, features) for the unfiltered table: Y is the
+    categories × months grid of counts (or sums of `target_column`) and
+    `features` its lag arrays, as stored. The store is brought up to the
+    table's current version first. Returns None when the table has no rows.
+    """
+    key = _feature_key(grouping_key, target_column)
+    version = get_table_version(table)
+    engine = get_engine()
+    with engine.begin() as conn:
+        _ensure_tables(conn)
+        header = conn.execute(text(
+            f"SELECT `version`, `categories`, `fingerprints` FROM `{FEATURE_SETS}`"
+            " WHERE `table_name` = :t AND `feature_key` = :k FOR UPDATE"
+        ), {"t": table, "k": key}).mappings().fetchone()
+
+        if header is not None and int(header["version"]) != version:
+            fingerprints = _month_fingerprints(conn, table, grouping_key, target_column)
+            if fingerprints == json.loads(header["fingerprints"]):
+                conn.execute(text(f"UPDATE `{FEATURE_SETS}` SET `version` = :v WHERE `table_name` = :t AND `feature_key` = :k"),
+                             {"v": version, "t": table, "k": key})
+            elif fingerprints:
+                return _rebuild(conn, table, key, grouping_key, target_column, header, fingerprints, version)
+            else:
+                header = None
+        if header is None:
+            fingerprints = _month_fingerprints(conn, table, grouping_key, target_column)
+            if not fingerprints:
+                return None
+            return _rebuild(conn, table, key, grouping_key, target_column, None, fingerprints, version)
+
+        categories = json.loads(header["categories"])
+        rows = _load_rows(conn, table, key)
+    if rows.empty or not categories:
+        return None
+    month_dates, grids = _to_grid(rows, categories, ['value'] + LAG_FEATURES)
+    Y = np.nan_to_num(grids.pop('value'))
+    return categories, month_dates, Y, grids
+
+
+def refresh_feature_sets(table: str) -> None:
+    """Bring every stored feature set of `table` up to its current version."""
+    engine = get_engine()
+    with engine.begin() as conn:
+        _ensure_tables(conn)
+        sets = conn.execute(text(
+            f"SELECT `grouping_key`, `target_column` FROM `{FEATURE_SETS}` WHERE `table_name` = :t"
+        ), {"t": table}).fetchall()
+    for grouping_key, target_column in sets:
+        load_monthly_features(table, grouping_key, target_column)
+
+
+def drop_feature_sets(table: str) -> None:
+    """Forget every feature set of a dropped table."""
+    engine = get_engine()
+    with engine.begin() as conn:
+        _ensure_tables(conn)
+        for store in (MONTHLY_FEATURES, FEATURE_SETS):
+            conn.execute(text(f"DELETE FROM `{store}` WHERE `table_name` = :t"), {"t": table})
+
+
+def schedule_feature_refresh(table: str) -> None:
+    """Refresh `table`'s feature sets in a background thread (one at a time per table)."""
+    with _refreshing_lock:
+        if table in _refreshing:
+            return
+        _refreshing.add(table)
+
+    def _job():
+        try:
+            refresh_feature_sets(table)
+        except Exception as e:
+            print(f"Feature store refresh failed for '{table}': {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(table)
+
+    threading.Thread(target=_job, name=f"features-{table}", daemon=True).start()
@@ -0,0 +1,233 @@
+# app/services/forecast_store.py
+
+"""
+Forecast results shared by every gunicorn worker.
+
+Forecast functions decorated with `@cached("<kind>")` store their result as a
+JSON file under instance/forecasts/<table>/v<version>/. The key covers the
+table's data version and every argument of the call (grouping expression,
+target column(s), where clause and its parameters, model type, horizon), so a
+result can be reused until the table changes.
+
+Identical concurrent requests are single-flighted: the first one takes an
+exclusive file lock on the key and trains, the others block on the lock and
+then read its result instead of training again. A job that times out keeps
+the lock until it finishes in the training pool, and its result is stored.
+"""
+
+import dataclasses
+import functools
+import hashlib
+import inspect
+import json
+import os
+import re
+import shutil
+import threading
+
+from ..config import ARTIFACT_DIR
+from .database import get_table_version
+from .training_executor import TrainingTimeout
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to per-process locks
+    fcntl = None
+
+STORE_DIR = os.path.join(ARTIFACT_DIR, "forecasts")
+KEEP_VERSIONS = 2
+STORE_FORMAT_VERSION = 1
+
+# Arguments holding SQL text rather than values; only these are compared with
+# whitespace collapsed, so the same expression written across several lines
+# shares a key. Bound parameters are kept exactly.
+SQL_ARGUMENTS = ("grouping_key", "where_sql")
+
+# Used instead of flock where fcntl is unavailable (single-process servers).
+_thread_locks = [threading.Lock() for _ in range(64)]
+
+
+def canonical_arguments(value):
+    """JSON-stable form of a call's arguments, for hashing into a cache key."""
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return canonical_arguments(dataclasses.asdict(value))
+    if isinstance(value, dict):
+        return {str(k): canonical_arguments(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [canonical_arguments(v) for v in value]
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    if value is None or isinstance(value, (int, float, bool)):
+        return value
+    return str(value)
+
+
+def forecast_key(kind: str, version: int, arguments: dict) -> str:
+    arguments = {
+        name: " ".join(value.split()) if name in SQL_ARGUMENTS and isinstance(value, str) else value
+        for name, value in arguments.items()
+    }
+    payload = json.dumps(
+        {"v": STORE_FORMAT_VERSION, "kind": kind, "version": int(version), "args": canonical_arguments(arguments)},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _table_dir(table: str) -> str:
+    return os.path.join(STORE_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", table))
+
+
+def _read(path: str):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Forecast store read failed for {path}: {e}")
+        return None
+
+
+def _write(path: str, result: dict) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(result, f, default=str)
+        os.replace(tmp, path)
+    except Exception as e:
+        print(f"Forecast store write skipped for {path}: {e}")
+        try: os.remove(tmp)
+        except OSError: pass
+
+
+def _prune(table: str, version: int) -> None:
+    for name in os.listdir(_table_dir(table)):
+        m = re.fullmatch(r"v(\d+)", name)
+        if m and int(m.group(1)) <= int(version) - KEEP_VERSIONS:
+            shutil.rmtree(os.path.join(_table_dir(table), name), ignore_errors=True)
+
+
+class KeyLock:
+    """
+    Exclusive lock on one key. flock locks belong to the open file, so they
+    also exclude other threads of the same worker.
+
+    A lock that cannot be taken (read-only or missing store directory) does
+    not raise: `held` is False and the caller works without it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.fd = None
+        self.held = False
+        self.error = None
+        self.handed_off = False
+        self.thread_lock = _thread_locks[hash(path) % len(_thread_locks)] if fcntl is None else None
+
+    def __enter__(self):
+        if self.thread_lock is not None:
+            self.thread_lock.acquire()
+            self.held = True
+            return self
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        except OSError as e:
+            self.error = e
+            return self
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except OSError as e:
+            os.close(fd)
+            self.error = e
+            return self
+        self.fd = fd
+        self.held = True
+        return self
+
+    def __exit__(self, *exc):
+        if not self.handed_off:
+            self.release()
+
+    def release(self):
+        if not self.held:
+            return
+        self.held = False
+        if self.thread_lock is not None:
+            self.thread_lock.release()
+            return
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.fd = None
+
+    def release_when_done(self, future, callback=None):
+        """Keep the lock past the with-block until `future` finishes, then run `callback(future)` and release."""
+        def _done(f):
+            try:
+                if callback is not None:
+                    callback(f)
+            finally:
+                self.release()
+        self.handed_off = True
+        future.add_done_callback(_done)
+
+
+def get_or_compute(kind: str, table: str, arguments: dict, compute):
+    """
+    Stored result for (kind, table version, arguments), computing it at most
+    once across workers. Only successful results are stored.
+    """
+    version = get_table_version(table)
+    vdir = os.path.join(_table_dir(table), f"v{int(version)}")
+    key = forecast_key(kind, version, arguments)
+    path = os.path.join(vdir, f"{kind}-{key}.json")
+
+    result = _read(path)
+    if result is not None:
+        return result
+
+    def store(result):
+        if isinstance(result, dict) and result.get("success"):
+            _write(path, result)
+            _prune(table, version)
+
+    def store_job(job):
+        if not job.cancelled() and job.exception() is None:
+            store(job.result())
+
+    with KeyLock(path + ".lock") as lock:
+        if not lock.held:
+            # A broken store must not break the chart.
+            print(f"Forecast store unavailable ({lock.error}); computing '{kind}' directly.")
+            return compute()
+        result = _read(path)  # another worker may have finished while we waited
+        if result is not None:
+            return result
+        try:
+            result = compute()
+        except TrainingTimeout as e:
+            if e.job is not None:
+                # The job keeps training in the pool; keep the key locked
+                # until it finishes so a retry waits for it instead of
+                # starting it again.
+                lock.release_when_done(e.job, store_job)
+            raise
+        store(result)
+        return result
+
+
+def cached(kind: str):
+    """Decorator: serve a forecast function's results from the shared store."""
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            table = arguments.get("table_name", arguments.get("table"))
+            return get_or_compute(kind, table, arguments, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
@@ -1,17 +1,23 @@
+import json
+import threading
+from collections import OrderedDict
 import numpy as np, pandas as pd, folium
+from folium.utilities import JsCode
 from flask import jsonify, request, session, Response
 from datetime import datetime
-from xgboost import XGBRegressor
 from sklearn.ensemble import RandomForestRegressor
 from .database import list_tables
 from ..extensions import get_engine
 from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error, r2_score, mean_squared_error
-from sklearn.model_selection import train_test_split, TimeSeriesSplit
-import joblib
-import os
-
-MODEL_PATH = os.path.join(os.path.dirname(__file__), 'xgboost_hotspot_model.joblib')
+from sklearn.model_selection import train_test_split
+from .model_registry import get_hotspot_model, hotspot_monthly_frame, hotspot_feature_matrix, hotspot_explanations, explanation_drivers
+from .recursive_forecast import RecursiveSpec, recursive_forecast, feature_index
+from .forecast_store import cached
+from .training_executor import in_training_pool, job_threads
+from .hotspot_summary import load_hotspot_summary, summary_window
 
+@cached("rf_monthly")
+@in_training_pool
 def rf_monthly_payload(table: str):
     engine = get_engine()
     df = pd.read_sql_query(
@@ -47,9 +53,9 @@ def rf_monthly_payload(table: str):
     if X_test.empty:
         print("Warning: Test set is empty after split. Skipping metric evaluation.")
     else:
-        eval_rf = RandomForestRegressor(n_estimators=100, random_state=42, min_samples_leaf=2)
-        eval_rf.fit(X_train, y_train)
-        y_pred_test = eval_rf.predict(X_test)
+        eval_rf = RandomForestRegressor(n_estimators=100, random_state=42, min_samples_leaf=2, n_jobs=job_threads())
+        eval_rf.fit(X_train.to_numpy(), y_train)
+        y_pred_test = eval_rf.predict(X_test.to_numpy())
 
         mae = mean_absolute_error(y_test, y_pred_test)
         non_zero_mask = y_test > 0
@@ -62,34 +68,28 @@ def rf_monthly_payload(table: str):
         print(f"R-squared (R2): {r2:.2f}")
         print(f"Root Mean Squared Error (RMSE): {rmse:.2f}\n")
 
-    rf = RandomForestRegressor(n_estimators=100, random_state=42, min_samples_leaf=2)
-    rf.fit(X_full, y_full)
+    rf = RandomForestRegressor(n_estimators=100, random_state=42, min_samples_leaf=2, n_jobs=job_threads())
+    rf.fit(X_full.to_numpy(), y_full)
 
     months_to_forecast = 12
     last_idx = ts.index.max()
     future_idx = pd.date_range(start=last_idx + pd.DateOffset(months=1), periods=months_to_forecast, freq="ME")
 
-    future_preds = []
-    history_series = ts["accident_count"].copy()
-    current_features = ts.iloc[[-1]][feature_cols].copy()
-
-    for i, fdate in enumerate(future_idx):
-        pred = float(np.round(rf.predict(current_features[feature_cols])[0]))
-        future_preds.append(pred)
-        history_plus_future = pd.concat([history_series, pd.Series(future_preds, index=future_idx[: i + 1])])
-        next_row = current_features.copy(); next_row.index = [fdate]
-        next_row.loc[fdate, "lag_3_month"] = current_features["lag_2_month"].values[0]
-        next_row.loc[fdate, "lag_2_month"] = current_features["lag_1_month"].values[0]
-        next_row.loc[fdate, "lag_1_month"] = pred
-        lag12_val = history_plus_future.shift(12).get(fdate, np.nan)
-        if pd.isna(lag12_val):
-            lag12_val = current_features.get("lag_12_month", pd.Series([0.0])).values[0]
-        next_row.loc[fdate, "lag_12_month"] = float(lag12_val)
-        rmean = np.mean([next_row.loc[fdate, "lag_1_month"], next_row.loc[fdate, "lag_2_month"], next_row.loc[fdate, "lag_3_month"],])
-        next_row.loc[fdate, "rolling_mean_3_months"] = float(rmean)
-        next_row.loc[fdate, "month_of_year"] = fdate.month
-        next_row.loc[fdate, "quarter_of_year"] = fdate.quarter
-        current_features = next_row[feature_cols].copy()
+    # Rounded predictions are fed back as lags. lag_12_month is read from the
+    # history 12 months before the month just forecast (13 before the next one).
+    col = feature_index(feature_cols)
+    spec = RecursiveSpec(
+        lags=(col["lag_1_month"], col["lag_2_month"], col["lag_3_month"]),
+        rolling=col["rolling_mean_3_months"],
+        long_lags={col["lag_12_month"]: 13},
+        calendar={col["month_of_year"]: future_idx.month, col["quarter_of_year"]: future_idx.quarter},
+        feedback=np.round,
+    )
+    raw_preds = recursive_forecast(
+        rf, ts.iloc[[-1]][feature_cols].to_numpy(dtype=float), months_to_forecast, spec,
+        history=ts["accident_count"].to_numpy(dtype=float),
+    )
+    future_preds = np.round(raw_preds[0]).tolist()
     
     last_actual_year = ts.index.max().year
     last_year_mask = ts.index.year == last_actual_year
@@ -101,166 +101,180 @@ def rf_monthly_payload(table: str):
     return {"success": True, "data": payload}
 
 
-def build_forecast_map_html(
-    table: str,
-    where_sql: str = "",
-    params: dict = None,
-    start_str: str = "", end_str: str = "", time_from: str = "", time_to: str = "",
-    legacy_time: str = "Live", barangay_filter: str = ""
-):
+DEFAULT_LOCATION = [14.5995, 120.9842]
+# Marker colours by forecast level: none, up to the median, up to the 75th percentile, above.
+HOTSPOT_COLORS = ('grey', 'green', '#ffb200', 'red')
+
+
+# Recursive forecasts per (table, summary version, hour window, model), kept so
+# each window's trajectory is computed once rather than on every map request.
+# A forecast of k months is the first k months of a longer one, so a stored
+# trajectory serves any shorter horizon.
+FORECAST_MEMO_SIZE = 128
+_window_forecasts = OrderedDict()
+_window_forecasts_lock = threading.Lock()
+
+
+def _memo_forecast(key, months: int, compute) -> np.ndarray:
+    """`compute(months)` (hotspots × months), or the first `months` columns of a stored longer run."""
+    if key is None:
+        return compute(months)
+    with _window_forecasts_lock:
+        preds = _window_forecasts.get(key)
+        if preds is not None:
+            _window_forecasts.move_to_end(key)
+    if preds is not None and preds.shape[1] >= months:
+        return preds[:, :months]
+    preds = compute(months)
+    with _window_forecasts_lock:
+        _window_forecasts[key] = preds
+        _window_forecasts.move_to_end(key)
+        while len(_window_forecasts) > FORECAST_MEMO_SIZE:
+            _window_forecasts.popitem(last=False)
+    return preds
+
+
+def _map_view(center, zoom, message=None, time_label=""):
+    return {"center": [float(center[0]), float(center[1])], "zoom": zoom, "message": message,
+            "time_label": time_label, "hotspots": None, "explanations": {}}
+
+
+def hour_window(time_from: str, time_to: str):
+    """(hours of the time_from–time_to window, wrapping past midnight, or None for all hours; display label)"""
+    def parse_hour(hmm: str) -> int | None:
+        if not hmm: return None
+        try: return int(hmm.split(":")[0])
+        except Exception: return None
+
+    h_from, h_to = parse_hour(time_from), parse_hour(time_to)
+    if h_from is None or h_to is None:
+        return None, "00:00–23:00"
+    if h_from <= h_to: hours = list(range(h_from, h_to + 1))
+    else: hours = list(range(h_from, 24)) + list(range(0, h_to + 1))
+    # Create a clearer display string for the popup
+    if h_from == h_to:
+        return hours, f"{h_from:02d}:00–{h_from:02d}:59"
+    return hours, f"{h_from:02d}:00–{h_to:02d}:00"
+
+
+def _rows_window(table: str, where_sql: str, params: dict, hours: list | None):
+    """
+    The rows-based counterpart of hotspot_summary.summary_window for filtered
+    requests. Returns an error message (str) when the table cannot be read,
+    None when it has no hotspot rows, and a window whose "ts" is None when the
+    hour window is empty.
+    """
     engine = get_engine()
-    DEFAULT_LOCATION = [14.5995, 120.9842]
 
     try:
         sql = f"SELECT * FROM `{table}` {where_sql}"
         df_full = pd.read_sql_query(sql, engine, params=params)
     except Exception as e:
         print(f"Error loading data for table '{table}': {e}")
-        m = folium.Map(location=DEFAULT_LOCATION, zoom_start=11)
-        folium.Marker(DEFAULT_LOCATION, popup=f"Error: Could not load data from table '{table}'.").add_to(m)
-        return m.get_root().render()
+        return f"Error: Could not load data from table '{table}'."
 
     if df_full.empty:
-        m = folium.Map(location=DEFAULT_LOCATION, zoom_start=11)
-        return m.get_root().render()
+        return None
     
     df_full["ACCIDENT_HOTSPOT"] = pd.to_numeric(df_full["ACCIDENT_HOTSPOT"], errors='coerce').fillna(-1).astype(int)
-    df_full = df_full[df_full['ACCIDENT_HOTSPOT'] != -1].copy()
-    
-    if df_full.empty:
-        m = folium.Map(location=DEFAULT_LOCATION, zoom_start=11)
-        return m.get_root().render()
+    df_filtered = df_full[df_full['ACCIDENT_HOTSPOT'] != -1].copy()
+    if df_filtered.empty:
+        return None
         
-    print(f"\n--- [EVALUATION] Generating Baseline XGBoost Performance for table: '{table}' (All Hours) ---")
-    df_eval = df_full.copy()
-    df_eval["DATE_COMMITTED"] = pd.to_datetime(df_eval["DATE_COMMITTED"], errors="coerce")
-    df_eval["ACCIDENT_HOTSPOT"] = pd.to_numeric(df_eval["ACCIDENT_HOTSPOT"], errors="coerce").fillna(-1).astype(int)
-    df_eval = df_eval.dropna(subset=["DATE_COMMITTED", "ACCIDENT_HOTSPOT"])
-    time_cluster_cols = [c for c in df_eval.columns if 'TIME_CLUSTER' in str(c)]
-    for col in time_cluster_cols:
-        df_eval[col] = pd.to_numeric(df_eval[col], errors='coerce').fillna(0).astype(int)
-    agg_dict = {col: 'sum' for col in time_cluster_cols}; agg_dict['OFFENSE'] = 'size'
-    ts_data_unfiltered = (df_eval.set_index('DATE_COMMITTED').groupby(['ACCIDENT_HOTSPOT', pd.Grouper(freq='ME')]).agg(agg_dict).rename(columns={'OFFENSE': 'accident_count'}).reset_index())
-    ts_data_unfiltered.sort_values(by=['ACCIDENT_HOTSPOT', 'DATE_COMMITTED'], inplace=True)
-    ts_data_unfiltered['lag_1_month'] = ts_data_unfiltered.groupby('ACCIDENT_HOTSPOT')['accident_count'].shift(1)
-    ts_data_unfiltered['rolling_mean_3_months'] = ts_data_unfiltered.groupby('ACCIDENT_HOTSPOT')['accident_count'].shift(1).rolling(window=3).mean()
-    ts_data_unfiltered['month_of_year'] = ts_data_unfiltered['DATE_COMMITTED'].dt.month
-    ts_data_unfiltered['quarter_of_year'] = ts_data_unfiltered['DATE_COMMITTED'].dt.quarter
-    ts_data_unfiltered = ts_data_unfiltered.dropna().reset_index(drop=True)
-
-    if not ts_data_unfiltered.empty:
-        y_eval = ts_data_unfiltered['accident_count']
-        X_eval = ts_data_unfiltered.drop(columns=['accident_count', 'DATE_COMMITTED'])
-        n_samples = len(X_eval)
-        all_y_test, all_forecasts = [], []
-        if n_samples < 3:
-            print(f"Warning: Only {n_samples} samples available. Skipping cross-validation for performance metrics.")
-        else:
-            n_splits = min(4, n_samples - 1)
-            if n_splits >= 2:
-                tscv = TimeSeriesSplit(n_splits=n_splits)
-                print(f"Starting Cross-Validation with {n_splits} splits for Performance Metrics...")
-                for fold, (train_index, test_index) in enumerate(tscv.split(X_eval), 1):
-                    X_train, X_test = X_eval.iloc[train_index], X_eval.iloc[test_index]
-                    y_train, y_test = y_eval.iloc[train_index], y_eval.iloc[test_index]
-                    if X_test.empty: continue
-                    eval_model = XGBRegressor(objective='count:poisson', n_estimators=1000, learning_rate=0.01, max_depth=4, min_child_weight=1, gamma=0.1, random_state=42, early_stopping_rounds=10)
-                    eval_model.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=False)
-                    forecasts = eval_model.predict(X_test)
-                    all_y_test.append(y_test); all_forecasts.append(forecasts)
-                    fold_mae = mean_absolute_error(y_test, forecasts)
-                    print(f"Fold {fold} complete. MAE: {fold_mae:.2f}")
-            else:
-                 print(f"Warning: Only {n_samples} samples available, resulting in {n_splits} splits. Skipping cross-validation.")
-        print("Cross-validation complete.")
-        if all_y_test:
-                y_test_full = pd.concat(all_y_test)
-                forecasts_full = np.concatenate(all_forecasts)
-                mae = mean_absolute_error(y_test_full, forecasts_full)
-                mse = mean_squared_error(y_test_full, forecasts_full)
-                mape = mean_absolute_percentage_error(y_test_full.replace(0, 1e-6), forecasts_full) * 100
-                r2 = r2_score(y_test_full, forecasts_full)
-                rmse = np.sqrt(mse)
-                print(f"Mean Absolute Error (MAE): {mae:.2f}")
-                print(f"Mean Absolute Percentage Error (MAPE): {mape:.2f}%")
-                print(f"R-squared (R²): {r2:.2f}")
-                print(f"Mean Squared Error (MSE): {mse:.2f}")
-                print(f"Root Mean Squared Error (RMSE): {rmse:.2f}\n")
-        else:
-            print("Warning: Not enough data to perform and report cross-validation metrics.\n")
-    else:
-        print("Warning: Not enough data in the full dataset to perform an evaluation.\n")
-
-    df_filtered = df_full.copy()
-    df_filtered = df_filtered[df_filtered['ACCIDENT_HOTSPOT'] != -1].copy()
     df_filtered["DATE_COMMITTED"] = pd.to_datetime(df_filtered["DATE_COMMITTED"], errors="coerce")
     df_filtered = df_filtered.dropna(subset=["DATE_COMMITTED"]).copy()
     df_filtered["HOUR_COMMITTED"] = pd.to_numeric(df_filtered["HOUR_COMMITTED"], errors="coerce").astype("Int64")
-    
-    def parse_hour(hmm: str) -> int | None:
-        if not hmm: return None
-        try: return int(hmm.split(":")[0])
-        except Exception: return None
-
-    h_from, h_to = parse_hour(time_from), parse_hour(time_to)
-    display_hour_str = ""
-    use_range = (h_from is not None) and (h_to is not None)
-
-    if use_range:
-        if h_from <= h_to: hours = list(range(h_from, h_to + 1))
-        else: hours = list(range(h_from, 24)) + list(range(0, h_to + 1))
+    if hours is not None:
         df_filtered = df_filtered.dropna(subset=["HOUR_COMMITTED"])
         df_filtered = df_filtered[df_filtered["HOUR_COMMITTED"].astype(int).isin(hours)].copy()
-        
-        # --- START OF MODIFICATION ---
-        # Create a clearer display string for the popup
-        if h_from == h_to:
-            display_hour_str = f"{h_from:02d}:00–{h_from:02d}:59"
-        else:
-            display_hour_str = f"{h_from:02d}:00–{h_to:02d}:00"
-        # --- END OF MODIFICATION ---
-    else:
-        display_hour_str = "00:00–23:00"
-
-    safe_center_lat = df_filtered["LATITUDE"].astype(float).mean(); safe_center_lon = df_filtered["LONGITUDE"].astype(float).mean()
-    if pd.isna(safe_center_lat) or pd.isna(safe_center_lon): safe_center_lat, safe_center_lon = DEFAULT_LOCATION
 
+    center_lat = df_filtered["LATITUDE"].astype(float).mean(); center_lon = df_filtered["LONGITUDE"].astype(float).mean()
+    if pd.isna(center_lat) or pd.isna(center_lon): center_lat, center_lon = DEFAULT_LOCATION
     if df_filtered.empty:
-        m = folium.Map(location=[safe_center_lat, safe_center_lon], zoom_start=13)
-        return m.get_root().render()
-        
-    time_cluster_cols_fcst = [c for c in df_filtered.columns if 'TIME_CLUSTER' in str(c)]
-    for col in time_cluster_cols_fcst:
-        df_filtered[col] = pd.to_numeric(df_filtered[col], errors='coerce').fillna(0).astype(int)
-    agg_dict_fcst = {col: 'sum' for col in time_cluster_cols_fcst}; agg_dict_fcst['OFFENSE'] = 'size' 
-    ts_aggregated_fcst = (df_filtered.set_index('DATE_COMMITTED').groupby(['ACCIDENT_HOTSPOT', pd.Grouper(freq='ME')]).agg(agg_dict_fcst).rename(columns={'OFFENSE': 'accident_count'}).reset_index())
-    all_clusters_fcst = pd.DataFrame({'ACCIDENT_HOTSPOT': df_filtered['ACCIDENT_HOTSPOT'].unique()})
-    
-    if df_filtered.empty or df_filtered['DATE_COMMITTED'].isnull().all():
-        m = folium.Map(location=DEFAULT_LOCATION, zoom_start=11)
-        return m.get_root().render()
+        return {"ts": None, "center": (center_lat, center_lon)}
+
+    return {
+        "ts": hotspot_monthly_frame(df_filtered),
+        "last_date": df_filtered["DATE_COMMITTED"].max(),
+        "hotspots": df_filtered['ACCIDENT_HOTSPOT'].unique(),
+        "centroids": df_filtered.groupby('ACCIDENT_HOTSPOT').agg(Center_Lat=('LATITUDE','mean'), Center_Lon=('LONGITUDE','mean')).reset_index(),
+        "members": df_filtered[['ACCIDENT_HOTSPOT','BARANGAY']].dropna(),
+        "center": (center_lat, center_lon),
+    }
+
+
+def hotspot_recursive_spec(feature_names: list, forecast_months: list) -> RecursiveSpec:
+    """
+    How the map rolls a hotspot's last feature row forward through
+    `forecast_months` (one month after the last known month onwards).
+    """
+    # Each hotspot is its own one-row series, so its 3-month rolling mean
+    # (min_periods=1) is just the latest prediction.
+    col = feature_index(feature_names)
+    next_months = pd.DatetimeIndex([d + pd.DateOffset(months=1) for d in forecast_months])
+    return RecursiveSpec(
+        lags=(col['lag_1_month'],), rolling=col['rolling_mean_3_months'], rolling_window=1,
+        calendar={col['month_of_year']: next_months.month, col['quarter_of_year']: next_months.quarter},
+    )
+
+
+def hotspot_map_data(
+    table: str,
+    where_sql: str = "",
+    params: dict = None,
+    start_str: str = "", end_str: str = "", time_from: str = "", time_to: str = "",
+    training_budget: float | None = None
+) -> dict:
+    """
+    Actual and forecast accident totals per hotspot for the selected months and
+    hour range, with centroids, member barangays and colour buckets. Both the
+    folium page and /api/hotspots.json are rendered from this.
 
-    month_range_fcst = pd.date_range(df_filtered['DATE_COMMITTED'].min(), df_filtered['DATE_COMMITTED'].max(), freq='ME')
-    full_grid_fcst = pd.MultiIndex.from_product([all_clusters_fcst['ACCIDENT_HOTSPOT'], month_range_fcst], names=['ACCIDENT_HOTSPOT','DATE_COMMITTED']).to_frame(index=False)
-    ts_data_for_forecast = pd.merge(full_grid_fcst, ts_aggregated_fcst, on=['ACCIDENT_HOTSPOT','DATE_COMMITTED'], how='left').fillna(0).sort_values(['ACCIDENT_HOTSPOT','DATE_COMMITTED']).reset_index(drop=True)
-    ts_data_for_forecast['lag_1_month'] = ts_data_for_forecast.groupby('ACCIDENT_HOTSPOT')['accident_count'].shift(1)
-    ts_data_for_forecast['rolling_mean_3_months'] = ts_data_for_forecast.groupby('ACCIDENT_HOTSPOT')['accident_count'].shift(1).rolling(window=3).mean()
-    ts_data_for_forecast['month_of_year'] = ts_data_for_forecast['DATE_COMMITTED'].dt.month
-    ts_data_for_forecast['quarter_of_year'] = ts_data_for_forecast['DATE_COMMITTED'].dt.quarter
-    ts_data_for_forecast = ts_data_for_forecast.dropna().reset_index(drop=True)
+    Returns {"center", "zoom", "message", "time_label", "explanations",
+    "hotspots"}; "hotspots" is a DataFrame (None when there is nothing to show,
+    in which case "message" may say why).
+    """
+    hours, display_hour_str = hour_window(time_from, time_to)
+
+    # The unfiltered map (any hour window) is served from the persisted hotspot
+    # summary; other filters need the rows.
+    summary = None
+    if not where_sql:
+        try:
+            summary = load_hotspot_summary(table)
+        except Exception as e:
+            print(f"Hotspot summary unavailable for '{table}', reading rows: {e}")
+
+    if summary is not None:
+        if summary["hotspots"].size == 0:
+            return _map_view(DEFAULT_LOCATION, 11)
+        window = summary_window(summary, hours)
+        if window is None:
+            return _map_view(DEFAULT_LOCATION, 13, time_label=display_hour_str)
+    else:
+        window = _rows_window(table, where_sql, params, hours)
+        if isinstance(window, str):
+            return _map_view(DEFAULT_LOCATION, 11, window)
+        if window is None:
+            return _map_view(DEFAULT_LOCATION, 11)
+        if window["ts"] is None:
+            return _map_view(window["center"], 13, time_label=display_hour_str)
+
+    ts_data_for_forecast = window["ts"]
+    safe_center_lat, safe_center_lon = window["center"]
 
     if ts_data_for_forecast.empty:
-        m = folium.Map(location=[safe_center_lat, safe_center_lon], zoom_start=13)
-        folium.Marker([safe_center_lat, safe_center_lon], popup="Not enough historical data for the selected filters to generate a forecast.").add_to(m)
-        return m.get_root().render()
+        return _map_view([safe_center_lat, safe_center_lon], 13, "Not enough historical data for the selected filters to generate a forecast.", display_hour_str)
 
-    y_final = ts_data_for_forecast['accident_count']
-    X_final = ts_data_for_forecast.drop(columns=['accident_count','DATE_COMMITTED'])
-    X_final['ACCIDENT_HOTSPOT'] = X_final['ACCIDENT_HOTSPOT'].astype(int)
-    final_model = XGBRegressor(objective='count:poisson', n_estimators=1000, learning_rate=0.01, max_depth=4, random_state=42)
-    final_model.fit(X_final, y_final, verbose=False)
+    # The model is trained once per table version on the whole table; here we
+    # only run inference on the filtered hotspot/month features. If no model
+    # exists yet it is fitted within `training_budget` seconds.
+    final_model, model_meta = get_hotspot_model(table, budget_seconds=training_budget)
+    feature_names = model_meta["features"]
+    # Precomputed with the model; explains each hotspot's latest prediction.
+    explanations = hotspot_explanations(table) or {}
 
-    last_known_date = df_filtered["DATE_COMMITTED"].max()
+    last_known_date = window["last_date"]
     next_month_after_last = last_known_date + pd.offsets.MonthBegin(1)
     start_date = pd.to_datetime(f"{start_str}-01", errors="coerce") if start_str else next_month_after_last
     if end_str:
@@ -279,22 +293,25 @@ def build_forecast_map_html(
     future_forecast_df = pd.DataFrame()
     if end_date > last_known_month:
         months_to_forecast = (end_date.year - last_known_month.year)*12 + (end_date.month - last_known_month.month)
-        last_rows_idx = ts_data_for_forecast.groupby('ACCIDENT_HOTSPOT')['DATE_COMMITTED'].idxmax()
-        current_features_df = ts_data_for_forecast.loc[last_rows_idx].copy()
-        feature_names = X_final.columns.tolist()
-        preds_accum = []
-        for i in range(months_to_forecast):
-            current_X = current_features_df[feature_names]
-            current_X['ACCIDENT_HOTSPOT'] = current_X['ACCIDENT_HOTSPOT'].astype(int)
-            preds = final_model.predict(current_X)
-            next_month = last_known_month + pd.DateOffset(months=i+1)
-            preds_accum.append(pd.DataFrame({'ACCIDENT_HOTSPOT': current_features_df['ACCIDENT_HOTSPOT'].values, 'DATE_COMMITTED': next_month, 'accident_count': preds}))
-            current_features_df['lag_1_month'] = preds
-            current_features_df['rolling_mean_3_months'] = current_features_df.groupby('ACCIDENT_HOTSPOT')['lag_1_month'].transform(lambda x: x.rolling(3, 1).mean())
-            nm = next_month + pd.DateOffset(months=1)
-            current_features_df['month_of_year'] = nm.month
-            current_features_df['quarter_of_year'] = nm.quarter
-        future_forecast_df = pd.concat(preds_accum, ignore_index=True) if preds_accum else pd.DataFrame()
+        last_rows = ts_data_for_forecast.loc[ts_data_for_forecast.groupby('ACCIDENT_HOTSPOT')['DATE_COMMITTED'].idxmax()]
+        current_X = hotspot_feature_matrix(last_rows, feature_names)
+        forecast_months = [last_known_month + pd.DateOffset(months=i+1) for i in range(months_to_forecast)]
+        spec = hotspot_recursive_spec(feature_names, forecast_months)
+        # Only the summary path is memoized: its window is fully named by the
+        # hours, whereas filtered row windows are as many as the filters.
+        memo_key = None
+        if "version" in window:
+            memo_key = (table, window["version"], None if hours is None else tuple(hours),
+                        model_meta.get("version"), model_meta.get("trained_at"))
+        preds = _memo_forecast(
+            memo_key, months_to_forecast,
+            lambda n: recursive_forecast(final_model, current_X.to_numpy(dtype=float), n, spec),
+        )
+        future_forecast_df = pd.DataFrame({
+            'ACCIDENT_HOTSPOT': np.repeat(last_rows['ACCIDENT_HOTSPOT'].to_numpy(), months_to_forecast),
+            'DATE_COMMITTED': np.tile(np.array(forecast_months, dtype='datetime64[ns]'), len(last_rows)),
+            'accident_count': preds.ravel(),
+        })
         if not future_forecast_df.empty:
             future_forecast_df = future_forecast_df[(future_forecast_df['DATE_COMMITTED'] >= start_date) & (future_forecast_df['DATE_COMMITTED'] <= end_date)]
 
@@ -303,43 +320,136 @@ def build_forecast_map_html(
     if not future_forecast_df.empty: future_summary = (future_forecast_df.groupby('ACCIDENT_HOTSPOT')['accident_count'].sum().to_frame('Total_Forecasted_Accidents').reset_index())
     else: future_summary = pd.DataFrame(columns=['ACCIDENT_HOTSPOT','Total_Forecasted_Accidents'])
     
-    barangay_counts = (df_filtered.groupby(['ACCIDENT_HOTSPOT','BARANGAY']).size().to_frame('count').reset_index())
-    def format_barangay_list(group):
-        unique_barangays = sorted(group['BARANGAY'].unique())
-        items = [f"<li>{name}</li>" for name in unique_barangays]
-        return '<ul style="margin: 5px 0 0 15px; padding: 0; max-height: 150px; overflow-y: auto;">' + "".join(items) + "</ul>"
-    barangay_html_lists = (barangay_counts.groupby('ACCIDENT_HOTSPOT').apply(format_barangay_list).to_frame(name='Barangay_HTML').reset_index())
-    centroids = (df_filtered.groupby('ACCIDENT_HOTSPOT').agg(Center_Lat=('LATITUDE','mean'), Center_Lon=('LONGITUDE','mean')).reset_index())
-    final_map_data = (pd.DataFrame({'ACCIDENT_HOTSPOT': df_filtered['ACCIDENT_HOTSPOT'].unique()}).merge(hist_summary, on='ACCIDENT_HOTSPOT', how='left').merge(future_summary, on='ACCIDENT_HOTSPOT', how='left').merge(centroids, on='ACCIDENT_HOTSPOT', how='left').merge(barangay_html_lists, on='ACCIDENT_HOTSPOT', how='left'))
+    members = window["members"].drop_duplicates().sort_values(['ACCIDENT_HOTSPOT','BARANGAY'])
+    barangays = members.groupby('ACCIDENT_HOTSPOT')['BARANGAY'].agg(list).to_frame(name='Barangays').reset_index()
+    final_map_data = (pd.DataFrame({'ACCIDENT_HOTSPOT': window["hotspots"]}).merge(hist_summary, on='ACCIDENT_HOTSPOT', how='left').merge(future_summary, on='ACCIDENT_HOTSPOT', how='left').merge(window["centroids"], on='ACCIDENT_HOTSPOT', how='left').merge(barangays, on='ACCIDENT_HOTSPOT', how='left'))
     final_map_data[['Total_Actual_Accidents','Total_Forecasted_Accidents']] = final_map_data[['Total_Actual_Accidents','Total_Forecasted_Accidents']].fillna(0).astype(float)
-    final_map_data = final_map_data[final_map_data['ACCIDENT_HOTSPOT'] != -1].copy()
+    final_map_data = final_map_data[final_map_data['ACCIDENT_HOTSPOT'] != -1]
+    final_map_data = final_map_data.dropna(subset=['Center_Lat', 'Center_Lon']).reset_index(drop=True)
     
     nz_forecast = final_map_data.loc[final_map_data['Total_Forecasted_Accidents'] > 0, 'Total_Forecasted_Accidents']
     median_th, high_th = (nz_forecast.quantile(0.50), nz_forecast.quantile(0.75)) if not nz_forecast.empty else (0.0, 0.0)
-    def color_for(v):
-        if v < 0.01: return 'grey'
-        if v <= median_th: return 'green'
-        if v <= high_th: return '#ffb200'
-        return 'red'
-     
-    map_center_lat = df_filtered["LATITUDE"].astype(float).mean()
-    map_center_lon = df_filtered["LONGITUDE"].astype(float).mean()
-    if pd.isna(map_center_lat) or pd.isna(map_center_lon):
-        map_center_lat, map_center_lon = DEFAULT_LOCATION
+    forecast = final_map_data['Total_Forecasted_Accidents']
+    final_map_data['Bucket'] = np.select([forecast < 0.01, forecast <= median_th, forecast <= high_th], [0, 1, 2], 3)
+    final_map_data['Radius'] = 5 + (np.log1p(forecast) * 5)
+
+    view = _map_view([safe_center_lat, safe_center_lon], 13, time_label=display_hour_str)
+    view.update(hotspots=final_map_data, explanations=explanations)
+    return view
+
+
+# Style and popup of one hotspot marker. The popup is app/static/hotspot-popup.js,
+# the same template as the dashboard map's. COLORS, BARANGAYS and TIME_LABEL
+# are filled in once per map.
+_HOTSPOT_JS = """
+function(feature, layer) {
+    const colors = COLORS, data = {barangays: BARANGAYS, time_label: TIME_LABEL};
+    const color = colors[feature.properties.bucket];
+    layer.setStyle({radius: feature.properties.radius, color: color, fillColor: color, fillOpacity: 0.8});
+    layer.bindPopup(() => hotspotPopup(feature.properties, layer.getLatLng(), data), {maxWidth: 300});
+}
+"""
+
+
+def build_forecast_map_html(
+    table: str,
+    where_sql: str = "",
+    params: dict = None,
+    start_str: str = "", end_str: str = "", time_from: str = "", time_to: str = "",
+    legacy_time: str = "Live", barangay_filter: str = "",
+    training_budget: float | None = None
+):
+    view = hotspot_map_data(table, where_sql, params, start_str, end_str, time_from, time_to, training_budget)
 
     font_css = """<style> @font-face { font-family: "Chillax"; src: url("/static/fonts/Chillax-Medium.ttf") format("truetype"); font-weight: 400; font-style: normal; } @font-face { font-family: "Chillax"; src: url("/static/fonts/Chillax-Semibold.woff2") format("woff2"); font-weight: 700; font-style: normal; } </style>"""
-    m = folium.Map(location=[map_center_lat, map_center_lon], zoom_start=13)
+    m = folium.Map(location=view["center"], zoom_start=view["zoom"])
+    if view["message"]:
+        folium.Marker(view["center"], popup=view["message"]).add_to(m)
+    if view["hotspots"] is None:
+        return m.get_root().render()
     m.get_root().header.add_child(folium.Element(font_css))
+    m.get_root().header.add_child(folium.CssLink("/static/hotspot-popup.css"))
+    m.get_root().header.add_child(folium.JavascriptLink("/static/hotspot-popup.js"))
+
+    # One GeoJson layer for all hotspots; markers are styled and their popups
+    # built in the browser by _HOTSPOT_JS.
+    collection = hotspots_geojson(view)
+    if not collection["features"]:
+        return m.get_root().render()
+    hotspot_js = (_HOTSPOT_JS.replace("COLORS", json.dumps(collection["colors"]))
+                  .replace("BARANGAYS", json.dumps(collection["barangays"]))
+                  .replace("TIME_LABEL", json.dumps(view["time_label"])))
+    folium.GeoJson(
+        {"type": "FeatureCollection", "features": collection["features"]},
+        name="Hotspots",
+        marker=folium.CircleMarker(fill=True, fill_opacity=0.8),
+        on_each_feature=JsCode(hotspot_js),
+    ).add_to(m)
         
-    for _, row in final_map_data.iterrows():
-        if pd.isna(row['Center_Lat']) or pd.isna(row['Center_Lon']): continue
-        lat, lng = float(row['Center_Lat']), float(row['Center_Lon'])
-        barangay_html = row.get('Barangay_HTML', '<p style="margin: 5px 0;">N/A</p>')
-        streetview_url = f"https://www.google.com/maps?q=&layer=c&cbll={lat},{lng}&cbp=12,90,0,0,5"
-        popup_html = f""" <div style="font-family: 'Chillax', sans-serif; font-weight: 400; max-width: 250px; color: #1e1e1e;"> <h4 style="margin: 0 0 8px; padding-bottom: 5px; border-bottom: 1px solid #eee; font-weight: 700; color: #1e1e1e;"> Hotspot #{int(row['ACCIDENT_HOTSPOT'])} </h4> <p style="margin: 5px 0;"><strong>Time:</strong> {display_hour_str}</p> <p style="margin: 5px 0;"><strong>Barangays in Hotspot:</strong></p> {barangay_html} <hr style="border: 0; border-top: 1px solid #eee; margin: 10px 0;"> {f"<p style='margin: 5px 0;'><strong>Actual (Hist.):</strong> {int(row['Total_Actual_Accidents'])}</p>" if row['Total_Actual_Accidents'] > 0 else ""} {f"<p style='margin: 5px 0;'><strong>Forecasted:</strong> {row['Total_Forecasted_Accidents']:.2f}</p>" if row['Total_Forecasted_Accidents'] > 0 else ""} <a href="{streetview_url}" target="_blank" style="display: inline-block; width: 100%; box-sizing: border-box; text-align: center; margin-top: 10px; padding: 8px 12px; background-color: #0437F2; color: white; text-decoration: none; border-radius: 5px; font-weight: 700; font-family: 'Chillax', sans-serif;"> Open Street View </a> </div>"""
-        forecast_value = float(row['Total_Forecasted_Accidents'])
-        color = color_for(forecast_value)
-        radius = 5 + (np.log1p(forecast_value) * 5)
-        folium.CircleMarker(location=[lat, lng], radius=radius, popup=folium.Popup(popup_html, max_width=300), color=color, fill=True, fill_color=color, fill_opacity=0.8).add_to(m)
-        
-    return m.get_root().render()
\ No newline at end of file
+    return m.get_root().render()
+
+
+def hotspots_geojson(view: dict) -> dict:
+    """
+    `hotspot_map_data` as a compact GeoJSON FeatureCollection for the Leaflet
+    layer. Barangay names are listed once in "barangays" and referenced by
+    index from each feature; "colors" maps each feature's "bucket".
+    """
+    collection = {
+        "type": "FeatureCollection",
+        "center": view["center"], "zoom": view["zoom"],
+        "message": view["message"], "time_label": view["time_label"],
+        "colors": list(HOTSPOT_COLORS), "barangays": [], "features": [],
+    }
+    hotspots = view["hotspots"]
+    if hotspots is None or hotspots.empty:
+        return collection
+
+    # Properties are computed column-wise; only the final dicts are per hotspot.
+    members = hotspots['Barangays'].explode().dropna()
+    names = sorted(members.unique())
+    codes = pd.Series(pd.Categorical(members, categories=names).codes.astype(int), index=members.index)
+    member_codes = codes.groupby(level=0).agg(list).reindex(hotspots.index)
+    collection["barangays"] = names
+
+    ids = hotspots['ACCIDENT_HOTSPOT'].astype(int).tolist()
+    coordinates = np.round(hotspots[['Center_Lon', 'Center_Lat']].to_numpy(dtype=float), 6).tolist()
+    columns = zip(
+        ids,
+        hotspots['Total_Forecasted_Accidents'].astype(float).round(2).tolist(),
+        hotspots['Total_Actual_Accidents'].astype(int).tolist(),
+        hotspots['Bucket'].astype(int).tolist(),
+        hotspots['Radius'].astype(float).round(2).tolist(),
+        [c if isinstance(c, list) else [] for c in member_codes],
+    )
+    why = {}
+    for hotspot_id in ids:
+        entry = view["explanations"].get(str(hotspot_id))
+        if not entry: continue
+        why[hotspot_id] = {
+            "as_of": entry["as_of"][:7],
+            "drivers": [[d["label"], round(d["factor"], 2)] for d in explanation_drivers(entry)[:3]],
+        }
+
+    features = []
+    for coords, (hotspot_id, forecast, actual, bucket, radius, barangays) in zip(coordinates, columns):
+        properties = {"id": hotspot_id, "forecast": forecast, "actual": actual, "bucket": bucket,
+                      "radius": radius, "barangays": barangays}
+        if hotspot_id in why:
+            properties["why"] = why[hotspot_id]
+        features.append({"type": "Feature", "geometry": {"type": "Point", "coordinates": coords}, "properties": properties})
+    collection["features"] = features
+    return collection
+
+
+def live_map_args(now: datetime = None) -> dict:
+    """Months and hours of the "Live" map view at `now`: the current month and hour."""
+    now = now or datetime.now()
+    return dict(start_str=now.strftime('%Y-%m'), end_str=now.strftime('%Y-%m'),
+                time_from=str(now.hour), time_to=str(now.hour))
+
+
+def hotspots_json_page(table: str, map_args: dict, training_budget: float | None = None) -> str:
+    """The /api/hotspots.json body for hotspot_map_data's `map_args`."""
+    view = hotspot_map_data(table, training_budget=training_budget, **map_args)
+    return json.dumps(hotspots_geojson(view), separators=(",", ":"))
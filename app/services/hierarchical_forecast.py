@@ -0,0 +1,483 @@
+# app/services/hierarchical_forecast.py
+
+"""
+One reconciled forecast behind every dashboard forecast chart.
+
+Instead of a model per chart, `cell_forecast` forecasts the table once at the
+grain barangay × hour × weekday × month and every chart sums that forecast:
+
+1. Each barangay's monthly series is forecast with the requested dashboard
+   model (one fit for all barangays, see forecast_matrix).
+2. Each barangay forecast is split over its hour × weekday cells with the
+   barangay's recent cell shares, shrunk towards the table-wide profile so
+   sparse barangays do not get all-or-nothing cells.
+
+Forecast cells therefore always add up to the barangay forecasts, and every
+chart's total equals the same overall forecast. Charts on attributes outside
+the grain (offense, age bin, alcohol involvement, victims) distribute the cell
+forecast with the attribute's historical share conditional on the barangay
+(or hour, for alcohol by hour).
+
+Its inputs are read as GROUP BY aggregates (barangay × month, barangay × hour
+× weekday, and one per attribute), so only grouped counts leave MySQL.
+
+The result is stored once per (table version, filters, model, horizon) in the
+forecast store, as barangay forecasts plus cell shares and the historical
+aggregates the charts need; the full tensor is their product.
+
+Environment:
+    RTAVERSE_HIERARCHICAL_FORECASTS   set to 0 to give every chart its own model again
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from ..extensions import get_engine
+from .dashboard_forecasting import (
+    Target, forecast_matrix, model_display_name, run_categorical_forecast, run_multi_target_forecast,
+    run_numerical_forecast, run_overall_timeseries_forecast, _runs_inline,
+)
+from .forecast_store import cached
+from .training_executor import in_training_pool
+
+BARANGAY_COLUMNS = ["BARANGAY", "Barangay", "BRGY"]
+OFFENSE_COLUMNS = ["OFFENSE", "OFFENSE_TYPE", "CRIME_TYPE"]
+AGE_COLUMNS = ["AGE", "VICTIM_AGE", "AGE_OF_VICTIM", "AGE_YEARS"]
+VICTIM_COLUMNS = ["VICTIM COUNT", "VICTIM_COUNT", "TOTAL_VICTIMS"]
+ALCOHOL_COLUMNS = ["ALCOHOL_USED_CLUSTER", "ALCOHOL_USED", "ALCOHOL_INVOLVEMENT"]
+SEASON_COLUMNS = ["SEASON_CLUSTER", "SEASON"]
+ALCOHOL_STATUSES = ["Yes", "No", "Unknown"]
+HIERARCHICAL_FORECASTS = os.getenv("RTAVERSE_HIERARCHICAL_FORECASTS", "1") != "0"
+
+HOURS = 24  # hour bucket 24 holds rows without an hour
+WEEKDAYS = 7
+SHARE_WINDOW_MONTHS = 24  # recent history used for the cell shares
+SHARE_PRIOR = 20.0  # pseudo-accidents of the table-wide profile added per barangay
+
+CHARTS = ("hourly", "day_of_week", "top_barangays", "alcohol_by_hour", "victims_by_age",
+          "offense_types", "by_season", "overall_timeseries")
+
+
+def _pick(cols, candidates):
+    return next((c for c in candidates if c in cols), None)
+
+
+def _hour_expr(cols) -> str:
+    return "CAST(`HOUR_COMMITTED` AS SIGNED)" if "HOUR_COMMITTED" in cols else \
+           "HOUR(`TIME_COMMITTED`)" if "TIME_COMMITTED" in cols else \
+           "HOUR(`DATE_COMMITTED`)"
+
+
+def _age_bin(age: pd.Series) -> pd.Series:
+    """The victims_by_age CASE expression: '0-9', '10-19', ..., '80+'."""
+    years = pd.to_numeric(age, errors='coerce')
+    decade = (years // 10 * 10).fillna(0).astype(int)
+    bins = decade.astype(str) + "-" + (decade + 9).astype(str)
+    bins[years.isna() | (years < 10)] = "0-9"
+    bins[years >= 80] = "80+"
+    return bins
+
+
+def _by(index_a, n_a, index_b, n_b, weights=None) -> np.ndarray:
+    """n_a × n_b table of row counts (or weight sums)."""
+    return np.bincount(index_a * n_b + index_b, weights=weights, minlength=n_a * n_b).reshape(n_a, n_b).astype(float)
+
+
+def _hour_idx(hour: pd.Series) -> np.ndarray:
+    """Hour bucket of each value: 0-23, or HOURS for a missing or invalid hour."""
+    hour = pd.to_numeric(hour, errors='coerce')
+    return np.where(hour.between(0, HOURS - 1), hour.fillna(HOURS), HOURS).astype(np.int64)
+
+
+def _codes(values: pd.Series):
+    """(sorted labels, codes) of the non-empty values; -1 for missing."""
+    values = values.where(values.notna() & (values.astype(str).str.strip() != ''))
+    labels = sorted(values.dropna().unique())
+    return labels, pd.Categorical(values, categories=labels).codes.astype(np.int64)
+
+
+def _attribute(labels, codes, cond_idx, n_cond, weights=None) -> dict:
+    keep = codes >= 0
+    table = _by(codes[keep], len(labels), cond_idx[keep], n_cond, None if weights is None else weights[keep])
+    return {"labels": [l.item() if hasattr(l, 'item') else l for l in labels], "by_condition": table.tolist()}
+
+
+@cached("hierarchical")
+@in_training_pool(inline=_runs_inline)
+def cell_forecast(
+    table_name: str,
+    model_type: str = 'random_forest',
+    forecast_horizon: int = 12,
+    where_sql: str = "",
+    params: dict = None
+):
+    engine = get_engine()
+    with engine.connect() as conn:
+        cols = {str(r[0]) for r in conn.execute(text(f"SHOW COLUMNS FROM `{table_name}`")).fetchall()}
+
+    brgy_col = _pick(cols, BARANGAY_COLUMNS)
+    offense_col, age_col = _pick(cols, OFFENSE_COLUMNS), _pick(cols, AGE_COLUMNS)
+    victims_col, alcohol_col = _pick(cols, VICTIM_COLUMNS), _pick(cols, ALCOHOL_COLUMNS)
+    season_col = _pick(cols, SEASON_COLUMNS)
+
+    # Every input below is a GROUP BY aggregate; only the grouped counts cross
+    # the network. Labels are grouped on their exact bytes, as pandas would.
+    barangay = f"NULLIF(TRIM(`{brgy_col}`), '')" if brgy_col else "NULL"
+    hour = _hour_expr(cols)
+    where = "WHERE `DATE_COMMITTED` IS NOT NULL" + (where_sql.replace("WHERE", "AND") if where_sql else "")
+    params = dict(params or {})
+
+    def aggregate(select: str, group_by: str, conditions: str = "") -> pd.DataFrame:
+        return pd.read_sql_query(
+            f"SELECT {select} FROM `{table_name}` {where}{conditions} GROUP BY {group_by}", engine, params=params
+        )
+
+    monthly = aggregate(
+        f"ANY_VALUE({barangay}) AS cell_barangay, LAST_DAY(`DATE_COMMITTED`) AS month_end, COUNT(*) AS n",
+        f"CAST({barangay} AS BINARY), month_end",
+    )
+    monthly["month_end"] = pd.to_datetime(monthly["month_end"], errors='coerce')
+    monthly = monthly.dropna(subset=["month_end"])
+    if monthly.empty:
+        return {"success": False, "message": "No data found for the selected filters."}
+
+    # The last barangay slot holds rows without one.
+    barangays, _ = _codes(monthly["cell_barangay"])
+    n_b = len(barangays) + 1
+
+    def barangay_idx(frame: pd.DataFrame) -> np.ndarray:
+        codes = pd.Categorical(frame["cell_barangay"], categories=barangays).codes.astype(np.int64)
+        return np.where(codes < 0, n_b - 1, codes)
+
+    month_no = (monthly["month_end"].dt.year * 12 + monthly["month_end"].dt.month).to_numpy(dtype=np.int64)
+    first_month = int(month_no.min())
+    m_idx = month_no - first_month
+    n_months = int(m_idx.max()) + 1
+    if n_months < 4:
+        return {"success": False, "message": "Not enough historical data for features (need at least 3 months)."}
+    month_dates = pd.date_range(
+        pd.Timestamp(year=(first_month - 1) // 12, month=(first_month - 1) % 12 + 1, day=1), periods=n_months, freq='ME'
+    )
+    future_dates = pd.date_range(start=month_dates[-1] + pd.DateOffset(months=1), periods=forecast_horizon, freq='ME')
+
+    # 1. Barangay-level forecast (barangays × horizon).
+    by_month = _by(barangay_idx(monthly), n_b, m_idx, n_months, weights=monthly["n"].to_numpy(dtype=float))
+    barangay_forecast = np.maximum(forecast_matrix(model_type, by_month, month_dates, forecast_horizon), 0.0)
+
+    # 2. Recent hour × weekday shares within each barangay, shrunk to the table-wide profile.
+    params["cell_recent_from"] = (month_dates[max(0, n_months - SHARE_WINDOW_MONTHS)] - pd.offsets.MonthBegin(1)).date()
+    victims = f", SUM(`{victims_col}`) AS victims, COUNT(`{victims_col}`) AS victim_rows" if victims_col else ""
+    by_cell = aggregate(
+        f"ANY_VALUE({barangay}) AS cell_barangay, {hour} AS cell_hour, WEEKDAY(`DATE_COMMITTED`) AS cell_weekday,"
+        f" `DATE_COMMITTED` >= %(cell_recent_from)s AS recent, COUNT(*) AS n{victims}",
+        f"CAST({barangay} AS BINARY), cell_hour, cell_weekday, recent",
+    )
+    b_idx, h_idx = barangay_idx(by_cell), _hour_idx(by_cell["cell_hour"])
+    w_idx = by_cell["cell_weekday"].to_numpy(dtype=np.int64)
+    rows = by_cell["n"].to_numpy(dtype=float)
+    cell_flat = h_idx * WEEKDAYS + w_idx
+    n_cells = (HOURS + 1) * WEEKDAYS
+    recent = by_cell["recent"].to_numpy(dtype=float) > 0
+    recent_cells = _by(b_idx[recent], n_b, cell_flat[recent], n_cells, weights=rows[recent])
+    profile = recent_cells.sum(axis=0) / max(1.0, recent_cells.sum())
+    shares = (recent_cells + SHARE_PRIOR * profile) / (recent_cells.sum(axis=1, keepdims=True) + SHARE_PRIOR)
+
+    history = {
+        "monthly_total": by_month.sum(axis=0).tolist(),
+        "cells": _by(b_idx, n_b, cell_flat, n_cells, weights=rows).tolist(),
+    }
+    if victims_col:
+        history["weekday_victims"] = {
+            "victims": np.bincount(w_idx, weights=pd.to_numeric(by_cell["victims"], errors='coerce').fillna(0),
+                                   minlength=WEEKDAYS).tolist(),
+            "rows": np.bincount(w_idx, weights=by_cell["victim_rows"].to_numpy(dtype=float), minlength=WEEKDAYS).tolist(),
+        }
+    if offense_col:
+        offense = aggregate(
+            f"ANY_VALUE({barangay}) AS cell_barangay, ANY_VALUE(`{offense_col}`) AS label, COUNT(*) AS n",
+            f"CAST({barangay} AS BINARY), CAST(`{offense_col}` AS BINARY)",
+        )
+        history["offense"] = _attribute(*_codes(offense["label"]), barangay_idx(offense), n_b,
+                                        weights=offense["n"].to_numpy(dtype=float))
+    if age_col and victims_col:
+        ages = aggregate(
+            f"ANY_VALUE({barangay}) AS cell_barangay, FLOOR(`{age_col}` / 10) * 10 AS age_decade,"
+            f" SUM(`{victims_col}`) AS victims",
+            f"CAST({barangay} AS BINARY), age_decade",
+            f" AND `{age_col}` IS NOT NULL AND `{victims_col}` IS NOT NULL",
+        )
+        labels, codes = _codes(_age_bin(ages["age_decade"]))
+        history["age_victims"] = _attribute(labels, codes, barangay_idx(ages), n_b,
+                                            weights=pd.to_numeric(ages["victims"], errors='coerce').fillna(0).to_numpy(dtype=float))
+    if alcohol_col:
+        alcohol = aggregate(
+            f"{hour} AS cell_hour, ANY_VALUE(`{alcohol_col}`) AS label, COUNT(*) AS n",
+            f"cell_hour, CAST(`{alcohol_col}` AS BINARY)",
+        )
+        codes = pd.Categorical(alcohol["label"].where(alcohol["label"].isin(ALCOHOL_STATUSES)),
+                               categories=ALCOHOL_STATUSES).codes.astype(np.int64)
+        history["alcohol"] = _attribute(ALCOHOL_STATUSES, codes, _hour_idx(alcohol["cell_hour"]), HOURS + 1,
+                                        weights=alcohol["n"].to_numpy(dtype=float))
+    if season_col:
+        season = aggregate(
+            f"MONTH(`DATE_COMMITTED`) AS calendar_month, ANY_VALUE(`{season_col}`) AS label, COUNT(*) AS n",
+            f"calendar_month, CAST(`{season_col}` AS BINARY)",
+        )
+        labels, codes = _codes(season["label"])
+        keep = codes >= 0
+        counts = _by(codes[keep], len(labels), season["calendar_month"].to_numpy(dtype=np.int64)[keep] - 1, 12,
+                     weights=season["n"].to_numpy(dtype=float)[keep])
+        history["season"] = {
+            "labels": [l.item() if hasattr(l, 'item') else l for l in labels],
+            "counts": counts.sum(axis=1).tolist(),
+            # most common season of each calendar month, for the forecast months
+            "by_calendar_month": [int(counts[:, m].argmax()) if counts[:, m].any() else None for m in range(12)],
+        }
+
+    return {
+        "success": True,
+        "model_used": model_display_name(model_type),
+        "horizon": forecast_horizon,
+        "months": month_dates.strftime('%Y-%m-%d').tolist(),
+        "forecast_months": future_dates.strftime('%Y-%m-%d').tolist(),
+        "barangays": [b.item() if hasattr(b, 'item') else b for b in barangays],
+        "barangay_forecast": barangay_forecast.tolist(),
+        "cell_shares": shares.tolist(),
+        "history": history,
+    }
+
+
+def _distribute(table: dict, cond_forecast: np.ndarray, cond_rows: np.ndarray) -> np.ndarray:
+    """Forecast per attribute label: Σ_condition forecast × share of the label in that condition."""
+    by_cond = np.asarray(table["by_condition"], dtype=float)
+    rate = np.divide(by_cond, cond_rows, out=np.zeros_like(by_cond), where=cond_rows > 0)
+    return rate @ cond_forecast
+
+
+def _categorical(labels, historical, forecast, cells: dict) -> dict:
+    return {
+        "success": True,
+        "data": {
+            "labels": list(labels),
+            "historical": np.round(historical).astype(int).tolist(),
+            "forecast": np.round(forecast).astype(int).tolist(),
+            "model_used": cells["model_used"],
+            "horizon": cells["horizon"],
+        }
+    }
+
+
+def hierarchical_chart(chart: str, table_name: str, model_type: str, forecast_horizon: int,
+                       where_sql: str = "", params: dict = None) -> dict:
+    """
+    A dashboard chart summed from the table's cell forecast, in the shape the
+    chart's own forecaster returns (run_categorical_forecast,
+    run_numerical_forecast, run_multi_target_forecast or
+    run_overall_timeseries_forecast).
+    """
+    cells = cell_forecast(table_name, model_type, forecast_horizon, where_sql, params)
+    if not cells.get("success"):
+        return cells
+
+    history = cells["history"]
+    fb = np.asarray(cells["barangay_forecast"], dtype=float)  # barangays × horizon
+    shares = np.asarray(cells["cell_shares"], dtype=float).reshape(len(fb), HOURS + 1, WEEKDAYS)
+    hist_cells = np.asarray(history["cells"], dtype=float).reshape(len(fb), HOURS + 1, WEEKDAYS)
+    fc_cells = fb.sum(axis=1)[:, None, None] * shares  # forecast over the horizon per cell
+
+    rows_b, rows_h, rows_w = hist_cells.sum(axis=(1, 2)), hist_cells.sum(axis=(0, 2)), hist_cells.sum(axis=(0, 1))
+    fc_b, fc_h, fc_w = fc_cells.sum(axis=(1, 2)), fc_cells.sum(axis=(0, 2)), fc_cells.sum(axis=(0, 1))
+
+    if chart == "hourly":
+        present = np.flatnonzero(rows_h[:HOURS])
+        return _categorical(present.tolist(), rows_h[present], fc_h[present], cells)
+
+    if chart == "top_barangays":
+        known = len(cells["barangays"])
+        top = sorted(np.argsort(-rows_b[:known], kind='stable')[:10], key=lambda i: cells["barangays"][i])
+        if not top:
+            return {"success": False, "message": "Not enough data to determine top barangays for forecasting."}
+        return _categorical([cells["barangays"][i] for i in top], rows_b[top], fc_b[top], cells)
+
+    if chart == "offense_types":
+        if "offense" not in history:
+            return {"success": False, "message": "No offense type column found."}
+        table = history["offense"]
+        return _categorical(table["labels"], np.asarray(table["by_condition"]).sum(axis=1),
+                            _distribute(table, fc_b, rows_b), cells)
+
+    if chart == "by_season":
+        if "season" not in history:
+            return {"success": False, "message": "No season column (e.g., SEASON_CLUSTER) found."}
+        season = history["season"]
+        forecast = np.zeros(len(season["labels"]))
+        monthly = fb.sum(axis=0)
+        for month, value in zip(pd.to_datetime(cells["forecast_months"]).month, monthly):
+            code = season["by_calendar_month"][month - 1]
+            if code is not None:
+                forecast[code] += value
+        return _categorical(season["labels"], season["counts"], forecast, cells)
+
+    if chart == "day_of_week":
+        present = np.flatnonzero(rows_w)
+        victims = history.get("weekday_victims")
+        if victims is None:
+            return {"success": False, "message": "VICTIM_COUNT column not found in table."}
+        v, n = np.asarray(victims["victims"], dtype=float), np.asarray(victims["rows"], dtype=float)
+        per_row = np.divide(v, n, out=np.zeros_like(v), where=n > 0)
+        return {
+            "success": True,
+            "data": {
+                "labels": present.tolist(),
+                "targets": {
+                    "count": {"historical": np.round(rows_w[present]).astype(int).tolist(),
+                              "forecast": np.round(fc_w[present]).astype(int).tolist()},
+                    "victims": {"historical": np.round(v[present]).astype(int).tolist(),
+                                "forecast": np.round(fc_w[present] * per_row[present]).astype(int).tolist()},
+                },
+                "model_used": cells["model_used"],
+                "horizon": cells["horizon"],
+            }
+        }
+
+    if chart == "alcohol_by_hour":
+        if "alcohol" not in history:
+            return {"success": False, "message": "A categorical alcohol column (e.g., 'ALCOHOL_USED_CLUSTER') is required for this forecast."}
+        table = history["alcohol"]
+        by_hour = np.asarray(table["by_condition"], dtype=float)[:, :HOURS]
+        rate = np.divide(by_hour, rows_h[:HOURS], out=np.zeros_like(by_hour), where=rows_h[:HOURS] > 0)
+        present = np.flatnonzero(by_hour.sum(axis=0))
+        return {
+            "success": True,
+            "data": {
+                "labels": present.tolist(),
+                "targets": {
+                    status: {"historical": np.round(by_hour[k, present]).astype(int).tolist(),
+                             "forecast": np.round(rate[k, present] * fc_h[present]).astype(int).tolist()}
+                    for k, status in enumerate(table["labels"])
+                },
+                "model_used": cells["model_used"],
+                "horizon": cells["horizon"],
+            }
+        }
+
+    if chart == "victims_by_age":
+        if "age_victims" not in history:
+            return {"success": False, "message": "Required AGE or VICTIM_COUNT columns not found for forecast."}
+        table = history["age_victims"]
+        return {
+            "success": True,
+            "labels": table["labels"],
+            "historical": np.round(np.asarray(table["by_condition"]).sum(axis=1)).astype(int).tolist(),
+            "forecast": np.round(_distribute(table, fc_b, rows_b)).astype(int).tolist(),
+        }
+
+    if chart == "overall_timeseries":
+        return {
+            "success": True,
+            "data": {
+                "historical": {"dates": cells["months"], "counts": np.round(history["monthly_total"]).astype(int).tolist()},
+                "forecast": {"dates": cells["forecast_months"], "counts": np.round(fb.sum(axis=0)).astype(int).tolist()},
+                "model_used": cells["model_used"],
+                "horizon": cells["horizon"],
+            }
+        }
+
+    raise ValueError(f"Unknown chart '{chart}'.")
+
+
+def per_chart_forecast(chart: str, table_name: str, cols, model_type: str, forecast_horizon: int,
+                       where_sql: str = "", params: dict = None) -> dict:
+    """
+    A dashboard chart from its own model (RTAVERSE_HIERARCHICAL_FORECASTS=0 or
+    ?hierarchy=0), in the same shape as hierarchical_chart. `cols` are the
+    table's columns.
+    """
+    params = dict(params or {})
+    hour_expr = _hour_expr(cols)
+
+    def narrowed(condition: str) -> str:
+        # Leading space as in build_filter_query: the forecasters append the
+        # clause to their own WHERE with "WHERE" replaced by "AND".
+        return f"{where_sql} AND {condition}" if where_sql else f" WHERE {condition}"
+
+    if chart == "overall_timeseries":
+        return run_overall_timeseries_forecast(table_name=table_name, model_type=model_type,
+                                               forecast_horizon=forecast_horizon, where_sql=where_sql, params=params)
+
+    if chart == "hourly":
+        return run_categorical_forecast(table_name=table_name, grouping_key=hour_expr, model_type=model_type,
+                                        forecast_horizon=forecast_horizon, where_sql=where_sql, params=params)
+
+    if chart == "day_of_week":
+        victim_col = _pick(cols, ["VICTIM_COUNT", "VICTIM COUNT", "TOTAL_VICTIMS"])
+        if not victim_col:
+            return {"success": False, "message": "VICTIM_COUNT column not found in table."}
+        weekday_expr = "WEEKDAY(`DATE_COMMITTED`)" if "DATE_COMMITTED" in cols else "CAST(`WEEKDAY` AS SIGNED)"
+        # Accident counts and victim totals come from one query and one model.
+        return run_multi_target_forecast(
+            table_name=table_name, grouping_key=weekday_expr,
+            targets=[Target("count"), Target("victims", column=victim_col)],
+            model_type=model_type, forecast_horizon=forecast_horizon, where_sql=where_sql, params=params
+        )
+
+    if chart == "top_barangays":
+        brgy_col = _pick(cols, BARANGAY_COLUMNS)
+        if not brgy_col:
+            return {"success": False, "message": "No BARANGAY column found."}
+        top = pd.read_sql_query(
+            f"SELECT `{brgy_col}` AS barangay FROM `{table_name}` {where_sql}"
+            f" GROUP BY `{brgy_col}` ORDER BY COUNT(*) DESC LIMIT 10",
+            get_engine(), params=params
+        )["barangay"].tolist()
+        if not top:
+            return {"success": False, "message": "Not enough data to determine top barangays for forecasting."}
+        for i, name in enumerate(top):
+            params[f"brgy_{i}"] = name
+        placeholders = ", ".join(f"%(brgy_{i})s" for i in range(len(top)))
+        return run_categorical_forecast(table_name=table_name, grouping_key=brgy_col, model_type=model_type,
+                                        forecast_horizon=forecast_horizon,
+                                        where_sql=narrowed(f"`{brgy_col}` IN ({placeholders})"), params=params)
+
+    if chart == "alcohol_by_hour":
+        alcohol_col = _pick(cols, ALCOHOL_COLUMNS)
+        if not alcohol_col:
+            return {"success": False, "message": "A categorical alcohol column (e.g., 'ALCOHOL_USED_CLUSTER') is required for this forecast."}
+        for i, status in enumerate(ALCOHOL_STATUSES):
+            params[f"alc_status_{i}"] = status
+        placeholders = ", ".join(f"%(alc_status_{i})s" for i in range(len(ALCOHOL_STATUSES)))
+        # One query and one model for all three statuses.
+        return run_multi_target_forecast(
+            table_name=table_name, grouping_key=hour_expr,
+            targets=[Target(status, column=alcohol_col, equals=status) for status in ALCOHOL_STATUSES],
+            model_type=model_type, forecast_horizon=forecast_horizon,
+            where_sql=narrowed(f"`{alcohol_col}` IN ({placeholders})"), params=params
+        )
+
+    if chart == "victims_by_age":
+        age_col, victims_col = _pick(cols, AGE_COLUMNS), _pick(cols, VICTIM_COLUMNS)
+        if not age_col or not victims_col:
+            return {"success": False, "message": "Required AGE or VICTIM_COUNT columns not found for forecast."}
+        age_bin_expr = f"""
+            CASE 
+                WHEN `{age_col}` IS NULL OR `{age_col}` < 10 THEN '0-9'
+                WHEN CAST(`{age_col}` AS SIGNED) >= 80 THEN '80+' 
+                ELSE CONCAT(FLOOR(CAST(`{age_col}` AS SIGNED)/10)*10, '-', FLOOR(CAST(`{age_col}` AS SIGNED)/10)*10 + 9) 
+            END
+        """
+        return run_numerical_forecast(table_name=table_name, grouping_key=age_bin_expr, target_column=victims_col,
+                                      model_type=model_type, forecast_horizon=forecast_horizon,
+                                      where_sql=narrowed(f" `{age_col}` IS NOT NULL "), params=params)
+
+    if chart in ("offense_types", "by_season"):
+        column = _pick(cols, OFFENSE_COLUMNS if chart == "offense_types" else SEASON_COLUMNS)
+        if not column:
+            return {"success": False, "message": "No offense type column found." if chart == "offense_types"
+                    else "No season column (e.g., SEASON_CLUSTER) found."}
+        return run_categorical_forecast(table_name=table_name, grouping_key=column, model_type=model_type,
+                                        forecast_horizon=forecast_horizon, where_sql=where_sql, params=params)
+
+    raise ValueError(f"Unknown chart '{chart}'.")
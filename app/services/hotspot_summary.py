@@ -0,0 +1,413 @@
+# app/services/hotspot_summary.py
+
+"""
+Persisted per-hotspot summary of a data table.
+
+Every map request used to read the whole table to recompute hotspot centroids,
+member barangays and hotspot × month counts. Those only change when the table
+does, so they are kept in `app_hotspots_<table>`, one row per hotspot:
+
+- centroid, radius (half the diagonal of the members' bounding box, in metres),
+  accident count, first and last accident;
+- member barangays with their accident count per hour bucket;
+- accident counts per month and hour bucket, and per hour bucket the
+  coordinate sums and first/last accident, so any hour window's centroids,
+  months and counts can be derived without the rows.
+
+In memory the hotspot × month × hour count tensor (and the per-hour coordinate
+and barangay counts) are held as prefix sums along the hour axis, so an hour
+window is aggregated with one or two subtractions instead of a pass over its hours.
+
+Hour buckets are the hours 0-23 plus bucket 24 for rows without a usable hour.
+The summary is rebuilt from one GROUP BY query when the table's version moves
+on (in the background after every write, or by the first reader of a new
+version); `app_hotspot_summaries` records the version each summary reflects.
+Readers of the current version share one parsed copy per process.
+"""
+
+import hashlib
+import json
+import math
+import re
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from ..extensions import get_engine
+from .database import get_table_version
+from .model_registry import hotspot_lag_frame
+from .preprocessing import TIME_CLUSTER_BINS
+
+SUMMARY_REGISTRY = "app_hotspot_summaries"
+HOUR_BUCKETS = 25  # 0-23, and 24 for rows without an hour
+UNKNOWN_HOUR = 24
+EARTH_RADIUS_M = 6_371_000
+
+_loaded = {}  # table -> (version, summary)
+_loaded_lock = threading.Lock()
+_refreshing = set()  # tables with a background rebuild in flight
+_refreshing_lock = threading.Lock()
+
+
+def summary_table(table: str) -> str:
+    """`app_hotspots_<table>`, shortened with a hash when it would exceed MySQL's 64 characters."""
+    name = "app_hotspots_" + re.sub(r"[^A-Za-z0-9_]", "_", table)
+    if len(name) > 64:
+        name = name[:55] + "_" + hashlib.sha1(table.encode()).hexdigest()[:8]
+    return name
+
+
+def _ensure_registry(conn):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS `{SUMMARY_REGISTRY}` ("
+        " `table_name` VARCHAR(128) NOT NULL,"
+        " `version` BIGINT NOT NULL,"
+        " `hotspots` INT NOT NULL,"
+        " `time_clusters` TEXT NOT NULL,"  # JSON list of the table's TIME_CLUSTER columns
+        " `updated_at` DATETIME NOT NULL,"
+        " PRIMARY KEY (`table_name`)"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    ))
+
+
+def _create_summary_table(conn, name: str):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS `{name}` ("
+        " `hotspot` INT NOT NULL,"
+        " `center_lat` DOUBLE NOT NULL,"
+        " `center_lon` DOUBLE NOT NULL,"
+        " `radius_m` DOUBLE NOT NULL,"
+        " `accidents` INT NOT NULL,"
+        " `first_seen` DATETIME NOT NULL,"
+        " `last_seen` DATETIME NOT NULL,"
+        " `barangays` MEDIUMTEXT NOT NULL,"  # JSON {barangay: [count per hour bucket]}
+        " `first_month` DATE NOT NULL,"
+        " `hour_counts` MEDIUMTEXT NOT NULL,"  # JSON [[count per hour bucket] per month from first_month]
+        " `hour_coords` MEDIUMTEXT NOT NULL,"  # JSON {"lat", "lon": sums, "first", "last": dates} per hour bucket
+        " PRIMARY KEY (`hotspot`)"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    ))
+
+
+def _aggregate(conn, table: str) -> pd.DataFrame:
+    """One row per (hotspot, month, hour bucket, barangay) with counts, coordinate sums/bounds and first/last dates."""
+    hour = "CAST(`HOUR_COMMITTED` AS SIGNED)"
+    rows = conn.execute(text(
+        "SELECT CAST(`ACCIDENT_HOTSPOT` AS SIGNED) AS hotspot, LAST_DAY(`DATE_COMMITTED`) AS month_end,"
+        f" CASE WHEN {hour} BETWEEN 0 AND 23 THEN {hour} ELSE {UNKNOWN_HOUR} END AS hour, `BARANGAY` AS barangay,"
+        " COUNT(*) AS n, SUM(`LATITUDE`) AS lat_sum, SUM(`LONGITUDE`) AS lon_sum,"
+        " MIN(`LATITUDE`) AS lat_min, MAX(`LATITUDE`) AS lat_max, MIN(`LONGITUDE`) AS lon_min, MAX(`LONGITUDE`) AS lon_max,"
+        " MIN(`DATE_COMMITTED`) AS first_seen, MAX(`DATE_COMMITTED`) AS last_seen"
+        f" FROM `{table}`"
+        " WHERE `DATE_COMMITTED` IS NOT NULL AND `ACCIDENT_HOTSPOT` IS NOT NULL AND CAST(`ACCIDENT_HOTSPOT` AS SIGNED) <> -1"
+        " GROUP BY hotspot, month_end, hour, barangay"
+    )).fetchall()
+    agg = pd.DataFrame(rows, columns=['hotspot', 'month_end', 'hour', 'barangay', 'n', 'lat_sum', 'lon_sum',
+                                      'lat_min', 'lat_max', 'lon_min', 'lon_max', 'first_seen', 'last_seen'])
+    for col in ('n', 'lat_sum', 'lon_sum', 'lat_min', 'lat_max', 'lon_min', 'lon_max'):
+        agg[col] = pd.to_numeric(agg[col], errors='coerce')
+    agg['month_end'] = pd.to_datetime(agg['month_end'])
+    agg['first_seen'] = pd.to_datetime(agg['first_seen'])
+    agg['last_seen'] = pd.to_datetime(agg['last_seen'])
+    return agg
+
+
+def _radius_m(lat_min, lat_max, lon_min, lon_max) -> float:
+    """Half the diagonal of a lat/lon bounding box, in metres (equirectangular)."""
+    mean_lat = math.radians((lat_min + lat_max) / 2)
+    dy = math.radians(lat_max - lat_min)
+    dx = math.radians(lon_max - lon_min) * math.cos(mean_lat)
+    return EARTH_RADIUS_M * math.hypot(dx, dy) / 2
+
+
+def _iso(value):
+    return None if pd.isna(value) else pd.Timestamp(value).isoformat()
+
+
+def _summary_rows(agg: pd.DataFrame) -> list:
+    """The `app_hotspots_<table>` rows for an _aggregate result."""
+    rows = []
+    for hotspot, g in agg.groupby('hotspot', sort=True):
+        months = pd.DatetimeIndex(g['month_end'])
+        first_month = months.min()
+        month_no = (months.year - first_month.year) * 12 + (months.month - first_month.month)
+        hour_counts = np.zeros((int(month_no.max()) + 1, HOUR_BUCKETS), dtype=np.int64)
+        np.add.at(hour_counts, (month_no.to_numpy(), g['hour'].to_numpy(dtype=np.int64)), g['n'].to_numpy(dtype=np.int64))
+
+        by_hour = g.groupby('hour').agg(lat=('lat_sum', 'sum'), lon=('lon_sum', 'sum'),
+                                        first=('first_seen', 'min'), last=('last_seen', 'max'))
+        by_hour = by_hour.reindex(range(HOUR_BUCKETS))
+        named = g.dropna(subset=['barangay'])
+        barangays = {}
+        for name, b in named.groupby('barangay', sort=True):
+            counts = np.zeros(HOUR_BUCKETS, dtype=np.int64)
+            np.add.at(counts, b['hour'].to_numpy(dtype=np.int64), b['n'].to_numpy(dtype=np.int64))
+            barangays[str(name)] = counts.tolist()
+
+        n = int(g['n'].sum())
+        rows.append({
+            "hotspot": int(hotspot),
+            "center_lat": float(g['lat_sum'].sum() / n),
+            "center_lon": float(g['lon_sum'].sum() / n),
+            "radius_m": _radius_m(g['lat_min'].min(), g['lat_max'].max(), g['lon_min'].min(), g['lon_max'].max()),
+            "accidents": n,
+            "first_seen": g['first_seen'].min().to_pydatetime(),
+            "last_seen": g['last_seen'].max().to_pydatetime(),
+            "barangays": json.dumps(barangays),
+            "first_month": first_month.date(),
+            "hour_counts": json.dumps(hour_counts.tolist()),
+            "hour_coords": json.dumps({
+                "lat": by_hour['lat'].fillna(0).tolist(), "lon": by_hour['lon'].fillna(0).tolist(),
+                "first": [_iso(v) for v in by_hour['first']], "last": [_iso(v) for v in by_hour['last']],
+            }),
+        })
+    return rows
+
+
+def _rebuild(conn, table: str, version: int):
+    """
+    Recompute and rewrite `table`'s summary (its table must exist). Returns
+    (rows, TIME_CLUSTER columns).
+    """
+    cols = [str(r[0]) for r in conn.execute(text(f"SHOW COLUMNS FROM `{table}`")).fetchall()]
+    missing = {"ACCIDENT_HOTSPOT", "DATE_COMMITTED", "HOUR_COMMITTED", "LATITUDE", "LONGITUDE", "BARANGAY"} - set(cols)
+    if missing:
+        raise ValueError(f"Table '{table}' has no {', '.join(sorted(missing))} column(s).")
+    time_clusters = [c for c in cols if 'TIME_CLUSTER' in c]
+
+    rows = _summary_rows(_aggregate(conn, table))
+    name = summary_table(table)
+    conn.execute(text(f"DELETE FROM `{name}`"))
+    if rows:
+        conn.execute(text(
+            f"INSERT INTO `{name}` (`hotspot`, `center_lat`, `center_lon`, `radius_m`, `accidents`, `first_seen`,"
+            " `last_seen`, `barangays`, `first_month`, `hour_counts`, `hour_coords`) VALUES (:hotspot, :center_lat,"
+            " :center_lon, :radius_m, :accidents, :first_seen, :last_seen, :barangays, :first_month, :hour_counts, :hour_coords)"
+        ), rows)
+    conn.execute(text(
+        f"REPLACE INTO `{SUMMARY_REGISTRY}` (`table_name`, `version`, `hotspots`, `time_clusters`, `updated_at`)"
+        " VALUES (:t, :v, :n, :tc, :now)"
+    ), {"t": table, "v": int(version), "n": len(rows), "tc": json.dumps(time_clusters), "now": datetime.now()})
+    print(f"Hotspot summary: '{table}' v{version} rebuilt, {len(rows)} hotspots.")
+    return rows, time_clusters
+
+
+def _prefix(a: np.ndarray) -> np.ndarray:
+    """Cumulative sums along the last (hour) axis after a leading zero: a[..., i:j].sum(-1) == p[..., j] - p[..., i]."""
+    p = np.zeros(a.shape[:-1] + (a.shape[-1] + 1,), dtype=a.dtype)
+    np.cumsum(a, axis=-1, out=p[..., 1:])
+    return p
+
+
+def _parse(rows: list, time_clusters: list, version: int) -> dict:
+    """
+    The in-memory summary: per-hotspot arrays over one month axis shared by
+    all hotspots, with the hour axis stored as prefix sums (see window_sum).
+    """
+    hotspots = np.array([int(r["hotspot"]) for r in rows], dtype=np.int64)
+    counts_by_hotspot = [np.array(json.loads(r["hour_counts"]), dtype=np.int64).reshape(-1, HOUR_BUCKETS) for r in rows]
+    first_months = [pd.Timestamp(r["first_month"]) for r in rows]
+    if rows:
+        start = min(first_months)
+        offsets = [(m.year - start.year) * 12 + (m.month - start.month) for m in first_months]
+        n_months = max(o + len(c) for o, c in zip(offsets, counts_by_hotspot))
+        months = pd.date_range(start + pd.offsets.MonthEnd(0), periods=n_months, freq='ME')
+    else:
+        offsets, months = [], pd.DatetimeIndex([])
+    counts = np.zeros((len(rows), len(months), HOUR_BUCKETS), dtype=np.int64)
+    for i, (o, c) in enumerate(zip(offsets, counts_by_hotspot)):
+        counts[i, o:o + len(c)] = c
+
+    coords = [json.loads(r["hour_coords"]) for r in rows]
+    member_counts = [json.loads(r["barangays"]) for r in rows]
+    names = sorted({name for m in member_counts for name in m})
+    index = {name: j for j, name in enumerate(names)}
+    members = np.zeros((len(rows), len(names), HOUR_BUCKETS), dtype=np.int64)
+    for i, m in enumerate(member_counts):
+        for name, hours in m.items():
+            members[i, index[name]] = hours
+
+    def dates(key):
+        return np.array([[np.datetime64(v) if v else np.datetime64('NaT') for v in c[key]] for c in coords],
+                        dtype='datetime64[ns]').reshape(len(rows), HOUR_BUCKETS)
+
+    return {
+        "version": version,
+        "hotspots": hotspots,
+        "center_lat": np.array([float(r["center_lat"]) for r in rows]),
+        "center_lon": np.array([float(r["center_lon"]) for r in rows]),
+        "radius_m": np.array([float(r["radius_m"]) for r in rows]),
+        "accidents": np.array([int(r["accidents"]) for r in rows], dtype=np.int64),
+        "last_seen": [pd.Timestamp(r["last_seen"]) for r in rows],
+        "months": months,
+        "count_prefix": _prefix(counts),  # hotspots × months × (hour buckets + 1)
+        "lat_prefix": _prefix(np.array([c["lat"] for c in coords], dtype=float).reshape(len(rows), HOUR_BUCKETS)),
+        "lon_prefix": _prefix(np.array([c["lon"] for c in coords], dtype=float).reshape(len(rows), HOUR_BUCKETS)),
+        "first": dates("first"),  # hotspots × hour buckets
+        "last": dates("last"),
+        "barangays": names,
+        "member_prefix": _prefix(members),  # hotspots × barangays × (hour buckets + 1)
+        "time_clusters": time_clusters,
+    }
+
+
+def load_hotspot_summary(table: str) -> dict:
+    """
+    The hotspot summary of `table` at its current version (see `_parse` for
+    the layout), rebuilt first when the stored one is older.
+    """
+    version = get_table_version(table)
+    with _loaded_lock:
+        cached = _loaded.get(table)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    engine = get_engine()
+    # CREATE TABLE commits implicitly, which would drop the row lock below;
+    # create both tables in a transaction of their own first.
+    with engine.begin() as conn:
+        _ensure_registry(conn)
+        _create_summary_table(conn, summary_table(table))
+    with engine.begin() as conn:
+        header = conn.execute(text(
+            f"SELECT `version`, `time_clusters` FROM `{SUMMARY_REGISTRY}` WHERE `table_name` = :t FOR UPDATE"
+        ), {"t": table}).mappings().fetchone()
+        if header is None or int(header["version"]) != version:
+            rows, time_clusters = _rebuild(conn, table, version)
+        else:
+            time_clusters = json.loads(header["time_clusters"])
+            rows = [dict(r) for r in conn.execute(text(
+                "SELECT `hotspot`, `center_lat`, `center_lon`, `radius_m`, `accidents`, `last_seen`, `barangays`,"
+                f" `first_month`, `hour_counts`, `hour_coords` FROM `{summary_table(table)}` ORDER BY `hotspot`"
+            )).mappings().fetchall()]
+
+    summary = _parse(rows, time_clusters, version)
+    with _loaded_lock:
+        _loaded[table] = (version, summary)
+    return summary
+
+
+def _cluster_hours(column: str) -> list:
+    """Hour buckets whose rows have a 1 in the one-hot TIME_CLUSTER `column` (preprocessing's bins)."""
+    label = column[len("TIME_CLUSTER_"):] if column.startswith("TIME_CLUSTER_") else None
+    binned = {h: lbl for lo, hi, lbl in TIME_CLUSTER_BINS for h in range(lo, hi + 1)}
+    return [h for h in range(HOUR_BUCKETS) if binned.get(h, "Midnight") == label]
+
+
+def hour_segments(buckets) -> list:
+    """`buckets` (hour buckets, or None for all of them) as sorted half-open (start, stop) runs."""
+    if buckets is None:
+        return [(0, HOUR_BUCKETS)]
+    segments = []
+    for h in sorted({int(h) for h in buckets if 0 <= int(h) < HOUR_BUCKETS}):
+        if segments and segments[-1][1] == h:
+            segments[-1] = (segments[-1][0], h + 1)
+        else:
+            segments.append((h, h + 1))
+    return segments
+
+
+def window_sum(prefix: np.ndarray, segments: list) -> np.ndarray:
+    """Sum over the hour buckets in `segments` of a `_prefix` array: one subtraction per run."""
+    total = np.zeros(prefix.shape[:-1], dtype=prefix.dtype)
+    for start, stop in segments:
+        total += prefix[..., stop] - prefix[..., start]
+    return total
+
+
+def summary_window(summary: dict, hours: list | None) -> dict | None:
+    """
+    What the map needs for the hours `hours` (None: all hour buckets, rows
+    without an hour included), as hotspot_map_data derives it from rows:
+    "ts" (hotspot_monthly_frame's output), "last_date", "hotspots",
+    "centroids", "members" and "center". None when the window has no accidents.
+
+    Any window, including one that wraps past midnight, is at most two runs of
+    hours, so each sum costs O(hotspots × months) whatever its width.
+    """
+    buckets = None if hours is None else [h for h in hours if 0 <= int(h) < 24]
+    segments = hour_segments(buckets)
+    counts = window_sum(summary["count_prefix"], segments)  # hotspots × months
+    totals = counts.sum(axis=1)
+    present = totals > 0
+    if not present.any():
+        return None
+
+    in_window = np.zeros(HOUR_BUCKETS, dtype=bool)
+    for start, stop in segments:
+        in_window[start:stop] = True
+    first = summary["first"][:, in_window][present]
+    last = summary["last"][:, in_window][present]
+    first_date, last_date = pd.Timestamp(np.nanmin(first)), pd.Timestamp(np.nanmax(last))
+
+    h_idx, m_idx = np.nonzero(counts)
+    ts_aggregated = pd.DataFrame({
+        'ACCIDENT_HOTSPOT': summary["hotspots"][h_idx],
+        'DATE_COMMITTED': summary["months"][m_idx],
+    })
+    for col in summary["time_clusters"]:
+        cluster = [h for h in _cluster_hours(col) if in_window[h]]
+        ts_aggregated[col] = window_sum(summary["count_prefix"], hour_segments(cluster))[h_idx, m_idx]
+    ts_aggregated['accident_count'] = counts[h_idx, m_idx]
+    hotspots = summary["hotspots"][present]
+    ts = hotspot_lag_frame(ts_aggregated, hotspots, pd.date_range(first_date, last_date, freq='ME'))
+
+    lat = window_sum(summary["lat_prefix"], segments)
+    lon = window_sum(summary["lon_prefix"], segments)
+    centroids = pd.DataFrame({
+        'ACCIDENT_HOTSPOT': hotspots,
+        'Center_Lat': lat[present] / totals[present],
+        'Center_Lon': lon[present] / totals[present],
+    })
+    m_h, m_b = np.nonzero(window_sum(summary["member_prefix"], segments)[present] > 0)
+    members = pd.DataFrame({
+        'ACCIDENT_HOTSPOT': hotspots[m_h],
+        'BARANGAY': np.array(summary["barangays"], dtype=object)[m_b] if len(m_b) else np.array([], dtype=object),
+    })
+    return {
+        "version": summary["version"],
+        "ts": ts,
+        "last_date": last_date,
+        "hotspots": hotspots,
+        "centroids": centroids,
+        "members": members,
+        "center": (lat.sum() / totals.sum(), lon.sum() / totals.sum()),
+    }
+
+
+def refresh_hotspot_summary(table: str) -> None:
+    """Bring `table`'s summary up to its current version."""
+    load_hotspot_summary(table)
+
+
+def drop_hotspot_summary(table: str) -> None:
+    """Forget the summary of a dropped table."""
+    engine = get_engine()
+    with engine.begin() as conn:
+        _ensure_registry(conn)
+        conn.execute(text(f"DROP TABLE IF EXISTS `{summary_table(table)}`"))
+        conn.execute(text(f"DELETE FROM `{SUMMARY_REGISTRY}` WHERE `table_name` = :t"), {"t": table})
+    with _loaded_lock:
+        _loaded.pop(table, None)
+
+
+def schedule_hotspot_summary(table: str) -> None:
+    """Rebuild `table`'s summary in a background thread (one at a time per table)."""
+    with _refreshing_lock:
+        if table in _refreshing:
+            return
+        _refreshing.add(table)
+
+    def _job():
+        try:
+            refresh_hotspot_summary(table)
+        except Exception as e:
+            print(f"Hotspot summary refresh failed for '{table}': {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(table)
+
+    threading.Thread(target=_job, name=f"hotspots-{table}", daemon=True).start()
@@ -0,0 +1,185 @@
+# app/services/map_cache.py
+
+"""
+Rendered hotspot maps (the folium page and the /api/hotspots.json layer)
+shared by every gunicorn worker.
+
+A map page depends on the table's data version, the hotspot model that
+produced it, the non-date filters, the start/end months and the hour range.
+`cached_map` stores each rendered page gzip-compressed under
+instance/maps/<key>.gz, keyed on all of those, so a repeated view costs
+a file read. The key doubles as the page's ETag.
+
+Identical concurrent misses are single-flighted with the forecast store's file
+lock. Every hit refreshes the file's mtime and writes evict the least recently
+used pages once the directory grows past RTAVERSE_MAP_CACHE_MB. For the "Live"
+default view (current month and hour) the next hour's page is rendered in the
+background, so the top of the hour does not start with a cold map.
+
+Environment:
+    RTAVERSE_MAP_CACHE       set to 0 to render every map request
+    RTAVERSE_MAP_CACHE_MB    size bound of the cache directory (default 256)
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from typing import NamedTuple
+
+from ..config import ARTIFACT_DIR
+from .database import get_table_version
+from .forecast_store import KeyLock, canonical_arguments
+from .model_registry import METADATA_FILE, version_dir
+from .training_executor import background_training
+
+MAP_CACHE_DIR = os.path.join(ARTIFACT_DIR, "maps")
+MAP_CACHE_ENABLED = os.getenv("RTAVERSE_MAP_CACHE", "1") != "0"
+MAP_CACHE_MAX_BYTES = int(float(os.getenv("RTAVERSE_MAP_CACHE_MB", "256")) * 1024 * 1024)
+MAP_CACHE_FORMAT_VERSION = 2
+
+_warming = set()  # keys being rendered ahead of time in this process
+_warming_lock = threading.Lock()
+
+
+class CachedMap(NamedTuple):
+    etag: str
+    gzipped: bytes
+
+    def text(self) -> str:
+        return gzip.decompress(self.gzipped).decode("utf-8")
+
+
+def _model_stamp(table: str, version: int):
+    """Changes when the model for `version` is (re)trained; None before it exists."""
+    try:
+        return os.path.getmtime(os.path.join(version_dir(table, version), METADATA_FILE))
+    except OSError:
+        return None
+
+
+def map_cache_key(table: str, version: int, model_stamp, args: dict) -> str:
+    payload = json.dumps(
+        {"v": MAP_CACHE_FORMAT_VERSION, "table": table, "version": int(version),
+         "model": model_stamp, "args": canonical_arguments(args)},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _path(key: str) -> str:
+    return os.path.join(MAP_CACHE_DIR, f"{key}.gz")
+
+
+def _read(key: str) -> CachedMap | None:
+    path = _path(key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)  # most recently used
+    except OSError:
+        return None
+    return CachedMap(etag=f'"{key[:32]}"', gzipped=data)
+
+
+def _write(key: str, html: str) -> CachedMap:
+    data = gzip.compress(html.encode("utf-8"), compresslevel=6)
+    path = _path(key)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        _evict()
+    except OSError as e:
+        print(f"Map cache write skipped for {path}: {e}")
+        try: os.remove(tmp)
+        except OSError: pass
+    return CachedMap(etag=f'"{key[:32]}"', gzipped=data)
+
+
+def _evict() -> None:
+    """Drop least recently used pages until the directory fits MAP_CACHE_MAX_BYTES."""
+    entries = []
+    with os.scandir(MAP_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith(".gz"):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= MAP_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def _uncached(html: str) -> CachedMap:
+    return CachedMap(etag=f'"{hashlib.sha256(html.encode()).hexdigest()[:32]}"',
+                     gzipped=gzip.compress(html.encode("utf-8"), compresslevel=6))
+
+
+def cached_map(table: str, args: dict, build) -> tuple[CachedMap, bool]:
+    """
+    The page for (table version, model, args): from the cache, else rendered
+    by `build()` (at most once across workers) and stored. Returns
+    (page, whether it was a cache hit).
+    """
+    if not MAP_CACHE_ENABLED:
+        return _uncached(build()), False
+
+    version = get_table_version(table)
+    key = map_cache_key(table, version, _model_stamp(table, version), args)
+    page = _read(key)
+    if page is not None:
+        return page, True
+
+    try:
+        os.makedirs(MAP_CACHE_DIR, exist_ok=True)
+    except OSError as e:
+        print(f"Map cache unavailable ({e}); rendering directly.")
+        return _uncached(build()), False
+
+    # 256 striped lock files rather than one per page, so evicting a page never races its lock.
+    with KeyLock(os.path.join(MAP_CACHE_DIR, f"{key[:2]}.lock")):
+        page = _read(key)  # another worker may have rendered it while we waited
+        if page is not None:
+            return page, True
+        html = build()
+        # Rendering may have trained the model; file the page under the model it used.
+        stored_key = map_cache_key(table, version, _model_stamp(table, version), args)
+        return _write(stored_key, html), False
+
+
+def schedule_warm(table: str, args: dict, build) -> None:
+    """Render the page for `args` in the background unless it is cached or already being rendered."""
+    if not MAP_CACHE_ENABLED:
+        return
+    try:
+        version = get_table_version(table)
+    except Exception as e:
+        print(f"Map warm-up skipped for '{table}': {e}")
+        return
+    key = map_cache_key(table, version, _model_stamp(table, version), args)
+    if os.path.exists(_path(key)):
+        return
+    with _warming_lock:
+        if key in _warming:
+            return
+        _warming.add(key)
+
+    def _job():
+        try:
+            with background_training():
+                cached_map(table, args, build)
+        except Exception as e:
+            print(f"Map warm-up failed for '{table}': {e}")
+        finally:
+            with _warming_lock:
+                _warming.discard(key)
+
+    threading.Thread(target=_job, name=f"warm-map-{table}", daemon=True).start()
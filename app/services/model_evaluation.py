@@ -0,0 +1,238 @@
+# app/services/model_evaluation.py
+
+"""
+Offline evaluation of the hotspot model.
+
+A rolling-origin (TimeSeriesSplit) cross-validation of the Poisson XGBoost
+hotspot model, run in the background after a table changes or the model is
+retrained. Per-fold and aggregate metrics, together with fit times, are stored
+in `app_model_metrics` and served by /api/model_metrics; map requests never
+fit evaluation models.
+"""
+
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error, r2_score, mean_squared_error
+from sklearn.model_selection import TimeSeriesSplit
+from sqlalchemy import text
+from xgboost import XGBRegressor
+
+from ..extensions import get_engine
+from .database import get_table_version
+from .model_registry import HOTSPOT_MODEL_PARAMS, hotspot_monthly_frame, load_hotspot_rows
+from .training_executor import job_threads, run_training
+
+MODEL_METRICS = "app_model_metrics"
+HOTSPOT_MODEL = "xgboost_hotspot"
+MAX_SPLITS = 4
+
+EVAL_MODEL_PARAMS = dict(HOTSPOT_MODEL_PARAMS, min_child_weight=1, gamma=0.1, early_stopping_rounds=10)
+
+_latest = {}  # table -> newest version scheduled for evaluation in this process
+_running = set()  # tables with an evaluation thread in this process
+_running_lock = threading.Lock()
+
+
+def _ensure_metrics_table(conn):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS `{MODEL_METRICS}` ("
+        " `id` BIGINT AUTO_INCREMENT PRIMARY KEY,"
+        " `run_id` CHAR(32) NOT NULL,"
+        " `table_name` VARCHAR(128) NOT NULL,"
+        " `model` VARCHAR(64) NOT NULL,"
+        " `version` BIGINT NOT NULL,"
+        " `fold` INT NULL,"  # NULL for the aggregate row of a run
+        " `n_train` INT NULL,"
+        " `n_test` INT NULL,"
+        " `mae` DOUBLE NULL,"
+        " `mape` DOUBLE NULL,"
+        " `r2` DOUBLE NULL,"
+        " `mse` DOUBLE NULL,"
+        " `rmse` DOUBLE NULL,"
+        " `fit_seconds` DOUBLE NULL,"
+        " `best_iteration` INT NULL,"
+        " `evaluated_at` DATETIME NOT NULL,"
+        " INDEX `idx_table_model_version` (`table_name`, `model`, `version`)"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    ))
+
+
+def _scores(y_true, y_pred) -> dict:
+    y_true = pd.Series(y_true).astype(float)
+    mse = mean_squared_error(y_true, y_pred)
+    return {
+        "mae": float(mean_absolute_error(y_true, y_pred)),
+        "mape": float(mean_absolute_percentage_error(y_true.replace(0, 1e-6), y_pred) * 100),
+        "r2": float(r2_score(y_true, y_pred)) if len(y_true) > 1 else None,
+        "mse": float(mse),
+        "rmse": float(np.sqrt(mse)),
+    }
+
+
+def cross_validate_hotspot_model(ts: pd.DataFrame) -> dict:
+    """
+    TimeSeriesSplit CV over a hotspot_monthly_frame. Returns
+    {"folds": [...], "aggregate": {...}} or None when there is too little data.
+    """
+    ts = ts.sort_values('DATE_COMMITTED', kind='stable').reset_index(drop=True)
+    y = ts['accident_count']
+    X = ts.drop(columns=['accident_count', 'DATE_COMMITTED'])
+    n_samples = len(X)
+    n_splits = min(MAX_SPLITS, n_samples - 1)
+    if n_samples < 3 or n_splits < 2:
+        print(f"Warning: Only {n_samples} samples available. Skipping cross-validation.")
+        return None
+
+    folds, all_y_test, all_forecasts = [], [], []
+    for fold, (train_index, test_index) in enumerate(TimeSeriesSplit(n_splits=n_splits).split(X), 1):
+        X_train, X_test = X.iloc[train_index], X.iloc[test_index]
+        y_train, y_test = y.iloc[train_index], y.iloc[test_index]
+        if X_test.empty: continue
+
+        started = time.perf_counter()
+        model = XGBRegressor(**EVAL_MODEL_PARAMS, n_jobs=job_threads())
+        model.fit(X_train, y_train, eval_set=[(X_test, y_test)], verbose=False)
+        fit_seconds = time.perf_counter() - started
+
+        forecasts = model.predict(X_test)
+        all_y_test.append(y_test); all_forecasts.append(forecasts)
+        folds.append({
+            "fold": fold, "n_train": int(len(X_train)), "n_test": int(len(X_test)),
+            **_scores(y_test, forecasts),
+            "fit_seconds": round(fit_seconds, 3),
+            "best_iteration": getattr(model, "best_iteration", None),
+        })
+        print(f"Fold {fold} complete. MAE: {folds[-1]['mae']:.2f} ({fit_seconds:.1f}s)")
+
+    if not folds:
+        return None
+    aggregate = {
+        "fold": None, "n_train": None, "n_test": int(sum(f["n_test"] for f in folds)),
+        **_scores(pd.concat(all_y_test), np.concatenate(all_forecasts)),
+        "fit_seconds": round(sum(f["fit_seconds"] for f in folds), 3),
+        "best_iteration": None,
+    }
+    return {"folds": folds, "aggregate": aggregate}
+
+
+def _store_run(table: str, version: int, result: dict) -> str:
+    run_id = uuid.uuid4().hex
+    evaluated_at = datetime.now().replace(microsecond=0)
+    rows = [
+        {**row, "run_id": run_id, "table_name": table, "model": HOTSPOT_MODEL, "version": int(version), "evaluated_at": evaluated_at}
+        for row in result["folds"] + [result["aggregate"]]
+    ]
+    engine = get_engine()
+    with engine.begin() as conn:
+        _ensure_metrics_table(conn)
+        conn.execute(
+            text(
+                f"INSERT INTO `{MODEL_METRICS}` (`run_id`, `table_name`, `model`, `version`, `fold`, `n_train`, `n_test`,"
+                " `mae`, `mape`, `r2`, `mse`, `rmse`, `fit_seconds`, `best_iteration`, `evaluated_at`)"
+                " VALUES (:run_id, :table_name, :model, :version, :fold, :n_train, :n_test,"
+                " :mae, :mape, :r2, :mse, :rmse, :fit_seconds, :best_iteration, :evaluated_at)"
+            ),
+            rows,
+        )
+    return run_id
+
+
+def evaluate_hotspot_model(table: str, version: int | None = None):
+    """Cross-validate the hotspot model on `table` and store the metrics. Returns the run id."""
+    version = version if version is not None else get_table_version(table)
+    print(f"\n--- [EVALUATION] Hotspot XGBoost cross-validation for table: '{table}' (v{version}) ---")
+    ts = hotspot_monthly_frame(load_hotspot_rows(table))
+    result = cross_validate_hotspot_model(ts) if not ts.empty else None
+    if result is None:
+        print("Warning: Not enough data to perform and report cross-validation metrics.\n")
+        return None
+
+    agg = result["aggregate"]
+    print(f"Mean Absolute Error (MAE): {agg['mae']:.2f}")
+    print(f"Mean Absolute Percentage Error (MAPE): {agg['mape']:.2f}%")
+    print(f"Root Mean Squared Error (RMSE): {agg['rmse']:.2f}\n")
+    return _store_run(table, version, result)
+
+
+def _evaluate_current(table: str, version: int):
+    """evaluate_hotspot_model, unless `version` was superseded while the job waited for a slot."""
+    current = get_table_version(table)
+    if current != version:
+        print(f"Evaluation of '{table}' v{version} skipped: superseded by v{current}.")
+        return None
+    return evaluate_hotspot_model(table, version)
+
+
+def schedule_evaluation(table: str, version: int | None = None) -> None:
+    """
+    Evaluate the hotspot model on `table` in a background thread. Only the
+    newest scheduled version is evaluated: a burst of writes leaves at most one
+    evaluation per table waiting for a training slot, and it runs on the latest
+    version once the current one finishes.
+    """
+    if version is None:
+        try:
+            version = get_table_version(table)
+        except Exception as e:
+            print(f"Could not read data version for '{table}': {e}")
+            return
+    with _running_lock:
+        _latest[table] = max(int(version), _latest.get(table, int(version)))
+        if table in _running:
+            return  # the running thread picks the newer version up when it is done
+        _running.add(table)
+
+    def _job():
+        done = None
+        while True:
+            with _running_lock:
+                v = _latest[table]
+                if v == done:
+                    _running.discard(table)
+                    return
+            try:
+                # Background job: wait for a free training slot instead of being rejected.
+                run_training(_evaluate_current, table, v, block=True, timeout=None)
+            except Exception as e:
+                print(f"Hotspot model evaluation failed for '{table}' v{v}: {e}")
+            done = v
+
+    threading.Thread(target=_job, name=f"evaluate-{table}", daemon=True).start()
+
+
+def latest_model_metrics(table: str, model: str = HOTSPOT_MODEL) -> dict | None:
+    """Most recent evaluation run for `table`: {"run_id", "version", "evaluated_at", "aggregate", "folds"}."""
+    engine = get_engine()
+    with engine.begin() as conn:
+        _ensure_metrics_table(conn)
+        run = conn.execute(
+            text(
+                f"SELECT `run_id` FROM `{MODEL_METRICS}` WHERE `table_name` = :t AND `model` = :m"
+                " ORDER BY `evaluated_at` DESC, `id` DESC LIMIT 1"
+            ),
+            {"t": table, "m": model},
+        ).fetchone()
+        if run is None:
+            return None
+        rows = conn.execute(
+            text(f"SELECT * FROM `{MODEL_METRICS}` WHERE `run_id` = :r ORDER BY `fold` IS NULL, `fold`"),
+            {"r": run[0]},
+        ).mappings().all()
+
+    metric_cols = ["n_train", "n_test", "mae", "mape", "r2", "mse", "rmse", "fit_seconds", "best_iteration"]
+    folds = [{"fold": r["fold"], **{c: r[c] for c in metric_cols}} for r in rows if r["fold"] is not None]
+    aggregate = next(({c: r[c] for c in metric_cols} for r in rows if r["fold"] is None), None)
+    return {
+        "run_id": run[0],
+        "table": table,
+        "model": model,
+        "version": int(rows[0]["version"]),
+        "evaluated_at": rows[0]["evaluated_at"].isoformat() if rows[0]["evaluated_at"] else None,
+        "aggregate": aggregate,
+        "folds": folds,
+    }
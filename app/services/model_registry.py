@@ -0,0 +1,618 @@
+# app/services/model_registry.py
+
+"""
+Persisted Poisson XGBoost hotspot model.
+
+The model is trained once per table data version on every hotspot/month of the
+table and saved under instance/models/<table>/v<version>/ together with its
+metadata (feature list, training window, metrics). Map requests load it and
+only run inference; /api/retrain_model rebuilds it explicitly.
+
+When a new version only adds rows from the end of the previous model's
+training window onwards, the previous model is updated instead of retrained:
+boosting continues (`xgb_model=`) on the feature rows of the newly completed
+months (the newest month is left out until it closes), which are built from a
+short lookback of rows rather than the whole table. Every FULL_REFIT_EVERY
+incremental updates, or when rows of earlier months changed, the model is
+refit from scratch.
+
+A request that finds no model can pass a training budget (seconds): the model
+is then fitted with the `hist` tree method, a learning rate raised in
+proportion to the rounds the budget affords, early stopping on the most recent
+months, and a hard stop at the budget. A full-quality model for the same
+version is trained in the background afterwards.
+
+Whenever a model is saved, the feature contributions (`pred_contribs`) of
+every hotspot's latest feature row are computed in one batch and stored next
+to it (explanations.json). They explain the prediction the map's forecast
+starts from and are served by /api/hotspot_explain/<id> and the map popups
+without touching the model.
+"""
+
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+from sqlalchemy import text
+from xgboost import DMatrix, XGBRegressor
+from xgboost.callback import TrainingCallback
+
+from ..config import ARTIFACT_DIR
+from ..extensions import get_engine
+from .database import get_table_version
+from .training_executor import (
+    TRAINING_TIMEOUT, TrainingTimeout, in_background_training, job_threads, run_training,
+)
+
+MODEL_DIR = os.path.join(ARTIFACT_DIR, "models")
+MODEL_FILE = "xgboost_hotspot_model.joblib"
+METADATA_FILE = "metadata.json"
+EXPLANATIONS_FILE = "explanations.json"
+KEEP_VERSIONS = 2  # older versions of a table's model are pruned after training
+FULL_REFIT_EVERY = int(os.getenv("RTAVERSE_FULL_REFIT_EVERY", "6"))
+INCREMENTAL_ROUNDS = 100  # boosting rounds added per incremental update
+LOOKBACK_MONTHS = 3  # history needed for the lag/rolling features of a new month
+
+HOTSPOT_MODEL_PARAMS = dict(
+    objective='count:poisson', n_estimators=1000, learning_rate=0.01, max_depth=4, random_state=42
+)
+
+# Budgeted ("latency") training.
+MAP_TRAINING_BUDGET = float(os.getenv("RTAVERSE_MAP_TRAINING_BUDGET", "10"))  # seconds; 0 = no limit
+BUDGET_PROBE_ROUNDS = 5  # rounds fitted first to measure the cost of a round
+BUDGET_MIN_ROUNDS = 50
+BUDGET_MAX_LEARNING_RATE = 0.3
+BUDGET_EARLY_STOPPING_ROUNDS = 20
+BUDGET_VALIDATION_MONTHS = 3  # most recent months held out for early stopping
+
+# Readable names of the model's features, for explanations.
+FEATURE_LABELS = {
+    "ACCIDENT_HOTSPOT": "Hotspot location",
+    "lag_1_month": "Accidents last month",
+    "rolling_mean_3_months": "3-month average",
+    "month_of_year": "Month of year",
+    "quarter_of_year": "Quarter",
+}
+
+_loaded = {}  # table -> ((version, metadata mtime), model, metadata)
+_explanations = {}  # table -> ((version, file mtime), explanations)
+_loaded_lock = threading.Lock()  # guards _loaded and _explanations (request and background threads)
+_train_locks = {}  # table -> lock held while that table's model is being built
+_train_locks_lock = threading.Lock()
+_updating = set()  # tables with a background update in flight in this process
+_updating_lock = threading.Lock()
+_refitting = set()  # (table, version) with a background full refit in flight in this process
+_refitting_lock = threading.Lock()
+
+
+def hotspot_monthly_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Hotspot × month accident counts with the lag/calendar features of the
+    hotspot model. `df` holds accident rows with a parsed DATE_COMMITTED and
+    ACCIDENT_HOTSPOT != -1. Months without accidents are filled with zeros.
+    """
+    df = df.copy()
+    time_cluster_cols = [c for c in df.columns if 'TIME_CLUSTER' in str(c)]
+    for col in time_cluster_cols:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).astype(int)
+
+    grouped = df.set_index('DATE_COMMITTED').groupby(['ACCIDENT_HOTSPOT', pd.Grouper(freq='ME')])
+    ts_aggregated = grouped[time_cluster_cols].sum()
+    ts_aggregated['accident_count'] = grouped.size()
+    ts_aggregated = ts_aggregated.reset_index()
+
+    month_range = pd.date_range(df['DATE_COMMITTED'].min(), df['DATE_COMMITTED'].max(), freq='ME')
+    return hotspot_lag_frame(ts_aggregated, df['ACCIDENT_HOTSPOT'].unique(), month_range)
+
+
+def hotspot_lag_frame(ts_aggregated: pd.DataFrame, all_clusters, month_range: pd.DatetimeIndex) -> pd.DataFrame:
+    """
+    The second half of hotspot_monthly_frame, for counts aggregated elsewhere:
+    `ts_aggregated` has ACCIDENT_HOTSPOT, DATE_COMMITTED (month end), the time
+    cluster sums and accident_count for the hotspot-months with accidents.
+    """
+    ts_aggregated = ts_aggregated.assign(DATE_COMMITTED=ts_aggregated['DATE_COMMITTED'].astype('datetime64[ns]'))
+    month_range = month_range.astype('datetime64[ns]')
+    full_grid = pd.MultiIndex.from_product([all_clusters, month_range], names=['ACCIDENT_HOTSPOT','DATE_COMMITTED']).to_frame(index=False)
+
+    ts = pd.merge(full_grid, ts_aggregated, on=['ACCIDENT_HOTSPOT','DATE_COMMITTED'], how='left').fillna(0).sort_values(['ACCIDENT_HOTSPOT','DATE_COMMITTED']).reset_index(drop=True)
+    ts['lag_1_month'] = ts.groupby('ACCIDENT_HOTSPOT')['accident_count'].shift(1)
+    ts['rolling_mean_3_months'] = ts.groupby('ACCIDENT_HOTSPOT')['accident_count'].shift(1).rolling(window=3).mean()
+    ts['month_of_year'] = ts['DATE_COMMITTED'].dt.month
+    ts['quarter_of_year'] = ts['DATE_COMMITTED'].dt.quarter
+    ts = ts.dropna().reset_index(drop=True)
+    ts['ACCIDENT_HOTSPOT'] = ts['ACCIDENT_HOTSPOT'].astype(int)
+    return ts
+
+
+def hotspot_feature_matrix(ts: pd.DataFrame, features: list) -> pd.DataFrame:
+    """Model inputs in training column order (time clusters absent from `ts` count as 0)."""
+    return ts.reindex(columns=features, fill_value=0)
+
+
+def load_hotspot_rows(table: str, since: str | None = None) -> pd.DataFrame:
+    """
+    Clustered accident rows of `table` (optionally only those on or after the
+    date `since`), projected to the model's columns.
+    """
+    engine = get_engine()
+    with engine.connect() as conn:
+        cols = [str(r[0]) for r in conn.execute(text(f"SHOW COLUMNS FROM `{table}`")).fetchall()]
+    wanted = ["DATE_COMMITTED", "ACCIDENT_HOTSPOT"] + [c for c in cols if 'TIME_CLUSTER' in c]
+    select_sql = ", ".join(f"`{c}`" for c in wanted if c in cols)
+    sql = f"SELECT {select_sql} FROM `{table}` WHERE `DATE_COMMITTED` IS NOT NULL"
+    params = None
+    if since:
+        sql += " AND `DATE_COMMITTED` >= %(since)s"
+        params = {"since": since}
+    df = pd.read_sql_query(sql, engine, params=params)
+
+    df["ACCIDENT_HOTSPOT"] = pd.to_numeric(df["ACCIDENT_HOTSPOT"], errors='coerce').fillna(-1).astype(int)
+    df["DATE_COMMITTED"] = pd.to_datetime(df["DATE_COMMITTED"], errors="coerce")
+    return df[(df["ACCIDENT_HOTSPOT"] != -1) & df["DATE_COMMITTED"].notna()].copy()
+
+
+def monthly_row_counts(table: str) -> dict:
+    """{"YYYY-MM": rows} for the whole table, used to detect edits inside a training window."""
+    engine = get_engine()
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            f"SELECT YEAR(`DATE_COMMITTED`) * 100 + MONTH(`DATE_COMMITTED`) AS ym, COUNT(*) FROM `{table}`"
+            " WHERE `DATE_COMMITTED` IS NOT NULL GROUP BY ym"
+        )).fetchall()
+    return {f"{int(ym) // 100:04d}-{int(ym) % 100:02d}": int(n) for ym, n in rows if ym is not None}
+
+
+def _table_dir(table: str) -> str:
+    return os.path.join(MODEL_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", table))
+
+
+def version_dir(table: str, version: int) -> str:
+    """Directory holding the model files of `table` at `version`."""
+    return os.path.join(_table_dir(table), f"v{int(version)}")
+
+
+def _atomic_write(path: str, write) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def feature_label(feature: str) -> str:
+    if feature.startswith("TIME_CLUSTER_"):
+        return f"{feature[len('TIME_CLUSTER_'):]} accidents"
+    return FEATURE_LABELS.get(feature, feature)
+
+
+def explain_hotspots(model, ts: pd.DataFrame, features: list) -> dict:
+    """
+    {"hotspot id": {"as_of", "prediction", "base", "contributions"}} for the
+    latest row of every hotspot in `ts`. Contributions are in the Poisson
+    model's log space: prediction = base × exp(sum of contributions).
+    """
+    if ts.empty:
+        return {}
+    last_rows = ts.loc[ts.groupby('ACCIDENT_HOTSPOT')['DATE_COMMITTED'].idxmax()]
+    X = hotspot_feature_matrix(last_rows, features)
+    best = getattr(model, "best_iteration", None)
+    limit = {"iteration_range": (0, best + 1)} if best is not None else {}
+    contribs = model.get_booster().predict(DMatrix(X.to_numpy(dtype=float), feature_names=list(features)),
+                                           pred_contribs=True, **limit)
+    explanations = {}
+    for hotspot, as_of, row in zip(last_rows['ACCIDENT_HOTSPOT'], last_rows['DATE_COMMITTED'], contribs):
+        explanations[str(int(hotspot))] = {
+            "as_of": as_of.strftime('%Y-%m-%d'),
+            "prediction": float(np.exp(row.sum())),
+            "base": float(np.exp(row[-1])),
+            "contributions": {f: float(c) for f, c in zip(features, row[:-1])},
+        }
+    return explanations
+
+
+def explanation_drivers(entry: dict) -> list:
+    """An explanation's features, strongest first: [{"feature", "label", "contribution", "factor"}]."""
+    drivers = [
+        {"feature": f, "label": feature_label(f), "contribution": c, "factor": float(np.exp(c))}
+        for f, c in entry["contributions"].items()
+    ]
+    return sorted(drivers, key=lambda d: -abs(d["contribution"]))
+
+
+def save_hotspot_model(table: str, version: int, model, meta: dict, explanations: dict | None = None) -> None:
+    vdir = version_dir(table, version)
+    os.makedirs(vdir, exist_ok=True)
+    # The metadata file is written last: a version is only visible once complete.
+    _atomic_write(os.path.join(vdir, MODEL_FILE), lambda p: joblib.dump(model, p))
+    def _write_json(data):
+        def _write(p):
+            with open(p, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, default=str)
+        return _write
+    if explanations is not None:
+        _atomic_write(os.path.join(vdir, EXPLANATIONS_FILE),
+                      _write_json({"table": table, "version": int(version), "hotspots": explanations}))
+    _atomic_write(os.path.join(vdir, METADATA_FILE), _write_json(meta))
+
+    # Prune versions that can no longer be requested.
+    for name in os.listdir(_table_dir(table)):
+        m = re.fullmatch(r"v(\d+)", name)
+        if m and int(m.group(1)) <= int(version) - KEEP_VERSIONS:
+            shutil.rmtree(os.path.join(_table_dir(table), name), ignore_errors=True)
+
+
+class _TimeBudget(TrainingCallback):
+    """Stop boosting once `seconds` have passed since training started."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.started = None
+        self.exhausted = False
+
+    def before_training(self, model):
+        self.started = time.perf_counter()
+        return model
+
+    def after_iteration(self, model, epoch, evals_log) -> bool:
+        self.exhausted = time.perf_counter() - self.started >= self.seconds
+        return self.exhausted
+
+
+def _fit_within_budget(X: pd.DataFrame, y: pd.Series, dates: pd.Series, budget_seconds: float):
+    """Fit the hotspot model in about `budget_seconds`. Returns (model, training info)."""
+    started = time.perf_counter()
+    base_rounds, base_rate = HOTSPOT_MODEL_PARAMS["n_estimators"], HOTSPOT_MODEL_PARAMS["learning_rate"]
+    params = dict(HOTSPOT_MODEL_PARAMS, tree_method="hist")
+
+    probe = XGBRegressor(**dict(params, n_estimators=BUDGET_PROBE_ROUNDS), n_jobs=job_threads())
+    probe.fit(X, y, verbose=False)
+    per_round = (time.perf_counter() - started) / BUDGET_PROBE_ROUNDS
+    remaining = max(0.0, budget_seconds - (time.perf_counter() - started))
+
+    # Fewer affordable rounds -> proportionally larger steps (same rounds × rate).
+    rounds = int(min(base_rounds, max(BUDGET_MIN_ROUNDS, 0.8 * remaining / per_round)))
+    learning_rate = min(BUDGET_MAX_LEARNING_RATE, base_rate * base_rounds / rounds)
+
+    months = np.sort(dates.unique())
+    if len(months) > 2 * BUDGET_VALIDATION_MONTHS:
+        held_out = (dates >= months[-BUDGET_VALIDATION_MONTHS]).to_numpy()
+    else:
+        held_out = np.zeros(len(X), dtype=bool)
+    X_fit, y_fit = (X[~held_out], y[~held_out]) if held_out.any() else (X, y)
+    X_val, y_val = (X[held_out], y[held_out]) if held_out.any() else (X, y)
+
+    budget = _TimeBudget(remaining)
+    model = XGBRegressor(
+        **dict(params, n_estimators=rounds, learning_rate=learning_rate),
+        early_stopping_rounds=BUDGET_EARLY_STOPPING_ROUNDS if held_out.any() else None,
+        callbacks=[budget], n_jobs=job_threads(),
+    )
+    model.fit(X_fit, y_fit, eval_set=[(X_val, y_val)], verbose=False)
+
+    history = next(iter(model.evals_result()["validation_0"].values()))
+    iterations = len(history)
+    best_iteration = getattr(model, "best_iteration", None)
+    if best_iteration is None:
+        best_iteration = iterations - 1
+    if budget.exhausted:
+        stopped_by = "budget"
+    elif iterations < rounds:
+        stopped_by = "early_stopping"
+    else:
+        stopped_by = "rounds"
+    return model, {
+        "mode": "budget",
+        "budget_seconds": budget_seconds,
+        "tree_method": "hist",
+        "learning_rate": learning_rate,
+        "planned_rounds": rounds,
+        "iterations": iterations,
+        "best_iteration": int(best_iteration),
+        "val_loss": float(history[best_iteration]),
+        "val_metric": next(iter(model.evals_result()["validation_0"])),
+        "validation_rows": int(held_out.sum()),
+        "stopped_by": stopped_by,
+    }
+
+
+def train_hotspot_model(table: str, version: int | None = None, budget_seconds: float | None = None):
+    """
+    Fit the hotspot model on the whole table and persist it. With
+    `budget_seconds`, fit within roughly that time (see _fit_within_budget).
+    Returns (model, metadata).
+    """
+    version = version if version is not None else get_table_version(table)
+
+    counts = monthly_row_counts(table)
+    ts = hotspot_monthly_frame(load_hotspot_rows(table))
+    if ts.empty:
+        raise ValueError(f"Not enough hotspot history in '{table}' to train the hotspot model.")
+
+    y = ts['accident_count']
+    X = ts.drop(columns=['accident_count', 'DATE_COMMITTED'])
+
+    started = time.perf_counter()
+    if budget_seconds:
+        model, training = _fit_within_budget(X, y, ts['DATE_COMMITTED'], budget_seconds)
+        params = dict(HOTSPOT_MODEL_PARAMS, tree_method="hist", n_estimators=training["planned_rounds"],
+                      learning_rate=training["learning_rate"])
+    else:
+        model = XGBRegressor(**HOTSPOT_MODEL_PARAMS, n_jobs=job_threads())
+        model.fit(X, y, verbose=False)
+        params = HOTSPOT_MODEL_PARAMS
+        training = {"mode": "full", "iterations": HOTSPOT_MODEL_PARAMS["n_estimators"], "stopped_by": "rounds"}
+    fit_seconds = time.perf_counter() - started
+
+    fitted = model.predict(X)
+    explanations = explain_hotspots(model, ts, X.columns.tolist())
+    meta = {
+        "model": "xgboost_hotspot",
+        "table": table,
+        "version": int(version),
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+        "features": X.columns.tolist(),
+        "params": params,
+        "training": training,
+        "training_window": {
+            "start": ts['DATE_COMMITTED'].min().strftime('%Y-%m-%d'),
+            "end": ts['DATE_COMMITTED'].max().strftime('%Y-%m-%d'),
+        },
+        "n_samples": int(len(X)),
+        "n_hotspots": int(ts['ACCIDENT_HOTSPOT'].nunique()),
+        "fit_seconds": round(fit_seconds, 3),
+        "metrics": {
+            "train_mae": float(mean_absolute_error(y, fitted)),
+            "train_rmse": float(np.sqrt(mean_squared_error(y, fitted))),
+        },
+        "update": "full",
+        "base_version": None,
+        "incremental_updates": 0,
+        "n_estimators_total": training["iterations"],
+        "monthly_counts": counts,
+        "explained_hotspots": len(explanations),
+    }
+    save_hotspot_model(table, version, model, meta, explanations)
+    print(f"Trained hotspot model for '{table}' v{version} on {len(X)} rows in {fit_seconds:.1f}s"
+          f" ({training['mode']}, {training['iterations']} rounds).")
+    return model, meta
+
+
+def _table_train_lock(table: str) -> threading.Lock:
+    with _train_locks_lock:
+        return _train_locks.setdefault(table, threading.Lock())
+
+
+def _latest_artifact(table: str, below: int):
+    """(version, metadata) of the newest complete model older than `below`, or None."""
+    tdir = _table_dir(table)
+    if not os.path.isdir(tdir):
+        return None
+    versions = sorted(
+        (int(m.group(1)) for m in (re.fullmatch(r"v(\d+)", n) for n in os.listdir(tdir)) if m),
+        reverse=True,
+    )
+    for v in versions:
+        meta_path = os.path.join(version_dir(table, v), METADATA_FILE)
+        if v < int(below) and os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                return v, json.load(f)
+    return None
+
+
+def update_hotspot_model(table: str, version: int | None = None, budget_seconds: float | None = None):
+    """
+    Model for `version`, built from the newest older model when possible:
+    continue boosting on the months completed since, or reuse it unchanged
+    when no month was completed. Falls back to train_hotspot_model (within
+    `budget_seconds` if given). Returns (model, metadata).
+    """
+    version = version if version is not None else get_table_version(table)
+    prev = _latest_artifact(table, version)
+    if prev is None:
+        return train_hotspot_model(table, version, budget_seconds)
+    prev_version, prev_meta = prev
+
+    counts = monthly_row_counts(table)
+    window_end = pd.Timestamp(prev_meta["training_window"]["end"])
+    end_key = window_end.strftime('%Y-%m')
+    old_counts = prev_meta.get("monthly_counts") or {}
+    # The window's last month may still have been receiving rows when it was
+    # learned, so only the months before it count as history.
+    history_changed = not old_counts or any(
+        counts.get(m, 0) != old_counts.get(m, 0) for m in set(counts) | set(old_counts) if m < end_key
+    )
+    if history_changed or prev_meta.get("incremental_updates", 0) >= FULL_REFIT_EVERY:
+        reason = "rows of earlier months changed" if history_changed else "periodic full refit"
+        print(f"Full refit of hotspot model for '{table}' v{version} ({reason}).")
+        return train_hotspot_model(table, version, budget_seconds)
+
+    prev_model = joblib.load(os.path.join(version_dir(table, prev_version), MODEL_FILE))
+    prev_explanations = _read_explanations(table, prev_version)
+    # The newest month is still open; it is learned once a later month starts.
+    # The window's last month is learned again if rows arrived after it was.
+    open_key = max(counts) if counts else end_key
+    new_months = sorted(
+        m for m in counts
+        if m < open_key and (m > end_key or (m == end_key and counts[m] != old_counts.get(m, 0)))
+    )
+    new_rows = ts = pd.DataFrame()
+    if new_months:
+        first_new = pd.Timestamp(f"{new_months[0]}-01")
+        since = (first_new - pd.DateOffset(months=LOOKBACK_MONTHS)).strftime('%Y-%m-%d')
+        ts = hotspot_monthly_frame(load_hotspot_rows(table, since=since))
+        if not ts.empty:
+            new_rows = ts[ts['DATE_COMMITTED'].dt.strftime('%Y-%m').isin(new_months)]
+
+    meta = dict(prev_meta, version=int(version), base_version=prev_version,
+                trained_at=datetime.now().isoformat(timespec="seconds"))
+    if new_rows.empty:
+        # Nothing to learn from (e.g. rows without hotspots); keep the model.
+        meta.update(update="reused", fit_seconds=0.0)
+        save_hotspot_model(table, version, prev_model, meta, prev_explanations)
+        return prev_model, meta
+
+    # Counts of months not learned yet are left out, so their rows show up as
+    # new once the month closes.
+    learned_key = new_rows['DATE_COMMITTED'].max().strftime('%Y-%m')
+    meta["monthly_counts"] = {m: n for m, n in counts.items() if m <= learned_key}
+
+    features = prev_meta["features"]
+    X_new = hotspot_feature_matrix(new_rows, features)
+    y_new = new_rows['accident_count']
+
+    started = time.perf_counter()
+    model = XGBRegressor(**dict(HOTSPOT_MODEL_PARAMS, n_estimators=INCREMENTAL_ROUNDS), n_jobs=job_threads())
+    model.fit(X_new, y_new, xgb_model=prev_model.get_booster(), verbose=False)
+    fit_seconds = time.perf_counter() - started
+
+    fitted = model.predict(X_new)
+    # Hotspots without rows in the lookback keep the previous model's explanation.
+    explanations = dict(prev_explanations or {}, **explain_hotspots(model, ts, features))
+    meta.update(
+        training={"mode": "incremental", "iterations": INCREMENTAL_ROUNDS, "stopped_by": "rounds"},
+        update="incremental",
+        incremental_updates=prev_meta.get("incremental_updates", 0) + 1,
+        n_estimators_total=prev_meta.get("n_estimators_total", HOTSPOT_MODEL_PARAMS["n_estimators"]) + INCREMENTAL_ROUNDS,
+        training_window={"start": prev_meta["training_window"]["start"], "end": new_rows['DATE_COMMITTED'].max().strftime('%Y-%m-%d')},
+        n_samples=int(prev_meta.get("n_samples", 0) + len(X_new)),
+        n_hotspots=int(max(prev_meta.get("n_hotspots", 0), new_rows['ACCIDENT_HOTSPOT'].nunique())),
+        fit_seconds=round(fit_seconds, 3),
+        metrics=dict(prev_meta.get("metrics", {}),
+                     update_mae=float(mean_absolute_error(y_new, fitted)),
+                     update_rmse=float(np.sqrt(mean_squared_error(y_new, fitted))),
+                     update_rows=int(len(X_new))),
+        explained_hotspots=len(explanations),
+    )
+    save_hotspot_model(table, version, model, meta, explanations)
+    print(f"Updated hotspot model for '{table}' v{prev_version}->v{version} on {len(X_new)} new rows in {fit_seconds:.1f}s.")
+    return model, meta
+
+
+def get_hotspot_model(table: str, block: bool = False, budget_seconds: float | None = None):
+    """
+    Model for the table's current data version: from memory, then disk, and
+    only built (see update_hotspot_model) when no artifact exists yet. A model
+    built within `budget_seconds` is replaced by a full one in the background.
+    Returns (model, metadata).
+    """
+    version = get_table_version(table)
+    meta_path = os.path.join(version_dir(table, version), METADATA_FILE)
+
+    if not os.path.exists(meta_path):
+        # Background builds may wait for the pool indefinitely; a request only
+        # waits for another build of the same table up to the training timeout.
+        lock = _table_train_lock(table)
+        if block or in_background_training():
+            lock.acquire()
+        elif not lock.acquire(timeout=TRAINING_TIMEOUT):
+            raise TrainingTimeout(
+                f"The hotspot model for '{table}' is still being trained. Please retry shortly."
+            )
+        try:
+            if not os.path.exists(meta_path):
+                model, meta = run_training(update_hotspot_model, table, version, budget_seconds, block=block)
+                with _loaded_lock:
+                    _loaded[table] = ((version, os.path.getmtime(meta_path)), model, meta)
+                if meta.get("training", {}).get("mode") == "budget":
+                    schedule_full_refit(table, version)
+                return model, meta
+        finally:
+            lock.release()
+
+    # The metadata mtime changes when another worker retrains the same version.
+    stamp = (version, os.path.getmtime(meta_path))
+    with _loaded_lock:
+        cached = _loaded.get(table)
+    if cached and cached[0] == stamp:
+        return cached[1], cached[2]
+
+    model = joblib.load(os.path.join(version_dir(table, version), MODEL_FILE))
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    with _loaded_lock:
+        _loaded[table] = (stamp, model, meta)
+    return model, meta
+
+
+def _read_explanations(table: str, version: int) -> dict | None:
+    try:
+        with open(os.path.join(version_dir(table, version), EXPLANATIONS_FILE), encoding="utf-8") as f:
+            return json.load(f)["hotspots"]
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def hotspot_explanations(table: str) -> dict | None:
+    """
+    Stored explanations of the model for the table's current version
+    ({"hotspot id": explanation}), or None before that model exists. Never
+    loads or trains the model.
+    """
+    version = get_table_version(table)
+    path = os.path.join(version_dir(table, version), EXPLANATIONS_FILE)
+    try:
+        stamp = (version, os.path.getmtime(path))
+    except OSError:
+        return None
+    with _loaded_lock:
+        cached = _explanations.get(table)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    explanations = _read_explanations(table, version)
+    if explanations is not None:
+        with _loaded_lock:
+            _explanations[table] = (stamp, explanations)
+    return explanations
+
+
+def loaded_hotspot_metadata(table: str) -> dict | None:
+    """Metadata of the model this process last served for `table` (no loading or training)."""
+    with _loaded_lock:
+        cached = _loaded.get(table)
+    return cached[2] if cached else None
+
+
+def schedule_full_refit(table: str, version: int) -> None:
+    """
+    Replace a budget-trained model of `version` with a full-quality one in the
+    background (one refit at a time per table version).
+    """
+    with _refitting_lock:
+        if (table, version) in _refitting:
+            return
+        _refitting.add((table, version))
+
+    def _job():
+        try:
+            run_training(train_hotspot_model, table, version, block=True, timeout=None)
+        except Exception as e:
+            print(f"Full refit of hotspot model failed for '{table}' v{version}: {e}")
+        finally:
+            with _refitting_lock:
+                _refitting.discard((table, version))
+
+    threading.Thread(target=_job, name=f"refit-model-{table}", daemon=True).start()
+
+
+def schedule_model_update(table: str) -> None:
+    """Build the model for the table's new version in the background (after appends)."""
+    def _job():
+        with _updating_lock:
+            if table in _updating: return
+            _updating.add(table)
+        try:
+            get_hotspot_model(table, block=True)
+        except Exception as e:
+            print(f"Hotspot model update failed for '{table}': {e}")
+        finally:
+            with _updating_lock:
+                _updating.discard(table)
+
+    threading.Thread(target=_job, name=f"update-model-{table}", daemon=True).start()
@@ -0,0 +1,164 @@
+# app/services/pipeline.py
+
+"""
+Stage runner for the preprocessing pipeline.
+
+A pipeline is an ordered list of `Stage`s. Each stage declares the columns it
+reads (`inputs`), the columns it writes (`outputs`) and the columns it removes
+(`drops`). A trailing "*" in a column name matches by prefix (e.g. "GENDER_*").
+
+When a cache directory is given, each stage's outputs are written to a parquet
+file keyed by a hash of the stage's input columns and its parameters. Changing
+one stage's parameters therefore only reruns that stage and the stages that
+read its outputs; everything upstream (and any stage whose inputs did not
+change) is served from disk.
+
+Cache hits refresh a file's mtime, and every write evicts the least recently
+used files once the cache directory grows past RTAVERSE_PIPELINE_CACHE_MB.
+
+Environment:
+    RTAVERSE_PIPELINE_CACHE_MB   size bound of the stage cache directory (default 512)
+"""
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field, replace
+from typing import Callable, Optional
+
+import pandas as pd
+
+# Sentinel for stages that read or rewrite the whole frame (e.g. de-duplication).
+ALL_COLUMNS = "*"
+
+# Bump when the cache layout or key derivation changes.
+CACHE_FORMAT_VERSION = 1
+CACHE_MAX_BYTES = int(float(os.getenv("RTAVERSE_PIPELINE_CACHE_MB", "512")) * 1024 * 1024)
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    func: Callable[..., pd.DataFrame]
+    inputs: tuple = ALL_COLUMNS
+    outputs: tuple = ALL_COLUMNS
+    drops: tuple = ()
+    params: dict = field(default_factory=dict)
+
+    def with_params(self, **overrides) -> "Stage":
+        return replace(self, params={**self.params, **overrides})
+
+
+def _match(columns, patterns) -> list:
+    """Columns (in frame order) matched by exact names or "PREFIX*" patterns."""
+    if patterns == ALL_COLUMNS:
+        return list(columns)
+    exact = {p for p in patterns if not p.endswith("*")}
+    prefixes = tuple(p[:-1] for p in patterns if p.endswith("*"))
+    return [c for c in columns if c in exact or (prefixes and str(c).startswith(prefixes))]
+
+
+def _fingerprint(df: pd.DataFrame) -> str:
+    h = hashlib.sha256()
+    # Column names and values only: dtypes can differ between a freshly
+    # computed frame and its parquet round-trip without the data changing.
+    h.update(json.dumps([str(c) for c in df.columns]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def stage_key(stage: Stage, df: pd.DataFrame) -> str:
+    """Content address of a stage run: its name, parameters and input data."""
+    payload = json.dumps(
+        {"v": CACHE_FORMAT_VERSION, "stage": stage.name, "params": stage.params},
+        sort_keys=True, default=str,
+    )
+    inputs = df[_match(df.columns, stage.inputs)]
+    return hashlib.sha256((payload + _fingerprint(inputs)).encode()).hexdigest()
+
+
+def _cache_path(cache_dir: str, stage: Stage, key: str) -> str:
+    return os.path.join(cache_dir, stage.name, f"{key}.parquet")
+
+
+def _load(path: str) -> Optional[pd.DataFrame]:
+    if not os.path.exists(path):
+        return None
+    try:
+        delta = pd.read_parquet(path)
+        os.utime(path)  # most recently used
+        return delta
+    except Exception as e:
+        print(f"Pipeline cache read failed for {path}: {e}")
+        return None
+
+
+def _evict(cache_dir: str) -> None:
+    """Drop least recently used stage outputs until `cache_dir` fits CACHE_MAX_BYTES."""
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name.endswith(".parquet"):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def _store(path: str, delta: pd.DataFrame) -> None:
+    # Write to a temp file and rename so concurrent workers never see a partial file.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        delta.to_parquet(tmp)
+        os.replace(tmp, path)
+    except Exception as e:
+        # Mixed-type object columns can't always be stored as parquet; the
+        # stage result is still used, it just won't be cached.
+        print(f"Pipeline cache write skipped for stage output {path}: {e}")
+        try: os.remove(tmp)
+        except OSError: pass
+
+
+def _apply(df: pd.DataFrame, delta: pd.DataFrame, stage: Stage) -> pd.DataFrame:
+    """Merge a stage's outputs back into the running frame."""
+    if stage.outputs == ALL_COLUMNS:
+        return delta
+    if not delta.index.equals(df.index):
+        df = df.loc[delta.index]
+    df = df.drop(columns=_match(df.columns, stage.drops), errors="ignore").copy()
+    for col in delta.columns:
+        df[col] = delta[col]
+    return df
+
+
+def run_stages(df: pd.DataFrame, stages: list, cache_dir: Optional[str] = None) -> pd.DataFrame:
+    """Run `stages` in order over `df`, reusing cached stage outputs when possible."""
+    if not df.index.is_unique:
+        df = df.reset_index(drop=True)
+
+    for stage in stages:
+        key = stage_key(stage, df) if cache_dir else None
+        delta = _load(_cache_path(cache_dir, stage, key)) if key else None
+
+        if delta is None:
+            result = stage.func(df.copy(), **stage.params)
+            delta = result if stage.outputs == ALL_COLUMNS else result[_match(result.columns, stage.outputs)]
+            if key:
+                _store(_cache_path(cache_dir, stage, key), delta)
+                _evict(cache_dir)
+
+        df = _apply(df, delta, stage)
+
+    return df
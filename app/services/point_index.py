@@ -0,0 +1,176 @@
+# app/services/point_index.py
+
+"""
+Multi-resolution grid index over a table's accident coordinates, for drawing
+individual accidents on the map without sending every row.
+
+For each zoom level 0..POINT_INDEX_MAX_ZOOM the points are binned into square
+cells of 360 / 2**zoom / CELLS_PER_TILE degrees, i.e. CELLS_PER_TILE cells
+across one 256px map tile. A level keeps, per non-empty cell, its accident
+count, coordinate sums and lowest row id, and per point the cell it fell in,
+so a filtered subset is re-aggregated with one bincount instead of a query per
+cell. Cells are sorted by (column, row) so a bounding box is a binary search.
+
+`points_in_view` answers with the clusters of the requested zoom, or of the
+finest coarser zoom whose clusters fit in the response limit, so a response
+never grows with the table. A cluster of one is the accident itself.
+
+The index is built with NumPy from one `SELECT id, LATITUDE, LONGITUDE` the
+first time a version is asked for, and shared by the requests of a process.
+
+Environment:
+    RTAVERSE_POINTS_MAX   most clusters in one /api/points response (default 2000)
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from ..extensions import get_engine
+from .database import get_table_version
+
+POINT_INDEX_MAX_ZOOM = 18
+CELLS_PER_TILE = 8
+POINTS_MAX = max(64, int(os.getenv("RTAVERSE_POINTS_MAX", "2000")))
+_ROW_BITS = 32  # cell key = column << _ROW_BITS | row
+
+_indexes = {}  # table -> (version, index)
+_indexes_lock = threading.Lock()
+_build_lock = threading.Lock()
+
+
+def cell_size(zoom: int) -> float:
+    """Side of a zoom level's cells, in degrees."""
+    return 360.0 / (2 ** zoom) / CELLS_PER_TILE
+
+
+def _cells(lat: np.ndarray, lon: np.ndarray, zoom: int) -> tuple:
+    size = cell_size(zoom)
+    col = np.floor((lon + 180.0) / size).astype(np.int64)
+    row = np.floor((lat + 90.0) / size).astype(np.int64)
+    return col, row
+
+
+def _level(ids: np.ndarray, lat: np.ndarray, lon: np.ndarray, zoom: int) -> dict:
+    col, row = _cells(lat, lon, zoom)
+    keys, first, point_cell, counts = np.unique(
+        (col << _ROW_BITS) | row, return_index=True, return_inverse=True, return_counts=True,
+    )
+    return {
+        "keys": keys,
+        "point_cell": point_cell.astype(np.int32),
+        "count": counts,
+        "lat_sum": np.bincount(point_cell, weights=lat, minlength=len(keys)),
+        "lon_sum": np.bincount(point_cell, weights=lon, minlength=len(keys)),
+        "first_id": ids[first],  # ids are ascending, so the first point is the lowest id
+    }
+
+
+def build_point_index(table: str, version: int) -> dict:
+    """Read `table`'s coordinates and bin them at every zoom level."""
+    df = pd.read_sql_query(
+        f"SELECT `id`, `LATITUDE`, `LONGITUDE` FROM `{table}`"
+        " WHERE `LATITUDE` IS NOT NULL AND `LONGITUDE` IS NOT NULL ORDER BY `id`",
+        get_engine(),
+    )
+    lat = pd.to_numeric(df["LATITUDE"], errors="coerce").to_numpy(dtype=float)
+    lon = pd.to_numeric(df["LONGITUDE"], errors="coerce").to_numpy(dtype=float)
+    ok = np.isfinite(lat) & np.isfinite(lon) & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+    ids, lat, lon = df["id"].to_numpy(dtype=np.int64)[ok], lat[ok], lon[ok]
+    return {
+        "version": version,
+        "ids": ids,
+        "lat": lat,
+        "lon": lon,
+        "levels": [_level(ids, lat, lon, z) for z in range(POINT_INDEX_MAX_ZOOM + 1)],
+    }
+
+
+def load_point_index(table: str) -> dict:
+    """The index of `table` at its current version, built on first use."""
+    version = get_table_version(table)
+    with _indexes_lock:
+        cached = _indexes.get(table)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with _build_lock:
+        with _indexes_lock:
+            cached = _indexes.get(table)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        index = build_point_index(table, version)
+        print(f"Point index: '{table}' v{version} built, {len(index['ids'])} points.")
+        with _indexes_lock:
+            _indexes[table] = (version, index)
+    return index
+
+
+def filtered_positions(index: dict, table: str, where_sql: str, params: dict) -> np.ndarray:
+    """Positions in `index` of the rows matching a build_filter_query clause."""
+    matched = pd.read_sql_query(f"SELECT `id` FROM `{table}` {where_sql}", get_engine(), params=params)
+    ids = np.unique(matched["id"].to_numpy(dtype=np.int64))
+    pos = np.searchsorted(index["ids"], ids)
+    inside = pos < len(index["ids"])
+    pos, ids = pos[inside], ids[inside]
+    return pos[index["ids"][pos] == ids]  # rows without coordinates are not in the index
+
+
+def _in_box(keys: np.ndarray, bbox: tuple, zoom: int) -> np.ndarray:
+    """Indices of the cells in `keys` that overlap bbox = (south, west, north, east)."""
+    south, west, north, east = bbox
+    (col0, col1), (row0, row1) = _cells(np.array([south, north]), np.array([west, east]), zoom)
+    lo = np.searchsorted(keys, col0 << _ROW_BITS)
+    hi = np.searchsorted(keys, (col1 + 1) << _ROW_BITS)
+    rows = keys[lo:hi] & ((1 << _ROW_BITS) - 1)
+    return lo + np.nonzero((rows >= row0) & (rows <= row1))[0]
+
+
+def _aggregate(index: dict, zoom: int, positions: np.ndarray | None) -> dict:
+    """A level's per-cell totals, over all points or only those at `positions`."""
+    level = index["levels"][zoom]
+    if positions is None:
+        return level
+    n = len(level["keys"])
+    cells = level["point_cell"][positions]
+    first_id = np.full(n, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first_id, cells, index["ids"][positions])
+    return {
+        "keys": level["keys"],
+        "count": np.bincount(cells, minlength=n),
+        "lat_sum": np.bincount(cells, weights=index["lat"][positions], minlength=n),
+        "lon_sum": np.bincount(cells, weights=index["lon"][positions], minlength=n),
+        "first_id": first_id,
+    }
+
+
+def points_in_view(index: dict, bbox: tuple, zoom: int, positions: np.ndarray | None = None,
+                   limit: int = POINTS_MAX) -> dict:
+    """
+    Clusters of the points (all, or those at `positions`) in bbox = (south,
+    west, north, east) at `zoom`, coarsened until there are at most `limit`.
+    Column-wise: "lat"/"lon" are cluster centroids, "id" is the accident's
+    row id for clusters of one and None otherwise.
+    """
+    limit = max(64, min(int(limit), POINTS_MAX))  # a zoom-0 view has at most 32 cells
+    zoom = min(max(int(zoom), 0), POINT_INDEX_MAX_ZOOM)
+    while True:
+        agg = _aggregate(index, zoom, positions)
+        cells = _in_box(agg["keys"], bbox, zoom)
+        cells = cells[agg["count"][cells] > 0]
+        if len(cells) <= limit or zoom == 0:
+            break
+        zoom -= 1
+
+    count = agg["count"][cells]
+    single = count == 1
+    return {
+        "zoom": zoom,
+        "cell_deg": cell_size(zoom),
+        "total": int(count.sum()),
+        "lat": np.round(agg["lat_sum"][cells] / count, 6).tolist(),
+        "lon": np.round(agg["lon_sum"][cells] / count, 6).tolist(),
+        "count": count.tolist(),
+        "id": [int(i) if s else None for i, s in zip(agg["first_id"][cells], single)],
+    }
@@ -0,0 +1,185 @@
+# app/services/precompute.py
+
+"""
+Warm the dashboard's default forecasts after a table changes.
+
+When a table gets a new data version, a background thread computes every
+`/api/forecast/*` chart with the dashboard's defaults (no filters, horizon 12,
+both model types), builds the hotspot model and the "Live" map view (current
+month and hour) and the map's kernel-density risk rasters. The jobs call the
+same service functions as the routes with the same arguments, so they land in
+the forecast store and map cache under exactly the keys a user's first
+request will look up.
+
+Jobs run one at a time in priority order (map model and risk rasters, then
+every chart with the default model, then the other model type), so warming never holds more than
+one training slot. A newer version of the table supersedes a running warm-up.
+Progress is written to instance/precompute/<table>.json and served by
+/api/precompute_status.
+
+Environment:
+    RTAVERSE_PRECOMPUTE     set to 0 to disable warming
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from ..config import ARTIFACT_DIR
+from ..extensions import get_engine
+from .database import get_table_version
+from .forecasting import hotspots_json_page, live_map_args
+from .hierarchical_forecast import HIERARCHICAL_FORECASTS, hierarchical_chart, per_chart_forecast
+from .map_cache import cached_map
+from .model_registry import get_hotspot_model
+from .risk_surface import refresh_risk_surfaces
+from .training_executor import background_training
+
+PRECOMPUTE_DIR = os.path.join(ARTIFACT_DIR, "precompute")
+PRECOMPUTE_ENABLED = os.getenv("RTAVERSE_PRECOMPUTE", "1") != "0"
+DEFAULT_HORIZON = 12
+MODEL_TYPES = ("random_forest", "adaboost")  # #forecastModelSelect values, default first
+
+# Charts under /api/forecast/, in the order the dashboard draws them.
+FORECAST_CHARTS = ["overall_timeseries", "hourly", "day_of_week", "top_barangays",
+                   "alcohol_by_hour", "victims_by_age", "offense_types", "by_season"]
+
+_latest = {}  # table -> newest version scheduled in this process
+_latest_lock = threading.Lock()
+
+
+def precompute_jobs() -> list:
+    """[{"priority", "name", "chart", "model"}] in the order they are run."""
+    jobs = [{"priority": 0, "name": "map_model", "chart": False, "model": "xgboost_hotspot"},
+            {"priority": 0, "name": "risk_surfaces", "chart": False, "model": "kde"}]
+    for rank, model in enumerate(MODEL_TYPES, 1):
+        jobs += [{"priority": rank, "name": name, "chart": True, "model": model} for name in FORECAST_CHARTS]
+    return sorted(jobs, key=lambda j: j["priority"])
+
+
+def _status_path(table: str) -> str:
+    return os.path.join(PRECOMPUTE_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", table) + ".json")
+
+
+def _write_status(table: str, status: dict) -> None:
+    path = _status_path(table)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(PRECOMPUTE_DIR, exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(status, f, default=str)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Could not write precompute status for '{table}': {e}")
+
+
+def precompute_status(table: str) -> dict | None:
+    """Progress of the latest warm-up of `table` (any worker), or None if it never ran."""
+    try:
+        with open(_status_path(table), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _run_chart(table: str, job: dict) -> tuple[bool, str | None]:
+    """
+    The chart's forecast for `table` with the dashboard defaults (no filters:
+    an empty where clause and params, as build_filter_query returns them);
+    (succeeded, message).
+    """
+    if HIERARCHICAL_FORECASTS:
+        result = hierarchical_chart(job["name"], table, job["model"], DEFAULT_HORIZON, "", {})
+    else:
+        with get_engine().connect() as conn:
+            cols = {str(r[0]) for r in conn.execute(text(f"SHOW COLUMNS FROM `{table}`")).fetchall()}
+        result = per_chart_forecast(job["name"], table, cols, job["model"], DEFAULT_HORIZON, "", {})
+    if result.get("success"):
+        return True, None
+    return False, result.get("message") or "No forecast."
+
+
+def _run_map_model(table: str) -> tuple[bool, str | None]:
+    """Train the hotspot model, then render the unfiltered "Live" /api/hotspots.json view into the map cache."""
+    get_hotspot_model(table, block=True)
+    args = dict(where_sql="", params={}, **live_map_args())
+    cached_map(table, dict(args, format="geojson"), lambda: hotspots_json_page(table, args))
+    return True, None
+
+
+def _run_risk_surfaces(table: str) -> tuple[bool, str | None]:
+    refresh_risk_surfaces(table)
+    return True, None
+
+
+# Jobs that are not forecast charts, by name.
+_LOCAL_JOBS = {"map_model": _run_map_model, "risk_surfaces": _run_risk_surfaces}
+
+
+def _superseded(table: str, version: int) -> bool:
+    with _latest_lock:
+        if _latest.get(table, version) != version:
+            return True
+    return get_table_version(table) != version
+
+
+def run_precompute(table: str, version: int) -> dict:
+    """Warm every default forecast of `table` for `version`. Returns the final status."""
+    jobs = precompute_jobs()
+    status = {
+        "table": table, "version": int(version), "state": "running",
+        "started_at": datetime.now().isoformat(timespec="seconds"), "finished_at": None,
+        "total": len(jobs), "done": 0, "failed": 0, "current": None,
+        "jobs": [{k: j[k] for k in ("priority", "name", "model")} | {"state": "pending", "seconds": None} for j in jobs],
+    }
+    _write_status(table, status)
+    print(f"Precomputing {len(jobs)} forecasts for '{table}' v{version}...")
+
+    with background_training():
+        for job, entry in zip(jobs, status["jobs"]):
+            if _superseded(table, version):
+                status["state"] = "superseded"
+                break
+            status["current"] = f"{job['name']} ({job['model']})"
+            entry["state"] = "running"
+            _write_status(table, status)
+
+            started = time.perf_counter()
+            try:
+                ok, message = _run_chart(table, job) if job["chart"] else _LOCAL_JOBS[job["name"]](table)
+            except Exception as e:
+                ok, message = False, str(e)
+            entry["seconds"] = round(time.perf_counter() - started, 3)
+            entry["state"] = "done" if ok else "failed"
+            if message:
+                entry["message"] = message[:500]
+            status["done" if ok else "failed"] += 1
+        else:
+            status["state"] = "done"
+
+    status["current"] = None
+    status["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    _write_status(table, status)
+    print(f"Precompute for '{table}' v{version} {status['state']}: {status['done']} done, {status['failed']} failed.")
+    return status
+
+
+def schedule_precompute(table: str, version: int) -> None:
+    """Start warming `table` in the background."""
+    if not PRECOMPUTE_ENABLED:
+        return
+    with _latest_lock:
+        _latest[table] = version
+
+    def _job():
+        try:
+            run_precompute(table, version)
+        except Exception as e:
+            print(f"Precompute failed for '{table}' v{version}: {e}")
+
+    threading.Thread(target=_job, name=f"precompute-{table}", daemon=True).start()
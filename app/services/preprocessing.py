@@ -10,6 +10,9 @@ from sklearn.cluster import DBSCAN
 import io, re
 from datetime import time, timedelta
 from .database import ensure_indexes
+from .pipeline import Stage, run_stages
+from ..config import ARTIFACT_DIR
+import os
 
 # === lifted from your app.py and kept functionally identical ===
 
@@ -73,20 +76,32 @@ def make_display_copy(df: pd.DataFrame) -> pd.DataFrame:
         out["Season"] = s.fillna("Unknown") # <--- ADDED SEASON CLUSTER RECONSTRUCTION
     return out
 
-def apply_additional_preprocessing(merged: pd.DataFrame) -> pd.DataFrame:
-    """
-    Clean + engineer features consistently with your Colab notebook:
-      - DATE_COMMITTED sin/cos (month & day-of-week)
-      - HOUR_COMMITTED from TIME_COMMITTED (robust for multiple types)
-      - OFFENSE collapsed to 4 buckets with de-dup by spatiotemporal keys
-      - DBSCAN hotspots with eps = 0.04 km (haversine)
-      - TIME_CLUSTER bins (Midnight/Morning/Midday/Evening)
-      - One-hot encode GENDER, ALCOHOL_USED, TIME_CLUSTER (NO drop_first)
-      - Reconstruct readable cluster labels from dummies
-    """
+# === Preprocessing stages =====================================================
+# Each stage mirrors one step of the Colab notebook and declares the columns it
+# reads and writes, so the runner in pipeline.py can cache its outputs and only
+# rerun the stages affected by a data or parameter change.
+
+PIPELINE_CACHE_DIR = os.path.join(ARTIFACT_DIR, "pipeline")
 
-    df = merged.copy()
+TIME_CLUSTER_BINS = [
+    # (first hour, last hour, label); hours outside every bin are "Midnight"
+    (6, 11, "Morning"),
+    (12, 17, "Midday"),
+    (18, 23, "Evening"),
+]
 
+ONE_HOT_EXPECTED = {
+    "GENDER": ["GENDER_Female", "GENDER_Male", "GENDER_Unknown"],
+    "ALCOHOL_USED": ["ALCOHOL_USED_No", "ALCOHOL_USED_Yes", "ALCOHOL_USED_Unknown"],
+    "TIME_CLUSTER": ["TIME_CLUSTER_Midnight", "TIME_CLUSTER_Morning",
+                     "TIME_CLUSTER_Midday", "TIME_CLUSTER_Evening"],
+    # --- NEW ---
+    "SEASON_CLUSTER": ["SEASON_CLUSTER_Dry", "SEASON_CLUSTER_Rainy", "SEASON_CLUSTER_Unknown"],
+    # --- END NEW ---
+}
+
+
+def _stage_dates(df: pd.DataFrame) -> pd.DataFrame:
     # --- Dates → month/day-of-week sin/cos -----------------------------------
     # Accept either DATE_COMMITTED or legacy "DATE COMMITTED"
     if "DATE_COMMITTED" not in df.columns and "DATE COMMITTED" in df.columns:
@@ -106,7 +121,10 @@ def apply_additional_preprocessing(merged: pd.DataFrame) -> pd.DataFrame:
         ]
         choices = ["Rainy", "Dry"]
         df["SEASON_CLUSTER"] = np.select(conditions, choices, default="Unknown").astype("object")
+    return df
 
+
+def _stage_hours(df: pd.DataFrame) -> pd.DataFrame:
     # --- Time → hour committed (robust) --------------------------------------
     # Accept TIME_COMMITTED or legacy "TIME COMMITTED"
     if "TIME_COMMITTED" not in df.columns and "TIME COMMITTED" in df.columns:
@@ -152,7 +170,10 @@ def apply_additional_preprocessing(merged: pd.DataFrame) -> pd.DataFrame:
 
     # --- Clean up legacy raw columns if still present -------------------------
     df.drop(columns=["DATE COMMITTED", "TIME COMMITTED"], inplace=True, errors="ignore")
+    return df
 
+
+def _stage_numeric(df: pd.DataFrame) -> pd.DataFrame:
     # --- Numeric hygiene ------------------------------------------------------
     if "AGE" in df.columns:
         df["AGE"] = pd.to_numeric(df["AGE"], errors="coerce")
@@ -161,7 +182,10 @@ def apply_additional_preprocessing(merged: pd.DataFrame) -> pd.DataFrame:
     if "VICTIM COUNT" in df.columns:
         df["VICTIM COUNT"] = pd.to_numeric(df["VICTIM COUNT"], errors="coerce")
         df["VICTIM COUNT"] = df["VICTIM COUNT"].fillna(df["VICTIM COUNT"].median()).astype(int)
+    return df
+
 
+def _stage_dedup(df: pd.DataFrame) -> pd.DataFrame:
     # --- Collapse OFFENSE and deduplicate by spatiotemporal keys -------------
     target_col = "OFFENSE"
     if target_col in df.columns:
@@ -200,7 +224,10 @@ def apply_additional_preprocessing(merged: pd.DataFrame) -> pd.DataFrame:
 
         df[target_col] = df.apply(_assign_offense, axis=1)
         df.drop(columns=["IS_PERSON", "IS_PROPERTY"], inplace=True)
+    return df
+
 
+def _stage_hotspots(df: pd.DataFrame, eps_km: float = 0.04, min_samples: int = 5) -> pd.DataFrame:
     # --- Ensure coords, then DBSCAN hotspots (ε = 0.04 km) -------------------
     for req in ("LATITUDE", "LONGITUDE"):
         if req not in df.columns:
@@ -209,49 +236,45 @@ def apply_additional_preprocessing(merged: pd.DataFrame) -> pd.DataFrame:
     df = df.dropna(subset=["LATITUDE", "LONGITUDE"]).copy()
     if not df.empty:
         kms_per_radian = 6371.0088
-        epsilon = 0.04 / kms_per_radian  # match Colab exactly
-        dbscan = DBSCAN(eps=epsilon, min_samples=5, algorithm="ball_tree", metric="haversine")
+        epsilon = eps_km / kms_per_radian  # match Colab exactly
+        dbscan = DBSCAN(eps=epsilon, min_samples=min_samples, algorithm="ball_tree", metric="haversine")
         coords_rad = np.radians(df[["LATITUDE", "LONGITUDE"]])
         df["ACCIDENT_HOTSPOT"] = dbscan.fit_predict(coords_rad)
+    return df
+
 
+def _stage_bins(df: pd.DataFrame, bins: list = TIME_CLUSTER_BINS, default: str = "Midnight") -> pd.DataFrame:
     # --- TIME_CLUSTER bins ----------------------------------------------------
     def _time_cluster(h):
         try:
             h = int(h)
         except Exception:
-            return "Midnight"
-        if 6 <= h <= 11:
-            return "Morning"
-        if 12 <= h <= 17:
-            return "Midday"
-        if 18 <= h <= 23:
-            return "Evening"
-        return "Midnight"
+            return default
+        for lo, hi, label in bins:
+            if lo <= h <= hi:
+                return label
+        return default
 
     if "HOUR_COMMITTED" in df.columns:
         df["TIME_CLUSTER"] = df["HOUR_COMMITTED"].apply(_time_cluster).astype("object")
+    return df
 
 
+def _stage_one_hot(df: pd.DataFrame, expected: dict = ONE_HOT_EXPECTED) -> pd.DataFrame:
     # --- One-hot encode (NO drop_first to match Colab/your visuals) ----------
-    for cat_col in ["GENDER", "ALCOHOL_USED", "TIME_CLUSTER", "SEASON_CLUSTER"]: # <-- ADDED
+    for cat_col, expected_cols in expected.items():
         if cat_col in df.columns:
             dummies = pd.get_dummies(df[cat_col], prefix=cat_col, dtype="int64")  # keep all categories
             # ensure stable set of expected columns
-            expected = {
-                "GENDER": ["GENDER_Female", "GENDER_Male", "GENDER_Unknown"],
-                "ALCOHOL_USED": ["ALCOHOL_USED_No", "ALCOHOL_USED_Yes", "ALCOHOL_USED_Unknown"],
-                "TIME_CLUSTER": ["TIME_CLUSTER_Midnight", "TIME_CLUSTER_Morning",
-                                 "TIME_CLUSTER_Midday", "TIME_CLUSTER_Evening"],
-                # --- NEW ---
-                "SEASON_CLUSTER": ["SEASON_CLUSTER_Dry", "SEASON_CLUSTER_Rainy", "SEASON_CLUSTER_Unknown"],
-                # --- END NEW ---
-            }[cat_col]
-            for col in expected:
+            for col in expected_cols:
                 if col not in dummies.columns:
                     dummies[col] = 0
             dummies = dummies[sorted(dummies.columns)]
             df = pd.concat([df.drop(columns=[cat_col]), dummies], axis=1)
+    return df
+
 
+def _stage_labels(df: pd.DataFrame) -> pd.DataFrame:
     # --- Reconstruct readable labels (for display/filters) --------------------
     if any(c.startswith("GENDER_") for c in df.columns):
         g = pd.Series(pd.NA, index=df.index, dtype="object")
@@ -279,9 +302,70 @@ def apply_additional_preprocessing(merged: pd.DataFrame) -> pd.DataFrame:
         
         # Anything not explicitly 'Rainy' or 'Dry' will default to 'Unknown'.
         df["SEASON_CLUSTER"] = s.fillna("Unknown") 
-
     return df
 
+
+PREPROCESSING_STAGES = [
+    Stage("dates", _stage_dates,
+          inputs=("DATE_COMMITTED", "DATE COMMITTED"),
+          outputs=("DATE_COMMITTED", "MONTH_SIN", "MONTH_COS", "DAYOWEEK_SIN", "DAYOWEEK_COS", "SEASON_CLUSTER"),
+          drops=("DATE COMMITTED",)),
+    Stage("hours", _stage_hours,
+          inputs=("TIME_COMMITTED", "TIME COMMITTED", "HOUR_COMMITTED"),
+          outputs=("TIME_COMMITTED", "HOUR_COMMITTED"),
+          drops=("DATE COMMITTED", "TIME COMMITTED")),
+    Stage("numeric", _stage_numeric,
+          inputs=("AGE", "VICTIM COUNT"),
+          outputs=("AGE", "VICTIM COUNT")),
+    # De-duplication collapses rows and aggregates every column, so it reads
+    # and rewrites the whole frame.
+    Stage("dedup", _stage_dedup),
+    Stage("hotspots", _stage_hotspots,
+          inputs=("LATITUDE", "LONGITUDE"),
+          outputs=("LATITUDE", "LONGITUDE", "ACCIDENT_HOTSPOT"),
+          params={"eps_km": 0.04, "min_samples": 5}),
+    Stage("bins", _stage_bins,
+          inputs=("HOUR_COMMITTED",),
+          outputs=("TIME_CLUSTER",),
+          params={"bins": TIME_CLUSTER_BINS, "default": "Midnight"}),
+    Stage("one_hot", _stage_one_hot,
+          inputs=tuple(ONE_HOT_EXPECTED),
+          outputs=tuple(f"{c}_*" for c in ONE_HOT_EXPECTED),
+          drops=tuple(ONE_HOT_EXPECTED),
+          params={"expected": ONE_HOT_EXPECTED}),
+    Stage("labels", _stage_labels,
+          inputs=("GENDER_*", "ALCOHOL_USED_*", "SEASON_CLUSTER_*"),
+          outputs=("GENDER_CLUSTER", "ALCOHOL_USED_CLUSTER", "SEASON_CLUSTER")),
+]
+
+
+def apply_additional_preprocessing(
+    merged: pd.DataFrame,
+    params: Optional[dict] = None,
+    cache_dir: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Clean + engineer features consistently with your Colab notebook:
+      - DATE_COMMITTED sin/cos (month & day-of-week)
+      - HOUR_COMMITTED from TIME_COMMITTED (robust for multiple types)
+      - OFFENSE collapsed to 4 buckets with de-dup by spatiotemporal keys
+      - DBSCAN hotspots with eps = 0.04 km (haversine)
+      - TIME_CLUSTER bins (Midnight/Morning/Midday/Evening)
+      - One-hot encode GENDER, ALCOHOL_USED, TIME_CLUSTER (NO drop_first)
+      - Reconstruct readable cluster labels from dummies
+
+    `params` overrides stage parameters by stage name, e.g.
+    {"hotspots": {"eps_km": 0.05}}. With `cache_dir`, stage outputs are cached
+    on disk so only the stages affected by a change are recomputed.
+    """
+    params = params or {}
+    unknown = set(params) - {s.name for s in PREPROCESSING_STAGES}
+    if unknown:
+        raise ValueError(f"Unknown preprocessing stage(s): {sorted(unknown)}")
+
+    stages = [s.with_params(**params[s.name]) if s.name in params else s for s in PREPROCESSING_STAGES]
+    return run_stages(merged.copy(), stages, cache_dir=cache_dir)
+
 def process_merge_and_save_to_db(
     file1_storage,
     file2_storage,
@@ -548,7 +632,7 @@ def process_merge_and_save_to_db(
     # ---------------------------
     # Extra preprocessing (unchanged)
     # ---------------------------
-    merged = apply_additional_preprocessing(merged)  # one-hot happens here; now safe from <NA> dummies 
+    merged = apply_additional_preprocessing(merged, cache_dir=PIPELINE_CACHE_DIR)  # one-hot happens here; now safe from <NA> dummies 
 
     # Final sort by datetime if available
     if "DATE_COMMITTED" in merged.columns:
@@ -0,0 +1,93 @@
+# app/services/recursive_forecast.py
+
+"""
+Recursive multi-step forecasting on a NumPy feature matrix.
+
+Every forecaster in the app predicts one month ahead and feeds the prediction
+back in as next month's lag features. `recursive_forecast` does that for all
+series at once: the features live in one float matrix (series × features), the
+lag columns are shifted in place after each step, and the model's `predict`
+is called exactly once per step on that contiguous array.
+
+Models are fitted on plain arrays (`X.to_numpy(dtype=float)`) so that
+predicting on the matrix does not trigger scikit-learn feature-name checks.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class RecursiveSpec:
+    """
+    How a feature row advances one step.
+
+    lags:        column indices of lag_1, lag_2, ... (most recent first).
+    rolling:     column index of a rolling mean over the first `rolling_window` lags.
+    long_lags:   {column index: lag} for lags read from the history buffer
+                 (e.g. a 12-month lag); left unchanged while the lag still
+                 points before the start of the history.
+    calendar:    {column index: values per step}; after step t the column is
+                 set to values[t].
+    feedback:    optional transform applied to predictions before they are
+                 fed back as lags (e.g. np.round).
+    """
+    lags: tuple = ()
+    rolling: Optional[int] = None
+    rolling_window: int = 3
+    long_lags: dict = field(default_factory=dict)
+    calendar: dict = field(default_factory=dict)
+    feedback: Optional[Callable[[np.ndarray], np.ndarray]] = None
+
+
+def recursive_forecast(model, X0, horizon: int, spec: RecursiveSpec, history=None) -> np.ndarray:
+    """
+    Forecast `horizon` steps for every row of `X0` (series × features).
+
+    `history` (series × months, oldest first) is only needed for `long_lags`.
+    Returns the raw predictions as a (series × horizon) array.
+    """
+    X = np.array(X0, dtype=np.float64, order="C")  # private copy, updated in place
+    n = X.shape[0]
+    preds = np.empty((n, horizon), dtype=np.float64)
+    if horizon <= 0 or n == 0:
+        return preds
+
+    lags = np.asarray(spec.lags, dtype=int)
+    window = lags[: spec.rolling_window]
+    calendar = {c: np.asarray(v, dtype=np.float64) for c, v in spec.calendar.items()}
+
+    if spec.long_lags:
+        history = np.zeros((n, 0)) if history is None else np.asarray(history, dtype=np.float64).reshape(n, -1)
+        n_hist = history.shape[1]
+        buffer = np.empty((n, n_hist + horizon), dtype=np.float64)
+        buffer[:, :n_hist] = history
+
+    for t in range(horizon):
+        step = model.predict(X)
+        preds[:, t] = step
+        fed = spec.feedback(step) if spec.feedback is not None else step
+
+        if len(lags):
+            if len(lags) > 1:
+                X[:, lags[1:]] = X[:, lags[:-1]]
+            X[:, lags[0]] = fed
+        if spec.rolling is not None:
+            X[:, spec.rolling] = X[:, window].mean(axis=1)
+        if spec.long_lags:
+            buffer[:, n_hist + t] = fed
+            for col, lag in spec.long_lags.items():
+                pos = n_hist + t + 1 - lag
+                if pos >= 0:
+                    X[:, col] = buffer[:, pos]
+        for col, values in calendar.items():
+            X[:, col] = values[t]
+
+    return preds
+
+
+def feature_index(feature_cols: list) -> dict:
+    """Column name -> position in the feature matrix."""
+    return {c: i for i, c in enumerate(feature_cols)}
@@ -0,0 +1,287 @@
+# app/services/risk_surface.py
+
+"""
+Kernel-density accident risk surfaces over Angeles City, for the map's
+heatmap overlay.
+
+For every month and TIME_CLUSTER bucket the table's accidents are binned into
+a RISK_CELL_DEG grid over RISK_BBOX (one GROUP BY query) and smoothed with a
+Gaussian kernel of RTAVERSE_KDE_BANDWIDTH_M metres by FFT convolution, giving
+accidents per km². Smoothing is linear, so the surface for any month range and
+set of buckets is the sum of the stored rasters; nothing is smoothed per request.
+
+The rasters of a table version are built once (by the precompute stage after a
+write, or by the first reader), stored as a compressed .npz under
+instance/risk/<table>/ with each raster quantized to uint16 against its own
+maximum, and kept in memory per process. `risk_overlay` colours a summed
+surface into an RGBA PNG that the map lays over RISK_BBOX.
+
+Environment:
+    RTAVERSE_KDE_BANDWIDTH_M   Gaussian kernel bandwidth in metres (default 250)
+"""
+
+import functools
+import math
+import os
+import re
+import shutil
+import struct
+import threading
+import zlib
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from ..config import ARTIFACT_DIR
+from ..extensions import get_engine
+from .database import get_table_version
+from .forecast_store import KeyLock
+from .preprocessing import TIME_CLUSTER_BINS
+
+RISK_DIR = os.path.join(ARTIFACT_DIR, "risk")
+RISK_BBOX = (15.08, 120.49, 15.22, 120.66)  # south, west, north, east
+RISK_CELL_DEG = 0.0009  # about 100 m
+KDE_BANDWIDTH_M = float(os.getenv("RTAVERSE_KDE_BANDWIDTH_M", "250"))
+RISK_FORMAT_VERSION = 1
+METRES_PER_DEG = 111_320
+
+# preprocessing's TIME_CLUSTER labels, the default (hours outside every bin, or unknown) first
+TIME_CLUSTERS = ["Midnight"] + [label for _, _, label in TIME_CLUSTER_BINS]
+
+# Colour ramp from low to high density (RGB).
+_RAMP = np.array([(255, 255, 178), (254, 204, 92), (253, 141, 60), (240, 59, 32), (189, 0, 38)], dtype=float)
+
+_loaded = {}  # table -> (version, surfaces)
+_loaded_lock = threading.Lock()
+
+
+def grid_shape() -> tuple:
+    south, west, north, east = RISK_BBOX
+    return math.ceil((north - south) / RISK_CELL_DEG), math.ceil((east - west) / RISK_CELL_DEG)
+
+
+def _hour_clusters() -> np.ndarray:
+    """TIME_CLUSTERS index of each hour 0-23, and of 24 (unknown hour)."""
+    index = np.zeros(25, dtype=np.int64)
+    for lo, hi, label in TIME_CLUSTER_BINS:
+        index[lo:hi + 1] = TIME_CLUSTERS.index(label)
+    return index
+
+
+def gaussian_kernel(bandwidth_m: float = KDE_BANDWIDTH_M) -> np.ndarray:
+    """Gaussian weights over grid cells (rows by latitude, columns by longitude), summing to 1, cut off at 3 sigma."""
+    lat0 = math.radians((RISK_BBOX[0] + RISK_BBOX[2]) / 2)
+    sigma_r = bandwidth_m / (RISK_CELL_DEG * METRES_PER_DEG)
+    sigma_c = bandwidth_m / (RISK_CELL_DEG * METRES_PER_DEG * math.cos(lat0))
+    kr, kc = math.ceil(3 * sigma_r), math.ceil(3 * sigma_c)
+    r = np.arange(-kr, kr + 1)[:, None] / sigma_r
+    c = np.arange(-kc, kc + 1)[None, :] / sigma_c
+    kernel = np.exp(-0.5 * (r ** 2 + c ** 2))
+    return kernel / kernel.sum()
+
+
+def fft_smooth(grids: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """`kernel` convolved over the last two axes of `grids` ('same' size, zero outside), via the FFT."""
+    rows, cols = grids.shape[-2:]
+    kr, kc = kernel.shape[0] // 2, kernel.shape[1] // 2
+    shape = (rows + 2 * kr, cols + 2 * kc)  # full linear convolution, so nothing wraps around
+    out = np.fft.irfft2(np.fft.rfft2(grids, shape) * np.fft.rfft2(kernel, shape), shape)
+    return np.clip(out[..., kr:kr + rows, kc:kc + cols], 0, None)
+
+
+def _binned_counts(conn, table: str) -> tuple:
+    """(month ends, months × TIME_CLUSTERS × rows × cols accident counts) of the accidents inside RISK_BBOX."""
+    cols = {str(r[0]) for r in conn.execute(text(f"SHOW COLUMNS FROM `{table}`")).fetchall()}
+    missing = {"DATE_COMMITTED", "LATITUDE", "LONGITUDE"} - cols
+    if missing:
+        raise ValueError(f"Table '{table}' has no {', '.join(sorted(missing))} column(s).")
+    hour = "CAST(`HOUR_COMMITTED` AS SIGNED)" if "HOUR_COMMITTED" in cols else "NULL"
+    south, west, north, east = RISK_BBOX
+    agg = pd.DataFrame(conn.execute(text(
+        "SELECT LAST_DAY(`DATE_COMMITTED`) AS month_end,"
+        f" CASE WHEN {hour} BETWEEN 0 AND 23 THEN {hour} ELSE 24 END AS hour,"
+        " FLOOR((`LATITUDE` - :south) / :cell) AS r, FLOOR((`LONGITUDE` - :west) / :cell) AS c, COUNT(*) AS n"
+        f" FROM `{table}`"
+        " WHERE `DATE_COMMITTED` IS NOT NULL"
+        " AND `LATITUDE` >= :south AND `LATITUDE` < :north AND `LONGITUDE` >= :west AND `LONGITUDE` < :east"
+        " GROUP BY month_end, hour, r, c"
+    ), {"south": south, "west": west, "north": north, "east": east, "cell": RISK_CELL_DEG}).fetchall(),
+        columns=["month_end", "hour", "r", "c", "n"])
+
+    rows, cols_ = grid_shape()
+    months = pd.DatetimeIndex(sorted(pd.to_datetime(agg["month_end"]).unique()))
+    counts = np.zeros((len(months), len(TIME_CLUSTERS), rows, cols_), dtype=float)
+    if len(agg):
+        m = months.get_indexer(pd.to_datetime(agg["month_end"]))
+        k = _hour_clusters()[agg["hour"].astype(int).to_numpy()]
+        r = np.clip(agg["r"].astype(int).to_numpy(), 0, rows - 1)
+        c = np.clip(agg["c"].astype(int).to_numpy(), 0, cols_ - 1)
+        np.add.at(counts, (m, k, r, c), agg["n"].astype(float).to_numpy())
+    return months, counts
+
+
+def build_risk_surfaces(table: str, version: int) -> dict:
+    """Bin and smooth `table`'s accidents, one raster per month and TIME_CLUSTER bucket."""
+    engine = get_engine()
+    with engine.connect() as conn:
+        months, counts = _binned_counts(conn, table)
+    kernel = gaussian_kernel()
+    cell_km2 = (RISK_CELL_DEG * METRES_PER_DEG / 1000) ** 2 * math.cos(math.radians((RISK_BBOX[0] + RISK_BBOX[2]) / 2))
+    density = np.empty(counts.shape, dtype=np.uint16)
+    scale = np.zeros(counts.shape[:2], dtype=np.float32)
+    for i in range(len(months)):  # one month at a time keeps the FFT buffers small
+        smooth = fft_smooth(counts[i], kernel) / cell_km2
+        peak = smooth.max(axis=(-2, -1))
+        scale[i] = np.where(peak > 0, peak / 65535, 0)
+        density[i] = np.round(smooth / np.where(scale[i] > 0, scale[i], 1)[:, None, None]).astype(np.uint16)
+    return {
+        "version": int(version),
+        "months": months,
+        "density": density,
+        "scale": scale,
+        "accidents": counts.sum(axis=(-2, -1)).astype(np.int64),
+    }
+
+
+def _table_dir(table: str) -> str:
+    return os.path.join(RISK_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", table))
+
+
+def _path(table: str, version: int) -> str:
+    return os.path.join(_table_dir(table), f"v{int(version)}.npz")
+
+
+def _save(table: str, surfaces: dict) -> None:
+    path = _path(table, surfaces["version"])
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    try:
+        np.savez_compressed(
+            tmp, format=RISK_FORMAT_VERSION, bbox=np.array(RISK_BBOX), cell=RISK_CELL_DEG, bandwidth=KDE_BANDWIDTH_M,
+            months=surfaces["months"].to_numpy(dtype="datetime64[ns]"), density=surfaces["density"],
+            scale=surfaces["scale"], accidents=surfaces["accidents"],
+        )
+        os.replace(tmp, path)
+        for name in os.listdir(_table_dir(table)):  # older versions are never read again
+            m = re.fullmatch(r"v(\d+)\.npz", name)
+            if m and int(m.group(1)) < surfaces["version"]:
+                os.remove(os.path.join(_table_dir(table), name))
+    except OSError as e:
+        print(f"Risk surfaces not saved for '{table}': {e}")
+        try: os.remove(tmp)
+        except OSError: pass
+
+
+def _read(table: str, version: int) -> dict | None:
+    try:
+        with np.load(_path(table, version)) as f:
+            if (int(f["format"]) != RISK_FORMAT_VERSION or float(f["cell"]) != RISK_CELL_DEG
+                    or float(f["bandwidth"]) != KDE_BANDWIDTH_M or tuple(f["bbox"]) != RISK_BBOX):
+                return None
+            return {"version": int(version), "months": pd.DatetimeIndex(f["months"]), "density": f["density"],
+                    "scale": f["scale"], "accidents": f["accidents"]}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def load_risk_surfaces(table: str) -> dict:
+    """The rasters of `table` at its current version: from memory, the .npz, or built (once across workers)."""
+    version = get_table_version(table)
+    with _loaded_lock:
+        cached = _loaded.get(table)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    surfaces = _read(table, version)
+    if surfaces is None:
+        os.makedirs(_table_dir(table), exist_ok=True)
+        with KeyLock(os.path.join(_table_dir(table), "build.lock")):
+            surfaces = _read(table, version)  # another worker may have built it while we waited
+            if surfaces is None:
+                surfaces = build_risk_surfaces(table, version)
+                _save(table, surfaces)
+                print(f"Risk surfaces: '{table}' v{version} built, {len(surfaces['months'])} months.")
+    with _loaded_lock:
+        _loaded[table] = (version, surfaces)
+    return surfaces
+
+
+def clusters_for_hours(hours: list | None) -> list | None:
+    """The TIME_CLUSTERS any of `hours` falls in (None for all hours)."""
+    if hours is None:
+        return None
+    index = _hour_clusters()
+    return [c for i, c in enumerate(TIME_CLUSTERS) if any(index[h] == i for h in hours if 0 <= h < 24)]
+
+
+def risk_surface(surfaces: dict, start: str = "", end: str = "", clusters=None) -> tuple:
+    """
+    (accidents per km² summed over the months start..end ("YYYY-MM", either
+    open) and the TIME_CLUSTERS in `clusters` (None: all), rows south-north;
+    "range" or "seasonal"). A range with no recorded months (a forecast
+    period) is answered with the same calendar months of every recorded year.
+    """
+    months = surfaces["months"]
+    keep = np.ones(len(months), dtype=bool)
+    if start:
+        keep &= months >= pd.Timestamp(f"{start}-01")
+    if end:
+        keep &= months <= pd.Timestamp(f"{end}-01") + pd.offsets.MonthEnd(0)
+    basis = "range"
+    if not keep.any() and (start or end):
+        wanted = pd.date_range(pd.Timestamp(f"{start or end}-01"), pd.Timestamp(f"{end or start}-01"), freq="MS").month
+        keep = np.isin(months.month, wanted[:12])
+        basis = "seasonal"
+    k = [TIME_CLUSTERS.index(c) for c in (TIME_CLUSTERS if clusters is None else clusters)]
+    density = surfaces["density"][keep][:, k].astype(np.float32)
+    return np.einsum("mkrc,mk->rc", density, surfaces["scale"][keep][:, k]), basis
+
+
+def _png(rgba: np.ndarray) -> bytes:
+    """A minimal RGBA PNG of `rgba` (height × width × 4, uint8)."""
+    height, width = rgba.shape[:2]
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, -1)]).tobytes()  # filter 0 per row
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 6)) + chunk(b"IEND", b""))
+
+
+def render_png(surface: np.ndarray) -> bytes:
+    """`surface` coloured relative to its maximum, transparent where there is no risk; north is up."""
+    peak = float(surface.max()) if surface.size else 0.0
+    t = surface / peak if peak > 0 else np.zeros_like(surface)
+    pos = t * (len(_RAMP) - 1)
+    lo = np.minimum(pos.astype(int), len(_RAMP) - 2)
+    frac = (pos - lo)[..., None]
+    rgb = _RAMP[lo] * (1 - frac) + _RAMP[lo + 1] * frac
+    alpha = np.where(t < 0.02, 0, np.clip(t * 1.5, 0, 1) * 200)
+    rgba = np.dstack([rgb, alpha]).round().astype(np.uint8)
+    return _png(rgba[::-1])
+
+
+@functools.lru_cache(maxsize=64)
+def _overlay(table: str, version: int, start: str, end: str, clusters) -> tuple:
+    surface, basis = risk_surface(load_risk_surfaces(table), start, end, None if clusters is None else list(clusters))
+    return render_png(surface), float(surface.max()) if surface.size else 0.0, basis
+
+
+def risk_overlay(table: str, start: str = "", end: str = "", clusters=None) -> tuple:
+    """(PNG bytes, peak accidents per km², basis, version) of the overlay for a month range and TIME_CLUSTERS."""
+    version = get_table_version(table)
+    png, peak, basis = _overlay(table, version, start or "", end or "", None if clusters is None else tuple(clusters))
+    return png, peak, basis, version
+
+
+def refresh_risk_surfaces(table: str) -> None:
+    """Build `table`'s rasters for its current version unless they exist."""
+    load_risk_surfaces(table)
+
+
+def drop_risk_surfaces(table: str) -> None:
+    """Forget the rasters of a dropped table."""
+    shutil.rmtree(_table_dir(table), ignore_errors=True)
+    with _loaded_lock:
+        _loaded.pop(table, None)
@@ -0,0 +1,72 @@
+# app/services/table_events.py
+
+"""
+Hooks that run after a data table changes (upload, append, row edits, deletes).
+
+Everything derived from a table's rows is keyed on the table's data version,
+so the one thing every write path has to do is bump that version. Follow-up
+jobs for the new version (model evaluation, refreshing the hotspot summary
+and, when the per-chart forecasters serve the dashboard, the monthly feature
+store, warming the dashboard's default forecasts and the map's risk rasters,
+and after appends the hotspot model update) are started in the background.
+"""
+
+from typing import Optional
+from .database import bump_table_version
+from .feature_store import drop_feature_sets, schedule_feature_refresh
+from .hierarchical_forecast import HIERARCHICAL_FORECASTS
+from .hotspot_summary import drop_hotspot_summary, schedule_hotspot_summary
+from .model_evaluation import schedule_evaluation
+from .model_registry import schedule_model_update
+from .precompute import schedule_precompute
+from .risk_surface import drop_risk_surfaces
+
+
+def table_changed(table_name: str) -> Optional[int]:
+    """Record a change to `table_name` and return its new data version."""
+    try:
+        version = bump_table_version(table_name)
+    except Exception as e:
+        # Never fail the user's write because the bookkeeping failed.
+        print(f"Could not bump data version for '{table_name}': {e}")
+        return None
+    schedule_evaluation(table_name, version)
+    if not HIERARCHICAL_FORECASTS:
+        # Otherwise only ?hierarchy=0 requests read the store, and a read
+        # brings it up to the current version by itself.
+        schedule_feature_refresh(table_name)
+    schedule_hotspot_summary(table_name)
+    schedule_precompute(table_name, version)
+    return version
+
+
+def table_appended(table_name: str) -> Optional[int]:
+    """
+    Like table_changed, for writes that only add rows: the hotspot model for
+    the new version is updated from the previous one right away.
+    """
+    version = table_changed(table_name)
+    if version is not None:
+        schedule_model_update(table_name)
+    return version
+
+
+def table_dropped(table_name: str) -> Optional[int]:
+    """Invalidate everything derived from a table that no longer exists."""
+    try:
+        drop_feature_sets(table_name)
+    except Exception as e:
+        print(f"Could not drop feature sets for '{table_name}': {e}")
+    try:
+        drop_hotspot_summary(table_name)
+    except Exception as e:
+        print(f"Could not drop hotspot summary for '{table_name}': {e}")
+    try:
+        drop_risk_surfaces(table_name)
+    except Exception as e:
+        print(f"Could not drop risk surfaces for '{table_name}': {e}")
+    try:
+        return bump_table_version(table_name)
+    except Exception as e:
+        print(f"Could not bump data version for '{table_name}': {e}")
+        return None
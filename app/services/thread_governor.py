@@ -0,0 +1,114 @@
+# app/services/thread_governor.py
+
+"""
+CPU budget for native thread pools.
+
+Every gunicorn worker (WEB_CONCURRENCY of them) and every training process
+links its own OpenMP/BLAS runtimes, and scikit-learn/XGBoost default to one
+thread per core. This module splits the cores the container may actually use
+(CPU affinity and cgroup quota, not just os.cpu_count) between the web workers
+and their training pools, and enforces the split:
+
+- the OpenMP/BLAS thread variables are set when this module is imported, which
+  app/__init__.py does before NumPy is loaded, so every runtime and every
+  spawned training process starts with the job limit;
+- `apply_thread_limits` caps the runtimes that are already loaded
+  (threadpoolctl), and LOKY_MAX_CPU_COUNT caps joblib's `n_jobs=-1`;
+- models get `n_jobs` / `nthread` from training_executor.job_threads().
+
+A web worker that has a training pool keeps a single thread for itself.
+Explicitly set thread variables are respected. /api/thread_limits reports the
+effective limits.
+
+Environment:
+    WEB_CONCURRENCY              gunicorn workers sharing the machine (default 4)
+    RTAVERSE_TRAINING_WORKERS    pool processes per web worker; 0 trains inline
+"""
+
+import math
+import os
+
+NATIVE_THREAD_VARS = (
+    "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS", "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS",
+)
+
+
+def _cgroup_cpu_limit() -> float | None:
+    """CPUs allowed by the cgroup quota (v2 cpu.max or v1 cfs), or None when unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cores() -> int:
+    """Cores this process may run on: CPU affinity, capped by the cgroup quota."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    quota = _cgroup_cpu_limit()
+    if quota is not None:
+        cores = min(cores, max(1, math.ceil(quota)))
+    return max(1, cores)
+
+
+CPU_COUNT = available_cores()
+WEB_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "4")))
+TRAINING_WORKERS = max(0, int(os.getenv("RTAVERSE_TRAINING_WORKERS", str(max(1, CPU_COUNT // WEB_WORKERS)))))
+
+# Threads one training job may use: this worker's share of the cores, split across its pool.
+JOB_THREADS = max(1, CPU_COUNT // (WEB_WORKERS * max(1, TRAINING_WORKERS)))
+# Threads for work done in the web worker itself (all of it when training runs inline).
+WEB_THREADS = JOB_THREADS if TRAINING_WORKERS == 0 else 1
+
+# Inherited by the training processes, whose runtimes start after this point.
+for _var in NATIVE_THREAD_VARS:
+    os.environ.setdefault(_var, str(JOB_THREADS))
+os.environ.setdefault("LOKY_MAX_CPU_COUNT", str(JOB_THREADS))
+
+
+def apply_thread_limits(threads: int) -> None:
+    """Cap the OpenMP/BLAS runtimes already loaded in this process."""
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+
+
+def thread_limits() -> dict:
+    """The budget and the limits in effect in this process."""
+    try:
+        from threadpoolctl import threadpool_info
+        runtimes = [
+            {k: info.get(k) for k in ("user_api", "internal_api", "num_threads", "version")}
+            for info in threadpool_info()
+        ]
+    except ImportError:
+        runtimes = None
+    return {
+        "pid": os.getpid(),
+        "os_cpu_count": os.cpu_count(),
+        "cgroup_cpu_limit": _cgroup_cpu_limit(),
+        "available_cores": CPU_COUNT,
+        "web_workers": WEB_WORKERS,
+        "training_workers": TRAINING_WORKERS,
+        "job_threads": JOB_THREADS,
+        "web_threads": WEB_THREADS,
+        "env": {var: os.environ.get(var) for var in NATIVE_THREAD_VARS + ("LOKY_MAX_CPU_COUNT",)},
+        "runtimes": runtimes,
+    }
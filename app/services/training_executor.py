@@ -0,0 +1,297 @@
+# app/services/training_executor.py
+
+"""
+Bounded process pool for model training.
+
+Every gunicorn worker owns a small pool of spawned training processes. The
+machine's cores are split between web workers and pool processes (see
+thread_governor.py), and each training job gets that share as its `n_jobs` /
+`nthread` (see `job_threads`) and as the cap of its OpenMP/BLAS runtimes, so
+four web workers can no longer oversubscribe the CPU with `n_jobs=-1`.
+
+Request-path jobs are rejected with TrainingQueueFull when the pool's queue is
+full (routes answer 429 with Retry-After) and TrainingTimeout when a result
+takes longer than the job timeout. Background jobs wait for a free slot, as
+does any request-path code run inside `background_training()` (used to warm
+forecasts after an upload).
+
+Environment:
+    RTAVERSE_TRAINING_QUEUE      jobs in flight per web worker before rejecting
+    RTAVERSE_TRAINING_TIMEOUT    seconds a request waits for its job
+"""
+
+import contextlib
+import functools
+import importlib
+import inspect
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from .thread_governor import JOB_THREADS, TRAINING_WORKERS, WEB_THREADS, apply_thread_limits
+
+TRAINING_QUEUE = max(1, int(os.getenv("RTAVERSE_TRAINING_QUEUE", str(2 * max(1, TRAINING_WORKERS)))))
+TRAINING_TIMEOUT = float(os.getenv("RTAVERSE_TRAINING_TIMEOUT", "120"))
+
+
+class TrainingQueueFull(Exception):
+    """The training queue is full; retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"The forecasting queue is busy. Please retry in {retry_after} seconds.")
+        self.retry_after = retry_after
+
+
+class TrainingTimeout(Exception):
+    """
+    A training job did not finish within its timeout. `job`, when set, is a
+    Future that resolves to the job's return value once it does finish.
+    """
+
+    def __init__(self, message: str, job: Future | None = None):
+        super().__init__(message)
+        self.job = job
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(TRAINING_QUEUE)
+_stats_lock = threading.Lock()
+_stats = {
+    "submitted": 0, "completed": 0, "failed": 0, "timed_out": 0, "rejected": 0,
+    "in_flight": 0, "max_in_flight": 0, "wait_seconds_total": 0.0, "run_seconds_total": 0.0,
+}
+_job_threads = JOB_THREADS
+_local = threading.local()
+
+
+def job_threads() -> int:
+    """`n_jobs` / `nthread` for a model fitted in the current process."""
+    return _job_threads
+
+
+@contextlib.contextmanager
+def background_training():
+    """Within this block, run_training on this thread waits for a slot and never times out."""
+    previous = getattr(_local, "background", False)
+    _local.background = True
+    try:
+        yield
+    finally:
+        _local.background = previous
+
+
+def in_background_training() -> bool:
+    """True inside a `background_training()` block on this thread."""
+    return getattr(_local, "background", False)
+
+
+def _init_worker(threads: int) -> None:
+    global _job_threads
+    _job_threads = threads
+    apply_thread_limits(threads)
+
+
+def _run_job(target: str, args: tuple, kwargs: dict):
+    """Runs in a pool process: resolve "module:qualname" and call the undecorated function."""
+    module_name, qualname = target.split(":")
+    obj = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        obj = getattr(obj, part)
+    # Skip the caching/offloading decorators: the parent already holds the
+    # result-store lock for this call and must not be waited on by the child.
+    func = inspect.unwrap(obj)
+    started = time.perf_counter()
+    return func(*args, **kwargs), time.perf_counter() - started
+
+
+def _warm() -> int:
+    return os.getpid()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool, _pool_pid
+    with _pool_lock:
+        # gunicorn forks workers after import; each worker needs its own pool.
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(
+                max_workers=TRAINING_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(JOB_THREADS,),
+            )
+            _pool_pid = os.getpid()
+            # Spawned processes import the app (several seconds); start them
+            # now rather than inside the first request's timeout.
+            for _ in range(TRAINING_WORKERS):
+                _pool.submit(_warm)
+        return _pool
+
+
+def _reset_pool(pool: ProcessPoolExecutor) -> None:
+    """Forget a pool whose process died (e.g. OOM-killed); the next job starts a new one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+    print("Training pool broke; starting a new one.")
+
+
+def _job_result(future: Future) -> Future:
+    """A Future of the job's return value, from a pool future of (value, run seconds)."""
+    job = Future()
+
+    def _copy(f):
+        if f.cancelled():
+            job.cancel()
+            job.set_running_or_notify_cancel()
+        elif f.exception() is not None:
+            job.set_exception(f.exception())
+        else:
+            job.set_result(f.result()[0])
+    future.add_done_callback(_copy)
+    return job
+
+
+def _is_pool_process() -> bool:
+    # Spawned children re-import the parent's main module (e.g. run.py, which
+    # calls create_app); they must not start pools of their own.
+    # parent_process() is only set once bootstrapping finishes, so also look
+    # at the spawn command line.
+    return multiprocessing.parent_process() is not None or "--multiprocessing-fork" in getattr(sys, "orig_argv", ())
+
+
+def start_training_pool() -> None:
+    """Start this process's training pool ahead of the first request and cap the web worker's own threads."""
+    if _is_pool_process():
+        return
+    apply_thread_limits(WEB_THREADS)
+    if TRAINING_WORKERS > 0:
+        _get_pool()
+
+
+def _retry_after() -> int:
+    with _stats_lock:
+        avg_run = _stats["run_seconds_total"] / _stats["completed"] if _stats["completed"] else 5.0
+        waves = math.ceil(max(1, _stats["in_flight"]) / max(1, TRAINING_WORKERS))
+    return max(1, int(math.ceil(avg_run * waves)))
+
+
+def _count(**deltas) -> None:
+    with _stats_lock:
+        for k, v in deltas.items():
+            _stats[k] += v
+        _stats["max_in_flight"] = max(_stats["max_in_flight"], _stats["in_flight"])
+
+
+def run_training(func, *args, block: bool = False, timeout: float | None = TRAINING_TIMEOUT, **kwargs):
+    """
+    Run `func(*args, **kwargs)` in the training pool and return its result.
+
+    block=False (requests) raises TrainingQueueFull instead of queueing past
+    the limit; block=True (background jobs) waits for a slot. A job that
+    times out keeps its slot until it actually finishes; the TrainingTimeout
+    carries its eventual result as `job`.
+    """
+    if TRAINING_WORKERS == 0 or _is_pool_process():
+        return inspect.unwrap(func)(*args, **kwargs)
+    if in_background_training():
+        block, timeout = True, None
+
+    target = f"{func.__module__}:{func.__qualname__}"
+    deadline = None if timeout is None else time.monotonic() + timeout
+    # A pool whose process died fails every job; it is replaced and the job
+    # retried once.
+    for attempt in range(2):
+        if not _slots.acquire(blocking=block):
+            _count(rejected=1)
+            raise TrainingQueueFull(_retry_after())
+
+        pool = _get_pool()
+        submitted = time.perf_counter()
+        try:
+            future = pool.submit(_run_job, target, args, kwargs)
+        except BrokenProcessPool:
+            _slots.release()
+            _reset_pool(pool)
+            if attempt:
+                raise
+            continue
+        except Exception:
+            _slots.release()
+            raise
+        _count(submitted=1, in_flight=1)
+
+        def _done(f, submitted=submitted):
+            _slots.release()
+            failed = f.cancelled() or f.exception() is not None
+            run_seconds = 0.0 if failed else f.result()[1]
+            _count(in_flight=-1, completed=0 if failed else 1, failed=1 if failed else 0,
+                   run_seconds_total=run_seconds,
+                   wait_seconds_total=max(0.0, time.perf_counter() - submitted - run_seconds))
+        future.add_done_callback(_done)
+
+        try:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            result, _ = future.result(timeout=remaining)
+            return result
+        except FutureTimeout:
+            future.cancel()
+            _count(timed_out=1)
+            raise TrainingTimeout(f"Training did not finish within {timeout:.0f} seconds.", job=_job_result(future))
+        except BrokenProcessPool:
+            _reset_pool(pool)
+            if attempt:
+                raise
+
+
+def in_training_pool(func=None, *, inline=None):
+    """
+    Decorator: run the decorated function through run_training.
+
+    `inline(arguments)` may pick calls that are cheap enough to run in the
+    calling thread instead; it gets the call's bound arguments as a dict.
+    """
+    if func is None:
+        return functools.partial(in_training_pool, inline=inline)
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if inline is not None:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            if inline(bound.arguments):
+                return func(*args, **kwargs)
+        return run_training(func, *args, **kwargs)
+    return wrapper
+
+
+def training_queue_stats() -> dict:
+    with _stats_lock:
+        stats = dict(_stats)
+    done = stats["completed"] or 1
+    return {
+        "pid": os.getpid(),
+        "pool_workers": TRAINING_WORKERS,
+        "queue_limit": TRAINING_QUEUE,
+        "job_threads": JOB_THREADS,
+        "timeout_seconds": TRAINING_TIMEOUT,
+        "in_flight": stats["in_flight"],
+        "queued": max(0, stats["in_flight"] - TRAINING_WORKERS),
+        "max_in_flight": stats["max_in_flight"],
+        "submitted": stats["submitted"],
+        "completed": stats["completed"],
+        "failed": stats["failed"],
+        "timed_out": stats["timed_out"],
+        "rejected": stats["rejected"],
+        "avg_run_seconds": round(stats["run_seconds_total"] / done, 3),
+        "avg_wait_seconds": round(stats["wait_seconds_total"] / max(1, stats["completed"] + stats["failed"]), 3),
+    }
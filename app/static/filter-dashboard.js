@@ -291,26 +291,6 @@ function applyFilters() {
   }
   // --- END: MODIFIED Card Logic ---
 
-  // --- START: Loader Logic ---
-  const loader = document.getElementById("mapLoader");
-  const iframe = document.querySelector(".map-frame");
-
-  if (loader && iframe) {
-    // Show loader and hide map
-    loader.classList.remove("hidden");
-    iframe.classList.add("hidden");
-
-    // Add an onload event to the iframe
-    iframe.onload = () => {
-      // Once the new map is loaded, hide loader and show map
-      loader.classList.add("hidden");
-      iframe.classList.remove("hidden");
-      // Clear the event listener to avoid it firing on subsequent (e.g., in-map) loads
-      iframe.onload = null;
-    };
-  }
-  // --- END: Loader Logic ---
-
   const params = new URLSearchParams();
   if (monthFrom) params.set("start", monthFrom);
   if (monthTo) params.set("end", monthTo);
@@ -318,14 +298,9 @@ function applyFilters() {
   if (timeTo) params.set("time_to", timeTo);
   // Join the array of locations into a comma-separated string for the URL
   if (locations.length > 0) params.set("barangay", locations.join(","));
-  const baseUrl = document.getElementById("map-endpoint")?.dataset.url;
 
-  if (baseUrl && iframe) {
-    iframe.src = `${baseUrl}?${params.toString()}`;
-  } else if (loader) {
-    // Failsafe: If iframe doesn't exist, hide loader
-    loader.classList.add("hidden");
-  }
+  // Swap the hotspot layer's data; the map itself stays in place.
+  loadHotspots(params);
 
   closeFilterModal();
 }
@@ -392,34 +367,129 @@ function clearFilters() {
   resetCardsToLive();
   // --- END MODIFICATION ---
 
-  // --- START: Added Loader Logic ---
-  const loader = document.getElementById("mapLoader");
-  const iframe = document.querySelector(".map-frame");
-  const baseUrl = document.getElementById("map-endpoint")?.dataset?.url;
-
-  if (loader && iframe && baseUrl) {
-    // Show loader and hide map
-    loader.classList.remove("hidden");
-    iframe.classList.add("hidden");
-
-    // Add an onload event to the iframe
-    iframe.onload = () => {
-      // Once the default map is loaded, hide loader and show map
-      loader.classList.add("hidden");
-      iframe.classList.remove("hidden");
-      iframe.onload = null; // Clear the event listener
-    };
-    // Set the iframe src to the default URL
-    iframe.src = baseUrl;
-  } else if (iframe && baseUrl) {
-    // Fallback if loader isn't found
-    iframe.src = baseUrl;
-  }
-  // --- END: Added Loader Logic ---
+  // Back to the default (live) hotspot layer
+  loadHotspots(new URLSearchParams());
 
   closeFilterModal();
   // Close the modal
 }
+// ==========================================
+// === HOTSPOT MAP (Leaflet layer over /api/hotspots.json)
+// ==========================================
+
+let hotspotMap = null;
+let hotspotLayer = null;
+let hotspotRequest = null;
+let riskLayer = null;
+let riskMeta = null;
+
+function renderHotspots(data) {
+  if (!hotspotMap) {
+    hotspotMap = L.map("hotspotMap").setView(data.center, data.zoom);
+    L.tileLayer("https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png", {
+      maxZoom: 19,
+      attribution: "&copy; OpenStreetMap contributors",
+    }).addTo(hotspotMap);
+  }
+  if (hotspotLayer) hotspotLayer.remove();
+
+  hotspotLayer = L.geoJSON(data, {
+    pointToLayer: (feature, latlng) => {
+      const color = data.colors[feature.properties.bucket];
+      return L.circleMarker(latlng, {
+        radius: feature.properties.radius,
+        color: color,
+        fillColor: color,
+        fillOpacity: 0.8,
+      });
+    },
+    onEachFeature: (feature, layer) =>
+      layer.bindPopup(
+        () => hotspotPopup(feature.properties, layer.getLatLng(), data),
+        { maxWidth: 300 }
+      ),
+  }).addTo(hotspotMap);
+
+  if (data.message) {
+    L.marker(data.center).bindPopup(escapeHtml(data.message)).addTo(hotspotLayer);
+  }
+}
+
+// Kernel-density risk heatmap, toggled from the map's layer control. It
+// follows the selected months and hours; the image is rendered server-side.
+async function updateRiskOverlay(params) {
+  const endpoint = document.getElementById("map-endpoint");
+  const riskUrl = endpoint?.dataset.riskUrl;
+  const metaUrl = endpoint?.dataset.riskMetaUrl;
+  if (!riskUrl || !metaUrl || !hotspotMap) return;
+
+  const query = new URLSearchParams();
+  for (const key of ["start", "end", "time_from", "time_to"]) {
+    if (params.get(key)) query.set(key, params.get(key));
+  }
+  const url = query.toString() ? `${riskUrl}?${query}` : riskUrl;
+  if (riskLayer) {
+    riskLayer.setUrl(url);
+    return;
+  }
+  try {
+    if (!riskMeta) {
+      const res = await fetch(metaUrl);
+      const meta = await res.json();
+      if (!res.ok || !meta.success) throw new Error(meta.message || `HTTP ${res.status}`);
+      riskMeta = meta.data;
+    }
+    if (riskLayer) return; // created by a concurrent call
+    riskLayer = L.imageOverlay(url, riskMeta.bounds, { opacity: 0.7, interactive: false });
+    L.control.layers(null, { "Risk heatmap": riskLayer }).addTo(hotspotMap);
+  } catch (err) {
+    console.error("Risk heatmap unavailable:", err);
+  }
+}
+
+async function loadHotspots(params) {
+  const baseUrl = document.getElementById("map-endpoint")?.dataset.url;
+  const loader = document.getElementById("mapLoader");
+  const mapEl = document.getElementById("hotspotMap");
+  if (!baseUrl || !mapEl) return;
+
+  // Only the latest filter selection is rendered.
+  if (hotspotRequest) hotspotRequest.abort();
+  const request = new AbortController();
+  hotspotRequest = request;
+
+  if (loader) loader.classList.remove("hidden");
+  mapEl.classList.add("hidden");
+  try {
+    const query = params.toString();
+    const res = await fetch(query ? `${baseUrl}?${query}` : baseUrl, {
+      signal: request.signal,
+    });
+    const data = await res.json();
+    if (!res.ok) throw new Error(data.message || `HTTP ${res.status}`);
+    mapEl.classList.remove("hidden");
+    renderHotspots(data);
+    hotspotMap.invalidateSize();
+    updateRiskOverlay(params);
+  } catch (err) {
+    if (err.name === "AbortError") return;
+    console.error("Failed to load hotspots:", err);
+    mapEl.classList.remove("hidden");
+    renderHotspots({
+      type: "FeatureCollection",
+      features: [],
+      center: hotspotMap ? hotspotMap.getCenter() : [14.5995, 120.9842],
+      zoom: hotspotMap ? hotspotMap.getZoom() : 11,
+      message: `Could not load hotspots: ${err.message}`,
+    });
+  } finally {
+    if (hotspotRequest === request) {
+      hotspotRequest = null;
+      if (loader) loader.classList.add("hidden");
+    }
+  }
+}
+
 // ==========================================
 // === INITIALIZATION
 // ==========================================
@@ -428,6 +498,7 @@ document.addEventListener("DOMContentLoaded", function () {
   // Initialize the interactive filter components
   initializeLocationFilter();
   initializeMonthRange();
+  loadHotspots(new URLSearchParams());
 
   // Add listeners to close the modal
   const modal = document.getElementById("filterModal");
@@ -0,0 +1,50 @@
+// ==========================================
+// === HOTSPOT MAP POPUP
+// ==========================================
+
+// The popup of one hotspot marker, shared by the dashboard map and the
+// server-rendered folium page (/api/folium_map). `data` is the hotspots.json
+// collection, or any object with its "barangays" and "time_label".
+// Styled by hotspot-popup.css.
+
+function escapeHtml(value) {
+  return String(value).replace(
+    /[&<>"']/g,
+    (c) =>
+      ({ "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;" })[
+        c
+      ]
+  );
+}
+
+function hotspotPopup(props, latlng, data) {
+  const names = props.barangays.map((i) => data.barangays[i]);
+  const barangayHtml = names.length
+    ? `<ul class="hotspot-barangays">${names
+        .map((n) => `<li>${escapeHtml(n)}</li>`)
+        .join("")}</ul>`
+    : `<p>N/A</p>`;
+  const why = props.why
+    ? `<p><strong>Why (as of ${props.why.as_of}):</strong></p>
+       <ul>${props.why.drivers
+         .map(
+           ([label, factor]) =>
+             `<li>${escapeHtml(label)}: ${
+               factor >= 1 ? "raises" : "lowers"
+             } risk ×${factor.toFixed(2)}</li>`
+         )
+         .join("")}</ul>`
+    : "";
+  const streetviewUrl = `https://www.google.com/maps?q=&layer=c&cbll=${latlng.lat},${latlng.lng}&cbp=12,90,0,0,5`;
+  return `<div class="hotspot-popup">
+      <h4>Hotspot #${props.id}</h4>
+      <p><strong>Time:</strong> ${escapeHtml(data.time_label)}</p>
+      <p><strong>Barangays in Hotspot:</strong></p>
+      ${barangayHtml}
+      <hr />
+      ${props.actual > 0 ? `<p><strong>Actual (Hist.):</strong> ${props.actual}</p>` : ""}
+      ${props.forecast > 0 ? `<p><strong>Forecasted:</strong> ${props.forecast.toFixed(2)}</p>` : ""}
+      ${why}
+      <a href="${streetviewUrl}" target="_blank">Open Street View</a>
+    </div>`;
+}
@@ -0,0 +1,363 @@
+"""
+Rolling-origin backtest of every forecasting model in the app.
+
+For each grouping key the table (or a synthetic dataset) is aggregated into
+monthly series. At each of the last `--origins` origins the models are fitted
+on the months before the origin and forecast the next `--horizon` months. The
+tree models feed their predictions back recursively, as the dashboard does.
+
+    overall, <grouping keys>   random_forest, decision_tree (dashboard models),
+                               seasonal_naive, moving_average, holt_winters
+    overall                    rf_monthly (12-month lag model of /api/rf_monthly_forecast)
+    hotspot                    xgboost_hotspot (map model, rolled forward from
+                               each hotspot's last training month like the map)
+
+MAE/RMSE/MAPE are pooled over every forecast cell of every origin. MAPE only
+uses cells with a non-zero actual. Fit and predict times are medians over
+origins. Peak memory is the tracemalloc peak of one extra fit+predict at the
+last origin: it covers NumPy/pandas/scikit-learn allocations, not XGBoost's
+native buffers.
+
+    python -m benchmarks.backtest --synthetic 20000 --output report.json
+    python -m benchmarks.backtest --table accidents --groupings BARANGAY,OFFENSE
+    python -m benchmarks.backtest --synthetic 20000 --compare report.json
+
+--compare exits with status 1 when a model's MAE or fit time is worse than in
+the given report by more than --max-regression.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sklearn
+import xgboost
+from sklearn.ensemble import RandomForestRegressor
+from xgboost import XGBRegressor
+
+from app.services.baseline_models import BASELINE_MODELS, baseline_forecast
+from app.services.dashboard_forecasting import TREE_FEATURES, _lag_spec, _tree_model, tree_training_rows
+from app.services.forecasting import hotspot_recursive_spec
+from app.services.model_registry import (
+    HOTSPOT_MODEL_PARAMS, hotspot_feature_matrix, hotspot_monthly_frame, _fit_within_budget,
+)
+from app.services.recursive_forecast import RecursiveSpec, recursive_forecast, feature_index
+from app.services.training_executor import job_threads
+
+TREE_MODELS = ("random_forest", "decision_tree")
+SERIES_MODELS = TREE_MODELS + tuple(BASELINE_MODELS)
+DEFAULT_GROUPINGS = ("HOUR_COMMITTED", "BARANGAY", "OFFENSE")
+MIN_TRAIN_MONTHS = 15  # rf_monthly needs 12-month lags plus a few rows
+MIN_TIME_DELTA = 0.05  # seconds; smaller fit-time changes are timer noise
+
+
+# ---------------------------------------------------------------- data
+
+def synthetic_rows(n_rows: int, n_months: int = 96, seed: int = 42) -> pd.DataFrame:
+    """Accident rows with the preprocessed columns the forecasters read."""
+    rng = np.random.default_rng(seed)
+    barangays = np.array(["BALIBAGO", "PAMPANG", "CUTCUT", "MALABANIAS", "SAPALIBUTAD", "ANUNAS", "PULUNG MARAGUL"])
+    offenses = np.array(["DAMAGE TO PROPERTY", "PHYSICAL INJURY", "HOMICIDE"])
+
+    month = np.arange(n_months)
+    weights = (1 + 0.3 * np.sin(2 * np.pi * month / 12)) * (1 + month / n_months)  # season + growth
+    month_of_row = rng.choice(n_months, size=n_rows, p=weights / weights.sum())
+    start = pd.Timestamp("2016-01-01")
+    dates = (start + pd.to_timedelta(month_of_row * 30.44 + rng.uniform(0, 30, n_rows), unit="D")).normalize()
+
+    brgy = rng.choice(len(barangays), size=n_rows, p=np.linspace(2, 1, len(barangays)) / np.linspace(2, 1, len(barangays)).sum())
+    hour = (rng.normal(15, 5, n_rows).round() % 24).astype(int)
+    hotspot = np.where(rng.random(n_rows) < 0.15, -1, brgy * 3 + rng.integers(0, 3, n_rows))
+    cluster = np.select([(hour >= 6) & (hour <= 11), (hour >= 12) & (hour <= 17), hour >= 18],
+                        ["Morning", "Midday", "Evening"], default="Midnight")
+
+    df = pd.DataFrame({
+        "DATE_COMMITTED": dates,
+        "HOUR_COMMITTED": hour,
+        "BARANGAY": barangays[brgy],
+        "OFFENSE": rng.choice(offenses, size=n_rows, p=[0.6, 0.35, 0.05]),
+        "ACCIDENT_HOTSPOT": hotspot,
+    })
+    for label in ("Midnight", "Morning", "Midday", "Evening"):
+        df[f"TIME_CLUSTER_{label}"] = (cluster == label).astype(int)
+    return df
+
+
+def table_rows(table: str, groupings: list) -> pd.DataFrame:
+    from sqlalchemy import text
+    from app.extensions import get_engine
+
+    engine = get_engine()
+    with engine.connect() as conn:
+        cols = [str(r[0]) for r in conn.execute(text(f"SHOW COLUMNS FROM `{table}`")).fetchall()]
+    wanted = ["DATE_COMMITTED", "ACCIDENT_HOTSPOT"] + list(groupings) + [c for c in cols if "TIME_CLUSTER_" in c]
+    select_sql = ", ".join(f"`{c}`" for c in dict.fromkeys(wanted) if c in cols)
+    df = pd.read_sql_query(f"SELECT {select_sql} FROM `{table}` WHERE `DATE_COMMITTED` IS NOT NULL", engine)
+    df["DATE_COMMITTED"] = pd.to_datetime(df["DATE_COMMITTED"], errors="coerce")
+    return df.dropna(subset=["DATE_COMMITTED"])
+
+
+def monthly_matrix(df: pd.DataFrame, key: str | None):
+    """(series × months) counts and the month-end dates; one series when key is None."""
+    month = df["DATE_COMMITTED"].dt.to_period("M")
+    labels = df[key].astype(str) if key else pd.Series("overall", index=df.index)
+    counts = pd.crosstab(labels, month)
+    periods = pd.period_range(month.min(), month.max(), freq="M")
+    counts = counts.reindex(columns=periods, fill_value=0)
+    return counts.to_numpy(dtype=float), periods.to_timestamp(how="end").normalize()
+
+
+# ---------------------------------------------------------------- models
+
+def _tree_features(Y: np.ndarray, dates: pd.DatetimeIndex):
+    """Training rows, targets and recursion seed of run_categorical_forecast for a series × months grid."""
+    ts, last_known_data = tree_training_rows(list(range(Y.shape[0])), dates, Y, "count")
+    return (ts[TREE_FEATURES].to_numpy(dtype=float), ts["count"].to_numpy(dtype=float),
+            last_known_data[TREE_FEATURES].to_numpy(dtype=float))
+
+
+def fit_series_model(model_type: str, Y: np.ndarray, dates: pd.DatetimeIndex):
+    """Returns a fitted state for predict_series_model (None for the baselines)."""
+    if model_type in BASELINE_MODELS:
+        return None
+    if model_type == "rf_monthly":
+        return _fit_rf_monthly(Y, dates)
+    X, y, last = _tree_features(Y, dates)
+    model = _tree_model(model_type)
+    model.fit(X, y)
+    return model, last
+
+
+def predict_series_model(model_type: str, state, Y: np.ndarray, dates: pd.DatetimeIndex, horizon: int) -> np.ndarray:
+    if model_type in BASELINE_MODELS:
+        return baseline_forecast(model_type, Y, horizon)
+    if model_type == "rf_monthly":
+        return _predict_rf_monthly(state, Y, dates, horizon)
+    model, last = state
+    future = pd.date_range(dates[-1] + pd.DateOffset(months=1), periods=horizon, freq="ME")
+    return recursive_forecast(model, last, horizon, _lag_spec(TREE_FEATURES, future))
+
+
+RF_MONTHLY_FEATURES = ["lag_1_month", "lag_2_month", "lag_3_month", "lag_12_month",
+                       "rolling_mean_3_months", "month_of_year", "quarter_of_year"]
+
+
+def _rf_monthly_rows(y: np.ndarray, dates: pd.DatetimeIndex) -> np.ndarray:
+    s = pd.Series(y, index=dates)
+    return np.column_stack([
+        s.shift(1), s.shift(2), s.shift(3), s.shift(12), s.shift(1).rolling(3).mean(), dates.month, dates.quarter,
+    ])
+
+
+def _fit_rf_monthly(Y: np.ndarray, dates: pd.DatetimeIndex):
+    # Same features, model and recursion as rf_monthly_payload.
+    X = _rf_monthly_rows(Y[0], dates)
+    keep = ~np.isnan(X).any(axis=1)
+    model = RandomForestRegressor(n_estimators=100, random_state=42, min_samples_leaf=2, n_jobs=job_threads())
+    model.fit(X[keep], Y[0][keep])
+    return model, X[keep][-1]
+
+
+def _predict_rf_monthly(state, Y: np.ndarray, dates: pd.DatetimeIndex, horizon: int) -> np.ndarray:
+    model, last = state
+    future = pd.date_range(dates[-1] + pd.DateOffset(months=1), periods=horizon, freq="ME")
+    col = feature_index(RF_MONTHLY_FEATURES)
+    spec = RecursiveSpec(
+        lags=(col["lag_1_month"], col["lag_2_month"], col["lag_3_month"]),
+        rolling=col["rolling_mean_3_months"],
+        long_lags={col["lag_12_month"]: 13},
+        calendar={col["month_of_year"]: future.month, col["quarter_of_year"]: future.quarter},
+        feedback=np.round,
+    )
+    return recursive_forecast(model, last[None, :], horizon, spec, history=Y[0])
+
+
+# ---------------------------------------------------------------- backtests
+
+def _scores(actual: np.ndarray, forecast: np.ndarray) -> dict:
+    err = forecast - actual
+    nonzero = actual > 0
+    return {
+        "mae": float(np.mean(np.abs(err))),
+        "rmse": float(np.sqrt(np.mean(err ** 2))),
+        "mape": float(np.mean(np.abs(err[nonzero]) / actual[nonzero]) * 100) if nonzero.any() else None,
+        "n_cells": int(actual.size),
+    }
+
+
+def _peak_mb(fn) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+    finally:
+        tracemalloc.stop()
+
+
+def backtest_series(name: str, Y: np.ndarray, dates: pd.DatetimeIndex, models, horizon: int, origins: int) -> list:
+    n_months = Y.shape[1]
+    cuts = [n_months - horizon - k for k in range(origins - 1, -1, -1)]
+    cuts = [c for c in cuts if c >= MIN_TRAIN_MONTHS]
+    if not cuts:
+        print(f"  {name}: skipped, {n_months} months is too short for horizon {horizon}")
+        return []
+
+    results = []
+    for model_type in models:
+        if model_type == "rf_monthly" and Y.shape[0] != 1:
+            continue
+        actual, forecast, fit_t, pred_t = [], [], [], []
+        for cut in cuts:
+            train, train_dates = Y[:, :cut], dates[:cut]
+            started = time.perf_counter()
+            state = fit_series_model(model_type, train, train_dates)
+            fitted = time.perf_counter()
+            pred = predict_series_model(model_type, state, train, train_dates, horizon)
+            fit_t.append(fitted - started)
+            pred_t.append(time.perf_counter() - fitted)
+            actual.append(Y[:, cut:cut + horizon]); forecast.append(np.round(pred))
+
+        last_train, last_dates = Y[:, :cuts[-1]], dates[:cuts[-1]]
+        peak = _peak_mb(lambda: predict_series_model(
+            model_type, fit_series_model(model_type, last_train, last_dates), last_train, last_dates, horizon))
+        results.append({
+            "grouping": name, "model": model_type, "n_series": int(Y.shape[0]), "origins": len(cuts), "horizon": horizon,
+            **_scores(np.concatenate(actual, axis=None), np.concatenate(forecast, axis=None)),
+            "fit_seconds": round(float(np.median(fit_t)), 4),
+            "predict_seconds": round(float(np.median(pred_t)), 4),
+            "peak_memory_mb": peak,
+        })
+    return results
+
+
+def backtest_hotspot(df: pd.DataFrame, horizon: int, origins: int, budget: float | None) -> list:
+    rows = df[pd.to_numeric(df["ACCIDENT_HOTSPOT"], errors="coerce").fillna(-1) != -1].copy()
+    if rows.empty:
+        print("  hotspot: skipped, no clustered rows")
+        return []
+    ts = hotspot_monthly_frame(rows)
+    months = np.sort(ts["DATE_COMMITTED"].unique())
+    cuts = [len(months) - horizon - k for k in range(origins - 1, -1, -1)]
+    cuts = [c for c in cuts if c >= 6]
+    if not cuts:
+        print(f"  hotspot: skipped, {len(months)} months is too short for horizon {horizon}")
+        return []
+
+    actual_counts = ts.pivot(index="ACCIDENT_HOTSPOT", columns="DATE_COMMITTED", values="accident_count")
+    variants = [("xgboost_hotspot", None)] + ([(f"xgboost_hotspot_budget_{budget:g}s", budget)] if budget else [])
+    results = []
+    for model_name, seconds in variants:
+        def fit_predict(cut):
+            train = ts[ts["DATE_COMMITTED"] < months[cut]]
+            X = train.drop(columns=["accident_count", "DATE_COMMITTED"])
+            started = time.perf_counter()
+            if seconds:
+                model, _ = _fit_within_budget(X, train["accident_count"], train["DATE_COMMITTED"], seconds)
+            else:
+                model = XGBRegressor(**HOTSPOT_MODEL_PARAMS, n_jobs=job_threads()).fit(X, train["accident_count"], verbose=False)
+            fitted = time.perf_counter()
+            # As the map does: roll each hotspot's last training row forward.
+            last_rows = train.loc[train.groupby("ACCIDENT_HOTSPOT")["DATE_COMMITTED"].idxmax()]
+            last_month = train["DATE_COMMITTED"].max()
+            forecast_months = [last_month + pd.DateOffset(months=i + 1) for i in range(horizon)]
+            pred = recursive_forecast(model, hotspot_feature_matrix(last_rows, X.columns.tolist()).to_numpy(dtype=float),
+                                      horizon, hotspot_recursive_spec(X.columns.tolist(), forecast_months))
+            actual = actual_counts.reindex(index=last_rows["ACCIDENT_HOTSPOT"], columns=months[cut:cut + horizon], fill_value=0)
+            return actual.to_numpy(dtype=float).ravel(), pred.ravel(), fitted - started, time.perf_counter() - fitted
+
+        runs = [fit_predict(cut) for cut in cuts]
+        peak = _peak_mb(lambda: fit_predict(cuts[-1]))
+        results.append({
+            "grouping": "hotspot", "model": model_name, "n_series": int(ts["ACCIDENT_HOTSPOT"].nunique()),
+            "origins": len(cuts), "horizon": horizon,
+            **_scores(np.concatenate([r[0] for r in runs]), np.concatenate([r[1] for r in runs])),
+            "fit_seconds": round(float(np.median([r[2] for r in runs])), 4),
+            "predict_seconds": round(float(np.median([r[3] for r in runs])), 4),
+            "peak_memory_mb": peak,
+        })
+    return results
+
+
+# ---------------------------------------------------------------- report
+
+def compare(results: list, previous_path: str, max_regression: float) -> list:
+    with open(previous_path, encoding="utf-8") as f:
+        previous = {(r["grouping"], r["model"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        old = previous.get((r["grouping"], r["model"]))
+        if not old:
+            continue
+        for metric in ("mae", "fit_seconds"):
+            slack = MIN_TIME_DELTA if metric == "fit_seconds" else 0.0
+            if old[metric] and r[metric] > old[metric] * (1 + max_regression) + slack:
+                regressions.append(f"{r['grouping']}/{r['model']} {metric}: {old[metric]:.4g} -> {r[metric]:.4g}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--table", help="backtest a MySQL table (needs AIVEN_DATABASE_URL)")
+    source.add_argument("--synthetic", type=int, metavar="ROWS", help="backtest a synthetic dataset of ROWS accidents")
+    parser.add_argument("--groupings", default=",".join(DEFAULT_GROUPINGS), help="comma-separated grouping columns")
+    parser.add_argument("--models", default=",".join(SERIES_MODELS + ("rf_monthly",)), help="comma-separated series models")
+    parser.add_argument("--horizon", type=int, default=6)
+    parser.add_argument("--origins", type=int, default=3)
+    parser.add_argument("--no-hotspot", action="store_true", help="skip the XGBoost hotspot model")
+    parser.add_argument("--hotspot-budget", type=float, help="also backtest the hotspot model trained within this many seconds")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", metavar="REPORT", help="fail on regressions against an earlier report")
+    parser.add_argument("--max-regression", type=float, default=0.10, help="allowed relative MAE / fit time increase")
+    args = parser.parse_args()
+
+    groupings = [g.strip() for g in args.groupings.split(",") if g.strip()]
+    models = [m.strip() for m in args.models.split(",") if m.strip()]
+    df = table_rows(args.table, groupings) if args.table else synthetic_rows(args.synthetic)
+    print(f"{len(df)} rows, {df['DATE_COMMITTED'].dt.to_period('M').nunique()} months")
+
+    results = []
+    for key in [None] + [g for g in groupings if g in df.columns]:
+        Y, dates = monthly_matrix(df, key)
+        results += backtest_series(key or "overall", Y, dates, models, args.horizon, args.origins)
+    if not args.no_hotspot and "ACCIDENT_HOTSPOT" in df.columns:
+        results += backtest_hotspot(df, args.horizon, args.origins, args.hotspot_budget)
+
+    print(f"\n{'grouping':<16} {'model':<26} {'MAE':>8} {'RMSE':>8} {'MAPE%':>8} {'fit s':>8} {'pred s':>8} {'peak MB':>8}")
+    for r in results:
+        mape = f"{r['mape']:.1f}" if r["mape"] is not None else "-"
+        print(f"{r['grouping']:<16} {r['model']:<26} {r['mae']:>8.3f} {r['rmse']:>8.3f} {mape:>8}"
+              f" {r['fit_seconds']:>8.3f} {r['predict_seconds']:>8.4f} {r['peak_memory_mb']:>8.1f}")
+
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "source": {"table": args.table} if args.table else {"synthetic_rows": args.synthetic},
+        "config": {"horizon": args.horizon, "origins": args.origins, "groupings": groupings, "models": models,
+                   "hotspot_budget": args.hotspot_budget, "job_threads": job_threads()},
+        "environment": {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+                        "scikit-learn": sklearn.__version__, "xgboost": xgboost.__version__, "cpu_count": os.cpu_count()},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.max_regression:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
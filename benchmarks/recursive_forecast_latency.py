@@ -0,0 +1,99 @@
+"""
+Latency of the recursive multi-step forecast loop.
+
+Compares the former per-step pandas loop (rebuild a DataFrame each month) with
+app.services.recursive_forecast on synthetic monthly category counts, using
+the same models as the dashboard forecasters. With a 100-tree forest most of
+the time is spent inside predict; the Decision Tree rows show the loop
+overhead itself.
+
+    python -m benchmarks.recursive_forecast_latency [--categories 60] [--repeats 5]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+from app.services.recursive_forecast import RecursiveSpec, recursive_forecast
+
+FEATURES = ['lag_1_month', 'lag_2_month', 'lag_3_month', 'rolling_mean_3', 'month', 'category_code']
+HORIZONS = (12, 60)
+
+
+def synthetic_features(n_categories: int, n_months: int = 96, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    months = np.tile(np.arange(n_months) % 12 + 1, n_categories)
+    codes = np.repeat(np.arange(n_categories), n_months)
+    counts = rng.poisson(5 + 3 * np.sin(months / 12 * 2 * np.pi) + codes % 7).astype(float)
+    series = counts.reshape(n_categories, n_months)
+    lags = [np.roll(series, k, axis=1).ravel() for k in (1, 2, 3)]
+    X = np.column_stack(lags + [np.mean(lags, axis=0), months, codes])
+    keep = np.tile(np.arange(n_months) >= 3, n_categories)
+    return X[keep], counts[keep], X.reshape(n_categories, n_months, -1)[:, -1, :]
+
+
+def pandas_loop(model, last_features: np.ndarray, future_dates) -> list:
+    """The per-step loop the forecasters used before recursive_forecast."""
+    last_features_df = pd.DataFrame(last_features, columns=FEATURES)
+    all_predictions = []
+    for date in future_dates:
+        predictions = model.predict(last_features_df[FEATURES].to_numpy())
+        all_predictions.append(pd.DataFrame({'category_code': last_features_df['category_code'], 'forecast': predictions}))
+        next_features_df = pd.DataFrame()
+        next_features_df['category_code'] = last_features_df['category_code']
+        next_features_df['lag_3_month'] = last_features_df['lag_2_month']
+        next_features_df['lag_2_month'] = last_features_df['lag_1_month']
+        next_features_df['lag_1_month'] = predictions
+        next_features_df['month'] = date.month
+        next_features_df['rolling_mean_3'] = next_features_df[['lag_1_month', 'lag_2_month', 'lag_3_month']].mean(axis=1)
+        last_features_df = next_features_df[FEATURES]
+    return all_predictions
+
+
+def vectorized(model, last_features: np.ndarray, future_dates) -> np.ndarray:
+    spec = RecursiveSpec(lags=(0, 1, 2), rolling=3, calendar={4: future_dates.month})
+    return recursive_forecast(model, last_features, len(future_dates), spec)
+
+
+def best_of(fn, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--categories", type=int, default=60)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    X, y, last_features = synthetic_features(args.categories)
+    models = {
+        "Random Forest": RandomForestRegressor(n_estimators=100, random_state=42, min_samples_leaf=2, n_jobs=1),
+        "Decision Tree": DecisionTreeRegressor(max_depth=5, random_state=42),
+    }
+
+    print(f"{args.categories} categories, best of {args.repeats}")
+    print(f"{'model':<14} {'horizon':>8} {'pandas loop':>14} {'vectorized':>14} {'speedup':>9}")
+    for name, model in models.items():
+        model.fit(X, y)
+        for horizon in HORIZONS:
+            future_dates = pd.date_range("2025-01-31", periods=horizon, freq="ME")
+            old = np.column_stack([p['forecast'].to_numpy() for p in pandas_loop(model, last_features, future_dates)])
+            new = vectorized(model, last_features, future_dates)
+            assert np.allclose(old, new), "vectorized forecaster diverged from the pandas loop"
+
+            t_old = best_of(lambda: pandas_loop(model, last_features, future_dates), args.repeats)
+            t_new = best_of(lambda: vectorized(model, last_features, future_dates), args.repeats)
+            print(f"{name:<14} {horizon:>8} {t_old * 1000:>11.1f} ms {t_new * 1000:>11.1f} ms {t_old / t_new:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()